@@ -1,37 +1,197 @@
+import numpy as np
 import sqlite3
-from typing import Self
-
-class Experiment:
-    def __init__(self, name: str, strategy: str):
-        self.name = name
-        self.strategy = strategy
-        if self.name.startswith('V2baseline'):
-            self.type = 'baseline'
-        elif self.strategy.lower() == "default":
-            self.type = "baseline"
-        elif self.strategy.lower().startswith("e"):
-            self.type = "even"
-        else:
-            self.type = "fixed"
-
-    def __repr__(self):
-        return f"<Experiment {self.name} {self.strategy}>"
-    
+from typing import Optional, Self
+
+from query_lookup import Experiment, getExperimentId, getQueryResultId
+
+SUMMARY_COLUMNS = {
+    "time": ("max_time", "time_count"),
+    "max_memory": ("max_memory", "memory_count"),
+}
+
+# The value of each column as the graphs use it, which for time is the median
+# time of results that were run in repeated trials.
+COLUMN_VALUES = {
+    "time": "COALESCE(ts.median_time, qr.time)",
+    "max_memory": "qr.max_memory",
+}
+
+# Fills a temporary table with the query instances where every result of the
+# given experiments has a value in column below lowerThreshold. query_summary
+# holds the aggregate of the first trials over all experiments, so it is only
+# used when all of them are included and, for time, no result has repeated
+# trials.
+def createTrivialQueryTable(con: sqlite3.Connection, column: str, experimentIds: list[int], lowerThreshold: float) -> str:
+    table = f"trivial_{column}"
+    con.execute(f"CREATE TEMP TABLE IF NOT EXISTS {table} (query_instance_id INTEGER PRIMARY KEY)")
+    con.execute(f"DELETE FROM {table}")
+    placeholders = ",".join("?" * len(experimentIds))
+    res = con.execute(f"SELECT COUNT(*) FROM experiment WHERE id NOT IN ({placeholders})", experimentIds)
+    useSummary = res.fetchone()[0] == 0
+    if useSummary and column == "time":
+        res = con.execute("SELECT EXISTS (SELECT 1 FROM trial_summary)")
+        useSummary = res.fetchone()[0] == 0
+    if useSummary:
+        maxColumn, countColumn = SUMMARY_COLUMNS[column]
+        con.execute(f"""
+            INSERT INTO {table}
+            SELECT query_instance_id FROM query_summary WHERE {maxColumn} < ? AND {countColumn} = result_count
+        """, (lowerThreshold,))
+    else:
+        con.execute(f"""
+            INSERT INTO {table}
+            SELECT qr.query_instance_id FROM query_result qr
+                LEFT JOIN trial_summary ts ON ts.query_result_id = qr.id
+            WHERE qr.experiment_id IN ({placeholders})
+            GROUP BY qr.query_instance_id
+            HAVING MAX({COLUMN_VALUES[column]}) < ? AND COUNT({COLUMN_VALUES[column]}) = COUNT(*)
+        """, (*experimentIds, lowerThreshold))
+    return table
+
+# One row per query result, joined with its query instance and experiment and
+# stored column by column. Text columns are stored as codes into a list of
+# their distinct values and missing numbers as NaN. For results that were run
+# in repeated trials time is the median time, and time_low and time_high are
+# the bounds of its confidence interval, which are just time otherwise.
+class ResultsFrame:
+    NUMERIC_COLUMNS = ["id", "experiment_id", "query_instance_id", "query_index", "time", "max_memory", "states", "time_low", "time_high", "trial_count"]
+    FLOAT_COLUMNS = ["time", "max_memory", "states", "time_low", "time_high"]
+    CATEGORICAL_COLUMNS = ["model_name", "query_name", "query_type", "status", "result", "expected_answer"]
+
+    def __init__(self, columns: dict[str, np.ndarray], categories: dict[str, list[Optional[str]]]):
+        self.columns = columns
+        self.categories = categories
+
     @staticmethod
-    def fromFormat(format: str) -> Self:
-        name, strategy = format.split("-")
-        return Experiment(name, strategy)
-    
-    def getFullStrategyName(self) -> str:
-        if (self.type == "even"):
-            return f"EVEN-{self.getStrategyWithoutSuccessorGen()}"
-        elif (self.type == "fixed"):
-            return f"FIX-{self.getStrategyWithoutSuccessorGen()}"
-        else:
-            return "baseline"
-    def getStrategyWithoutSuccessorGen(self) -> str:
-        return self.strategy.split("_")[1]
-
-def getExperimentId(con: sqlite3.Connection, experiment: Experiment):
-    res = con.execute("SELECT id FROM experiment WHERE name=? AND search_strategy=?", (experiment.name, experiment.strategy))
-    return res.fetchone()[0]
\ No newline at end of file
+    def load(con: sqlite3.Connection, experimentIds: Optional[list[int]] = None) -> Self:
+        filter = "" if experimentIds is None else f"WHERE qr.experiment_id IN ({",".join("?" * len(experimentIds))})"
+        res = con.execute(f"""
+            SELECT qr.id, qr.experiment_id, qr.query_instance_id, qi.query_index, COALESCE(ts.median_time, qr.time), qr.max_memory, qr.states,
+                COALESCE(ts.time_low, qr.time), COALESCE(ts.time_high, qr.time), COALESCE(ts.trial_count, 1),
+                qi.model_name, qi.query_name, qi.query_type, qr.status, qr.result, qi.expected_answer
+            FROM query_result qr
+                JOIN query_instance qi ON qi.id = qr.query_instance_id
+                LEFT JOIN trial_summary ts ON ts.query_result_id = qr.id
+            {filter}
+            ORDER BY qr.id
+        """, [] if experimentIds is None else experimentIds)
+        rows = res.fetchall()
+        values = list(zip(*rows)) if len(rows) > 0 else [()] * (len(ResultsFrame.NUMERIC_COLUMNS) + len(ResultsFrame.CATEGORICAL_COLUMNS))
+        columns: dict[str, np.ndarray] = {}
+        categories: dict[str, list[Optional[str]]] = {}
+        for name, column in zip(ResultsFrame.NUMERIC_COLUMNS, values):
+            if name in ResultsFrame.FLOAT_COLUMNS:
+                columns[name] = np.array(column, dtype=np.float64)
+            else:
+                columns[name] = np.array(column, dtype=np.int64)
+        for name, column in zip(ResultsFrame.CATEGORICAL_COLUMNS, values[len(ResultsFrame.NUMERIC_COLUMNS):]):
+            codes: dict[Optional[str], int] = {}
+            columns[name] = np.fromiter((codes.setdefault(value, len(codes)) for value in column), dtype=np.int32, count=len(column))
+            categories[name] = list(codes)
+        return ResultsFrame(columns, categories)
+
+    def __len__(self) -> int:
+        return len(self.columns["id"])
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    def values(self, name: str) -> list[Optional[str]]:
+        return [self.categories[name][code] for code in self.columns[name]]
+
+    def isValue(self, name: str, value: Optional[str]) -> np.ndarray:
+        category = self.categories[name]
+        if value not in category:
+            return np.zeros(len(self), dtype=bool)
+        return self.columns[name] == category.index(value)
+
+    def isIn(self, name: str, values: list[Optional[str]]) -> np.ndarray:
+        codes = [code for code, value in enumerate(self.categories[name]) if value in values]
+        return np.isin(self.columns[name], codes)
+
+    def isExperiment(self, experimentId: int) -> np.ndarray:
+        return self.columns["experiment_id"] == experimentId
+
+    # A category of None matches every query.
+    def isCategory(self, category: Optional[str]) -> np.ndarray:
+        if category is None:
+            return np.ones(len(self), dtype=bool)
+        return self.isValue("query_name", category)
+
+    def isStatus(self, status: str) -> np.ndarray:
+        return self.isValue("status", status)
+
+    # Answered results that differ from the consensus answer of their query.
+    def isWrong(self) -> np.ndarray:
+        resultCodes = {value: code for code, value in enumerate(self.categories["result"])}
+        expected = np.array([resultCodes.get(value, -1) for value in self.categories["expected_answer"]], dtype=np.int32)
+        return (self.isStatus("Answered") & ~self.isValue("result", None) & ~self.isValue("expected_answer", None)
+            & (self["result"] != expected[self["expected_answer"]]))
+
+    def select(self, mask: np.ndarray) -> Self:
+        return ResultsFrame({name: column[mask] for name, column in self.columns.items()}, self.categories)
+
+    def forExperiment(self, experimentId: int) -> Self:
+        return self.select(self.isExperiment(experimentId))
+
+    # Pairs the rows of this frame with the rows of other for the same query
+    # instance, like an inner join on query_instance_id.
+    def align(self, other: Self) -> tuple[Self, Self]:
+        order = np.argsort(other["query_instance_id"], kind="stable")
+        otherIds = other["query_instance_id"][order]
+        first = np.searchsorted(otherIds, self["query_instance_id"], side="left")
+        counts = np.searchsorted(otherIds, self["query_instance_id"], side="right") - first
+        selfIndices = np.repeat(np.arange(len(self)), counts)
+        offsets = np.arange(len(selfIndices)) - np.repeat(np.cumsum(counts) - counts, counts)
+        otherIndices = order[np.repeat(first, counts) + offsets]
+        return self.select(selfIndices), other.select(otherIndices)
+
+    # Query instances where every row has a value in column below lowerThreshold.
+    def getTrivialQueryInstances(self, column: str, lowerThreshold: float) -> np.ndarray:
+        ids, inverse = np.unique(self["query_instance_id"], return_inverse=True)
+        maxValues = np.full(len(ids), -np.inf)
+        np.maximum.at(maxValues, inverse, np.nan_to_num(self[column], nan=np.inf))
+        return ids[maxValues < lowerThreshold]
+
+    # The ratio of column between two aligned frames. It is 0 when neither has
+    # a result, inf when only b has one and NaN when it is undefined.
+    @staticmethod
+    def getRatios(a: Self, b: Self, column: str) -> np.ndarray:
+        return np.sort(ResultsFrame.__divide(a, b, a[column], b[column]))
+
+    # The sorted ratios of the median times between two aligned frames, with
+    # the lowest and highest ratio the confidence intervals of both allow.
+    @staticmethod
+    def getTimeRatioIntervals(a: Self, b: Self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        ratios = ResultsFrame.__divide(a, b, a["time"], b["time"])
+        order = np.argsort(ratios, kind="stable")
+        low = ResultsFrame.__divide(a, b, a["time_low"], b["time_high"])
+        high = ResultsFrame.__divide(a, b, a["time_high"], b["time_low"])
+        return ratios[order], low[order], high[order]
+
+    @staticmethod
+    def __divide(a: Self, b: Self, aValues: np.ndarray, bValues: np.ndarray) -> np.ndarray:
+        aMissing = a.isValue("result", None)
+        bMissing = b.isValue("result", None)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratios = np.where(bValues == 0, np.nan, aValues / bValues)
+        ratios[aMissing] = np.inf
+        ratios[aMissing & bMissing] = 0
+        return ratios
+
+RATIO_LIMIT = 1000000000000
+
+# Replaces the ratios that cannot be drawn on a logarithmic axis: 0 becomes the
+# smallest positive ratio and inf the largest finite one.
+def clampRatios(ratios: np.ndarray) -> np.ndarray:
+    finite = ratios[ratios < np.inf]
+    maxValue = finite.max() if len(finite) > 0 else -1
+    minValue = np.minimum(np.where(ratios > 0, ratios, RATIO_LIMIT), RATIO_LIMIT).min()
+    return np.where(ratios == 0, minValue, np.where(ratios == np.inf, maxValue, ratios))
+
+# Clamps the ratios like clampRatios and their interval bounds along with
+# them. Ratios that are clamped or undefined get themselves as bounds.
+def clampRatioIntervals(ratios: np.ndarray, low: np.ndarray, high: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    clamped = clampRatios(ratios)
+    drawable = (ratios > 0) & (ratios < np.inf)
+    return clamped, np.where(drawable, low, clamped), np.where(drawable, high, clamped)
@@ -0,0 +1,97 @@
+#!/usr/bin/python3
+from argparse import ArgumentParser
+import re
+import time
+from typing import Callable, Iterable
+
+from result_parser import Result, large_pattern, pattern
+from synthetic_data import synthetic_log
+
+# The parser as it was before iterBlocks/joinBlocks: both logs are matched
+# with the uncompiled block pattern, paired by position and every field is
+# searched for with an uncompiled pattern.
+def legacy_parse(out: str, err: str, is_large_job: bool) -> list[tuple]:
+    results = []
+    blockPattern = large_pattern if is_large_job else pattern
+    for outMatch, errMatch in zip(re.finditer(blockPattern, out), re.finditer(blockPattern, err)):
+        if is_large_job:
+            name, strategy, category, query_index = outMatch.group(1), outMatch.group(2), outMatch.group(3), outMatch.group(4)
+        else:
+            name, category, strategy, query_index = outMatch.group(1), outMatch.group(2), outMatch.group(3), outMatch.group(4)
+        outResult = outMatch.group(5)
+        errResult = errMatch.group(5)
+        timeMatch = re.search(r"real\s+([0-9]+)m([0-9]+(\.[0-9]+)?)s", errResult)
+        timeMatch2 = re.search(r"TOTAL_TIME: ([0-9]+(\.[0-9]+)?)s", errResult)
+        memoryMatch = re.search("MAX_MEMORY: ([0-9]+)kB", errResult)
+        passedListMatch = re.search(r"passed states: ([0-9]+)", outResult)
+        verificationTimeMatch = re.search(r"Spent ([0-9]+(\.[0-9]+)?) on verification", outResult)
+        colorReductionTimeMatch = re.search(r"Colored structural reductions computed in ([0-9]+(\.[0-9]+)?(e(\+|\-)[0-9]+)?) seconds", outResult)
+        time = None
+        if (timeMatch != None):
+            time = float(timeMatch.group(2)) + float(timeMatch.group(1)) * 60.0
+        elif (timeMatch2 != None):
+            time = float(timeMatch2.group(1))
+        colorReductionTime = None if colorReductionTimeMatch is None else float(colorReductionTimeMatch.group(1))
+        exploredCount = None if passedListMatch is None else float(passedListMatch.group(1))
+        verificationTime = None if verificationTimeMatch is None else float(verificationTimeMatch.group(1))
+        if (verificationTime is None and exploredCount is not None):
+            verificationTime = time - (colorReductionTime if colorReductionTime is not None else 0)
+        if ("Query is satisfied" in outResult):
+            status, result = "Answered", "Satisfied"
+        elif ("Query is NOT satisfied" in outResult):
+            status, result = "Answered", "Unsatisfied"
+        elif ("TIMEOUT" in outResult):
+            status, result = "Timeout", None
+        elif ("TOO_MANY_BINDINGS" in outResult):
+            status, result = "TooManyBindings", None
+        elif ("std::bad_alloc" in errResult):
+            status, result = "OutOfMemory", None
+        else:
+            status, result = "Error", None
+        results.append((
+            f"{name}:{category}:{int(query_index)}", strategy.replace("-", "_"), time, status, result,
+            None if memoryMatch is None else float(memoryMatch.group(1)), exploredCount, colorReductionTime, verificationTime
+        ))
+    return results
+
+def current_parse(out: str, err: str, is_large_job: bool) -> list[tuple]:
+    return [(
+        result.query_instance.get_key(), result.strategy, result.time, result.status.name,
+        None if result.result is None else result.result.name,
+        result.maxMemory, result.states, result.colorReductionTime, result.verificationTime
+    ) for result in Result.fromOutErr(out, err, is_large_job)]
+
+# The best time of each parser over the repeats. The parsers take turns, so a
+# slow spell of the machine does not fall on only one of them.
+def measure(parsers: list[Callable[[str, str, bool], list[tuple]]], out: str, err: str, is_large_job: bool, repeats: int) -> list[tuple[float, list[tuple]]]:
+    best = [float("inf")] * len(parsers)
+    results: list[list[tuple]] = [[] for _ in parsers]
+    for _ in range(repeats):
+        for i, parse in enumerate(parsers):
+            start = time.perf_counter()
+            results[i] = parse(out, err, is_large_job)
+            best[i] = min(best[i], time.perf_counter() - start)
+    return list(zip(best, results))
+
+def report(name: str, seconds: float, size: int, blocks: Iterable):
+    print(f"{name:>8}: {seconds:8.3f}s {size / seconds / 1024 / 1024:8.1f} MB/s {len(list(blocks)) / seconds:10.0f} blocks/s")
+
+def main():
+    parser = ArgumentParser(prog="Compares the result parser against the previous per-field regex parser on synthetic logs")
+    parser.add_argument("--blocks", type=int, default=50000, help="number of query blocks in the synthetic log")
+    parser.add_argument("--verbose-lines", type=int, default=20, help="number of additional verifypn output lines per block")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    for is_large_job in (True, False):
+        out, err = synthetic_log(args.blocks, args.verbose_lines, is_large_job, args.seed)
+        size = len(out) + len(err)
+        print(f"{'large' if is_large_job else 'small'} job format, {args.blocks} blocks, {size / 1024 / 1024:.1f} MB")
+        (legacyTime, legacyResults), (currentTime, currentResults) = measure([legacy_parse, current_parse], out, err, is_large_job, args.repeats)
+        report("legacy", legacyTime, size, legacyResults)
+        report("current", currentTime, size, currentResults)
+        print(f"speedup: {legacyTime / currentTime:.2f}x, identical results: {legacyResults == currentResults}")
+
+if __name__ == "__main__":
+    main()
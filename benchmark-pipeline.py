@@ -0,0 +1,191 @@
+#!/usr/bin/python3
+from argparse import SUPPRESS, ArgumentParser
+import importlib.util
+import json
+import os
+from pathlib import Path
+import sqlite3
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+from types import ModuleType
+from typing import Callable, Optional
+
+from synthetic_data import write_synthetic_data
+
+STAGES = ["parse", "query-instances", "process-results", "plots"]
+
+def load_script(name: str) -> ModuleType:
+    spec = importlib.util.spec_from_file_location(name.replace("-", "_"), Path(__file__).with_name(f"{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+# The peak resident memory of this process in kB.
+def peak_memory() -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1])
+    return 0
+
+def count_rows(db_path: Path, table: str) -> int:
+    db = sqlite3.connect(str(db_path))
+    count = db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    db.close()
+    return count
+
+def packed_size(artifacts_path: Path) -> int:
+    return sum(path.stat().st_size for path in (artifacts_path / "packed-results").glob("*.tar"))
+
+def stage_parse(artifacts_path: Path, jobs: int) -> tuple[int, int]:
+    process_results = load_script("process-results")
+    results = 0
+    for path in sorted((artifacts_path / "packed-results").glob("*.tar")):
+        with tarfile.open(path, "r") as tarFile:
+            for _ in process_results.process_tar(tarFile):
+                results += 1
+    return results, packed_size(artifacts_path)
+
+def stage_query_instances(artifacts_path: Path, jobs: int) -> tuple[int, int]:
+    process_results = load_script("process-results")
+    db_path = artifacts_path / "query-instances.db"
+    db_path.unlink(missing_ok=True)
+    (artifacts_path / "query-index.json").unlink(missing_ok=True)
+    db = sqlite3.connect(str(db_path))
+    process_results.upgrade_schema(db)
+    process_results.create_query_instances(db, artifacts_path / "consensus-answers.db", artifacts_path / "all-models", artifacts_path / "query-index.json", jobs)
+    db.commit()
+    db.close()
+    query_files_size = sum(path.stat().st_size for path in (artifacts_path / "all-models").glob("*/*.xml"))
+    return count_rows(db_path, "query_instance"), query_files_size
+
+def stage_process_results(artifacts_path: Path, jobs: int) -> tuple[int, int]:
+    process_results = load_script("process-results")
+    db_path = artifacts_path / "results.db"
+    db_path.unlink(missing_ok=True)
+    (artifacts_path / "query-index.json").unlink(missing_ok=True)
+    db = sqlite3.connect(str(db_path))
+    process_results.upgrade_schema(db)
+    process_results.create_query_instances(db, artifacts_path / "consensus-answers.db", artifacts_path / "all-models", artifacts_path / "query-index.json", jobs)
+    db.commit()
+    process_results.process_and_insert(db, artifacts_path / "packed-results", jobs)
+    db.commit()
+    process_results.update_trial_summary(db)
+    db.commit()
+    process_results.validate_answers(db)
+    db.commit()
+    db.close()
+    return count_rows(db_path, "query_result"), packed_size(artifacts_path)
+
+# Runs create_plots.py on the database of the process-results stage, with
+# every output regenerated.
+def stage_plots(artifacts_path: Path, jobs: int) -> tuple[int, int]:
+    import create_plots
+    db_path = artifacts_path / "results.db"
+    db = sqlite3.connect(str(db_path))
+    experiments = [f"{name}-{strategy}" for name, strategy in db.execute("SELECT name, search_strategy FROM experiment ORDER BY id")]
+    db.close()
+    os.chdir(artifacts_path.parent)
+    sys.argv = ["create_plots.py", *experiments, "--force"]
+    create_plots.main()
+    return count_rows(db_path, "query_result"), db_path.stat().st_size
+
+STAGE_FUNCTIONS: dict[str, Callable[[Path, int], tuple[int, int]]] = {
+    "parse": stage_parse,
+    "query-instances": stage_query_instances,
+    "process-results": stage_process_results,
+    "plots": stage_plots,
+}
+
+# Runs a single stage in this process and writes its measurements to
+# report_path. Each stage gets its own process so its peak memory is not
+# hidden by the stages before it.
+def run_stage(stage: str, artifacts_path: Path, jobs: int, report_path: Path):
+    start = time.perf_counter()
+    items, size = STAGE_FUNCTIONS[stage](artifacts_path.resolve(), jobs)
+    seconds = time.perf_counter() - start
+    report_path.write_text(json.dumps({"seconds": seconds, "peak_memory": peak_memory(), "items": items, "bytes": size}))
+
+def measure_stage(stage: str, artifacts_path: Path, jobs: int, verbose: bool) -> dict:
+    with tempfile.NamedTemporaryFile(suffix=".json") as report:
+        subprocess.run([
+            sys.executable, __file__, "--run-stage", stage, "--directory", str(artifacts_path.parent), "--jobs", str(jobs),
+            "--report", report.name,
+        ], check=True, stdout=None if verbose else subprocess.DEVNULL)
+        return json.loads(Path(report.name).read_text())
+
+def report(stage: str, measurement: dict, baseline: Optional[dict]):
+    seconds = measurement["seconds"]
+    line = (f"{stage:>16}: {seconds:8.3f}s {measurement['peak_memory'] / 1024:8.1f} MB peak"
+        f" {measurement['items'] / seconds:10.0f} items/s {measurement['bytes'] / seconds / 1024 / 1024:8.1f} MB/s")
+    if baseline is not None:
+        line += f" {seconds / baseline['seconds']:6.2f}x time {measurement['peak_memory'] / baseline['peak_memory']:6.2f}x memory"
+    print(line)
+
+# The stages that got slower or use more memory than the baseline allows.
+def find_regressions(measurements: dict[str, dict], baseline: dict[str, dict], tolerance: float) -> list[str]:
+    regressions = []
+    for stage, measurement in measurements.items():
+        if stage not in baseline:
+            continue
+        for key in ("seconds", "peak_memory"):
+            if measurement[key] > baseline[stage][key] * (1 + tolerance):
+                regressions.append(f"{stage} {key.replace('_', ' ')}: {baseline[stage][key]:.3f} -> {measurement[key]:.3f}")
+    return regressions
+
+def main():
+    parser = ArgumentParser(prog="Measures the throughput and peak memory of each stage of the result processing on synthetic data")
+    parser.add_argument("stages", nargs='*', default=STAGES, help=f"stages to measure in order, any of {', '.join(STAGES)}")
+    parser.add_argument("--directory", type=Path, default=None, help="directory for the synthetic data, a temporary directory if not given")
+    parser.add_argument("--engines", nargs='+', default=["Baseline", "ExplicitCPN"])
+    parser.add_argument("--models", type=int, default=100, help="number of synthetic models")
+    parser.add_argument("--queries", type=int, default=16, help="number of queries per model and category")
+    parser.add_argument("--verbose-lines", type=int, default=20, help="number of additional verifypn output lines per query")
+    parser.add_argument("--atoms", type=int, default=8, help="number of comparisons in each query formula")
+    parser.add_argument("--format", choices=["large", "small"], default="large", help="the header format of the packed results")
+    parser.add_argument("--trials", type=int, default=1, help="number of times each query is run")
+    parser.add_argument("--records", default=False, action="store_true", help="also writes the JSON records of the benchmark scheduler, which are ingested instead of parsing the logs")
+    parser.add_argument("--compress", default=False, action="store_true", help="compresses the files in the packed results and writes their index, like the benchmark scheduler does")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--jobs", type=int, default=1, help="number of worker processes of process-results")
+    parser.add_argument("--save", type=Path, default=None, help="writes the measurements to this JSON file")
+    parser.add_argument("--compare", type=Path, default=None, help="compares the measurements with those saved in this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="fraction a stage may be slower or use more memory than in the compared file")
+    parser.add_argument("--verbose", default=False, action="store_true", help="shows the output of the stages")
+    parser.add_argument("--run-stage", choices=STAGES, default=None, help=SUPPRESS)
+    parser.add_argument("--report", type=Path, default=None, help=SUPPRESS)
+    args = parser.parse_args()
+    for stage in args.stages:
+        if stage not in STAGES:
+            parser.error(f"unknown stage {stage}")
+    if "plots" in args.stages and "process-results" not in args.stages:
+        parser.error("the plots stage needs the process-results stage")
+
+    if args.run_stage is not None:
+        run_stage(args.run_stage, args.directory / "artifacts", args.jobs, args.report)
+        return
+
+    with tempfile.TemporaryDirectory() as temporaryDirectory:
+        directory = args.directory if args.directory is not None else Path(temporaryDirectory)
+        print(f"Writing {args.models} synthetic models with {args.queries} queries per category in the {args.format} job format")
+        write_synthetic_data(directory, args.engines, args.models, args.queries, args.verbose_lines, args.atoms, args.format == "large", args.seed, args.trials, args.records, args.compress)
+        baseline = json.loads(args.compare.read_text()) if args.compare is not None else {}
+        measurements: dict[str, dict] = {}
+        for stage in sorted(args.stages, key=STAGES.index):
+            measurements[stage] = measure_stage(stage, directory / "artifacts", args.jobs, args.verbose)
+            report(stage, measurements[stage], baseline.get(stage))
+
+    if args.save is not None:
+        args.save.write_text(json.dumps(measurements, indent=1))
+    if args.compare is not None:
+        regressions = find_regressions(measurements, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"Regression in {regression}")
+        if len(regressions) > 0:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,726 @@
+#!/usr/bin/python3
+from argparse import ArgumentParser
+from collections import deque
+from contextlib import closing
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+import csv
+import ctypes
+from itertools import chain
+import json
+import os
+from pathlib import Path
+import re
+import resource
+import select
+import shutil
+import signal
+import sqlite3
+import subprocess
+import tarfile
+import tempfile
+import time
+from typing import Iterable, Iterator, Optional, Self
+
+from packed_archive import add_file, write_index
+from result_parser import PREDICTED_STATUS, QUERY_SATISFIED, QUERY_UNSATISFIED, Result, verification_time_pattern
+from retrieve_models import ModelStore
+from trial_statistics import median_confidence_interval
+
+QUERY_COUNT = 16
+QUERY_CATEGORIES = ["ReachabilityCardinality", "ReachabilityFireability"]
+SEARCH_STRATEGY = "RDFS"
+SUCCESSOR_GENERATOR = "even"
+PER_QUERY_TIMEOUT = 300
+MEMORY_PER_JOB_KB = 1024 * 1024 * 15
+ADMISSION_POLL_INTERVAL = 1.0
+SAMPLE_INTERVAL = 0.5
+TIMEOUT_KILL_DELAY = 10
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK")
+PAGE_KB = os.sysconf("SC_PAGE_SIZE") // 1024
+PR_SET_CHILD_SUBREAPER = 36
+LAUNCH_SCRIPT = 'out=$1 err=$2; shift 2; exec 3<&0; (read _ <&3; exec "$@" 3<&-) >"$out" 2>"$err" & echo $!'
+JOURNAL_FILE_NAME = "journal.csv"
+ORDERS = ["file", "longest-first", "shortest-first"]
+KNOWN_FAILURE_POLICIES = ["run", "last", "skip"]
+# The output result_parser reads each failure status from.
+FAILURE_OUTPUTS = {
+    "Timeout": ("TIMEOUT\n", ""),
+    "TooManyBindings": ("TOO_MANY_BINDINGS\n", ""),
+    "OutOfMemory": ("", "std::bad_alloc\n"),
+}
+SKIPPED_EXIT_CODE = -1
+SHORT_TRIAL_TIME = 1.0
+MAX_TRIAL_SPREAD = 0.1
+
+ENGINE_OPTIONS = {
+    "ExplicitCPN": "-n 1 -C -s RDFS",
+    "Baseline": "-n 1",
+}
+# The engines whose verifypn answers a comma separated list of query indices
+# given to -x in one run.
+BATCH_ENGINES = {"ExplicitCPN", "Baseline"}
+batch_query_pattern = re.compile(r"^Query index ([0-9]+) was solved", re.MULTILINE)
+
+class BenchmarkConfig:
+    def __init__(self, verifypn_path: Path, models_path: Path, archives_path: Path, output_path: Path, packed_path: Path, timeout: int, memory_per_job_kb: int, sample_interval: float, compress_archives: bool = True):
+        self.verifypn_path = verifypn_path
+        self.models_path = models_path
+        self.archives_path = archives_path
+        self.output_path = output_path
+        self.packed_path = packed_path
+        self.timeout = timeout
+        self.memory_per_job_kb = memory_per_job_kb
+        self.sample_interval = sample_interval
+        self.compress_archives = compress_archives
+
+# A single query of an engine. Repeated runs of it share the key and header
+# and only differ in trial.
+class BenchmarkUnit:
+    def __init__(self, engine: str, model_name: str, category: str, query_index: int, trial: int = 1):
+        self.engine = engine
+        self.model_name = model_name
+        self.category = category
+        self.query_index = query_index
+        self.trial = trial
+
+    def get_key(self) -> str:
+        return f"{self.engine}:{self.model_name}:{self.category}:{self.query_index}"
+
+    def get_header(self) -> str:
+        return f"\n###### RUNNING {self.model_name} X {SUCCESSOR_GENERATOR}-{SEARCH_STRATEGY} X {self.category} X {self.query_index} ######\n"
+
+    def get_output_prefix(self, config: BenchmarkConfig) -> Path:
+        return config.output_path / f"{self.model_name}_{self.engine}-1"
+
+    def with_trial(self, trial: int) -> Self:
+        return BenchmarkUnit(self.engine, self.model_name, self.category, self.query_index, trial)
+
+    def __repr__(self):
+        return f"<BenchmarkUnit {self.get_key()}>"
+
+# The output of a unit as text in the format of big_job_script.sh and as the
+# JSON record written next to it.
+class UnitOutput:
+    def __init__(self, unit: BenchmarkUnit, out: str, err: str, exit_code: int, elapsed: float, record: dict):
+        self.unit = unit
+        self.out = out
+        self.err = err
+        self.exit_code = exit_code
+        self.elapsed = elapsed
+        self.record = record
+
+def create_units(engine: str, model_names: Iterable[str]) -> list[BenchmarkUnit]:
+    return [
+        BenchmarkUnit(engine, model_name, category, query_index)
+        for model_name in model_names
+        for category in QUERY_CATEGORIES
+        for query_index in range(1, QUERY_COUNT + 1)
+    ]
+
+def format_bash_time(seconds: float) -> str:
+    return f"{int(seconds // 60)}m{seconds % 60:.3f}s"
+
+def limit_address_space(limit_kb: int):
+    limit = limit_kb * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+# The resident memory in kB and the user and system CPU time in seconds of a
+# process, or None if it is gone.
+def sample_process(pid: int) -> Optional[tuple[int, float, float]]:
+    try:
+        stat = Path(f"/proc/{pid}/stat").read_text()
+    except OSError:
+        return None
+    fields = stat[stat.rindex(")") + 2:].split()
+    return int(fields[21]) * PAGE_KB, int(fields[11]) / CLOCK_TICKS, int(fields[12]) / CLOCK_TICKS
+
+class ProcessUsage:
+    def __init__(self, exit_code: int, elapsed: float, usage: resource.struct_rusage, samples: list[tuple[float, int, float, float]]):
+        self.exit_code = exit_code
+        self.elapsed = elapsed
+        self.usage = usage
+        self.samples = samples
+
+# Waits for the process through a pidfd, so its exit is seen right away, and
+# samples it from /proc every interval seconds in between. Like timeout(1) it
+# is sent SIGTERM after timeout seconds and then exits with 124, and it is
+# killed if it is still running TIMEOUT_KILL_DELAY seconds later. The exact
+# rusage comes from wait4 once it has exited.
+def monitor_process(pid: int, start: float, timeout: float, interval: float) -> ProcessUsage:
+    samples: list[tuple[float, int, float, float]] = []
+    timed_out = False
+    pidfd = os.pidfd_open(pid)
+    try:
+        while True:
+            now = time.monotonic()
+            deadline = start + timeout + (TIMEOUT_KILL_DELAY if timed_out else 0)
+            wait_time = max(deadline - now, 0)
+            if interval > 0:
+                wait_time = min(wait_time, interval)
+            readable, _, _ = select.select([pidfd], [], [], wait_time)
+            now = time.monotonic()
+            if readable:
+                break
+            if now >= deadline:
+                os.kill(pid, signal.SIGKILL if timed_out else signal.SIGTERM)
+                timed_out = True
+            elif interval > 0:
+                sample = sample_process(pid)
+                if sample is not None:
+                    samples.append((now - start, *sample))
+    finally:
+        os.close(pidfd)
+    _, status, usage = os.wait4(pid, 0)
+    exit_code = os.waitstatus_to_exitcode(status)
+    if timed_out:
+        exit_code = 124
+    elif exit_code < 0:
+        exit_code = 128 - exit_code
+    return ProcessUsage(exit_code, now - start, usage, samples)
+
+# Starts the command from a short-lived sh that leaves it to this process as
+# the child subreaper. The peak memory wait4 reports for a process includes
+# the memory of the process it was forked from, so forking it from sh keeps
+# the big Python worker out of it, as /usr/bin/time did. The forked process
+# only execs the command once its stdin from here is closed, which happens
+# after sh has exited and been reaped, so sh can never reap the command itself
+# and only this process can.
+def launch(command: list[str], stdout_path: Path, stderr_path: Path, memory_limit_kb: int) -> int:
+    libc = ctypes.CDLL(None, use_errno=True)
+    if libc.prctl(PR_SET_CHILD_SUBREAPER, 1, 0, 0, 0) != 0:
+        raise OSError(ctypes.get_errno(), "Could not become a child subreaper")
+    launcher = subprocess.Popen(["/bin/sh", "-c", LAUNCH_SCRIPT, "sh", str(stdout_path), str(stderr_path), *command],
+        stdin=subprocess.PIPE, stdout=subprocess.PIPE, preexec_fn=lambda: limit_address_space(memory_limit_kb))
+    pid = int(launcher.stdout.read())
+    launcher.stdout.close()
+    launcher.wait()
+    launcher.stdin.close()
+    return pid
+
+def format_samples(samples: list[tuple[float, int, float, float]]) -> str:
+    return " ".join(f"{elapsed:.3f}:{memory}:{user:.2f}:{system:.2f}" for elapsed, memory, user, system in samples)
+
+# The values of a run measured by the scheduler, which are more exact than
+# the text of the trailers they are also written to.
+def measured_values(usage: ProcessUsage) -> dict:
+    return {
+        "time": usage.elapsed,
+        "max_memory": usage.usage.ru_maxrss,
+        "resource_samples": list(usage.samples),
+        "user_time": usage.usage.ru_utime,
+        "system_time": usage.usage.ru_stime,
+    }
+
+# The record of a unit holds the values result_parser reads from its output,
+# with the measured values in place of their rounded text.
+def create_record(unit: BenchmarkUnit, out: str, err: str, exit_code: int, measured: dict) -> dict:
+    header_length = len(unit.get_header())
+    result = Result.fromBlock(unit.model_name, unit.category, f"{SUCCESSOR_GENERATOR}-{SEARCH_STRATEGY}", unit.query_index, out[header_length:], err[header_length:])
+    return {**result.toRecord(), "engine": unit.engine, "exit_code": exit_code, "user_time": None, "system_time": None, **measured}
+
+def format_trailers(unit: BenchmarkUnit, max_memory: int, samples: Optional[list[tuple[float, int, float, float]]], elapsed: float, user: float, system: float, batch: str = "") -> str:
+    err = f"TRIAL: {unit.trial}\n" if unit.trial > 1 else ""
+    err += f"MAX_MEMORY: {max_memory}kB\n"
+    if samples is not None:
+        err += f"RESOURCE_SAMPLES: {format_samples(samples)}\n"
+    err += batch
+    err += f"\nreal\t{format_bash_time(elapsed)}\n"
+    err += f"user\t{format_bash_time(user)}\n"
+    err += f"sys\t{format_bash_time(system)}\n"
+    return err
+
+# Runs verifypn on the given query indices of the model and category of the
+# unit and returns its stdout, stderr and resource usage.
+def run_verifypn(unit: BenchmarkUnit, query_indices: list[int], config: BenchmarkConfig, timeout: float) -> tuple[str, str, ProcessUsage]:
+    command = [
+        str(config.verifypn_path.absolute()), "-x", ",".join(map(str, query_indices)),
+        str(config.models_path / unit.model_name / "model.pnml"),
+        str((config.models_path / unit.model_name / f"{unit.category}.xml").resolve()),
+        *ENGINE_OPTIONS[unit.engine].split(),
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+        stdout_path = Path(directory) / "stdout"
+        stderr_path = Path(directory) / "stderr"
+        start = time.monotonic()
+        pid = launch(command, stdout_path, stderr_path, config.memory_per_job_kb)
+        try:
+            usage = monitor_process(pid, start, timeout, config.sample_interval)
+        except BaseException:
+            # The sh started verifypn in the background, where it ignores
+            # SIGINT, so it has to be stopped here, unless it is gone already.
+            try:
+                os.kill(pid, signal.SIGKILL)
+                os.wait4(pid, 0)
+            except (ProcessLookupError, ChildProcessError):
+                pass
+            raise
+        return stdout_path.read_bytes().decode(errors="replace"), stderr_path.read_bytes().decode(errors="replace"), usage
+
+# Mirrors one iteration of the query loop in big_job_script.sh. verifypn is
+# run directly and the bash `time` and `/usr/bin/time` trailers that
+# result_parser reads back are written from its rusage, followed by the
+# RESOURCE_SAMPLES trailer with the memory and CPU time series. Repeated
+# trials also get a TRIAL trailer with their number.
+def run_unit(unit: BenchmarkUnit, config: BenchmarkConfig) -> UnitOutput:
+    stdout, stderr, usage = run_verifypn(unit, [unit.query_index], config, config.timeout)
+    out = unit.get_header() + stdout
+    err = unit.get_header() + stderr
+    if usage.exit_code == 124:
+        out += "TIMEOUT\n"
+    elif usage.exit_code > 2 and usage.exit_code != 130:
+        out += "ERROR\n"
+    err += format_trailers(unit, usage.usage.ru_maxrss, usage.samples, usage.elapsed, usage.usage.ru_utime, usage.usage.ru_stime)
+    return UnitOutput(unit, out, err, usage.exit_code, usage.elapsed, create_record(unit, out, err, usage.exit_code, measured_values(usage)))
+
+# Splits the stdout of a batched verifypn run into the output before the first
+# query was solved, which is shared by all of them, and the output of each
+# query keyed by its 1 based index. verifypn starts the result of each query
+# with a "Query index" line holding its 0 based index.
+def split_batch_output(stdout: str) -> tuple[str, dict[int, str]]:
+    matches = list(batch_query_pattern.finditer(stdout))
+    if len(matches) == 0:
+        return stdout, {}
+    sections = {}
+    for match, next_match in zip(matches, matches[1:] + [None]):
+        sections[int(match.group(1)) + 1] = stdout[match.start():len(stdout) if next_match is None else next_match.start()]
+    return stdout[:matches[0].start()], sections
+
+def has_answer(section: str) -> bool:
+    return QUERY_SATISFIED in section or QUERY_UNSATISFIED in section
+
+# The output of a query whose own verification went over the timeout of a
+# single query, without its answer, so it is recorded as the timeout it would
+# have been when run on its own.
+def drop_answer(section: str) -> str:
+    return "".join(line for line in section.splitlines(keepends=True) if not has_answer(line))
+
+# Runs the units of a model and category in one verifypn process, which parses
+# and unfolds the model only once, with the timeout of all of them together.
+# The output is split back into a block per unit, each starting with the shared
+# output, such as the color reduction time. The time of each unit is its own
+# verification time plus an equal share of the time the run spent on none of
+# them, which is written to the BATCH trailer. If not every query reported its
+# verification time, the shared time is unknown and the time of the run is
+# split equally instead. A query whose own verification, or time if the shared
+# time is known, went over the timeout of a single query is a timeout with that
+# timeout as its time. Queries the run did not answer, as it
+# failed or timed out before, are run again on their own with the timeout of a
+# single query, so they never get the time or exit code of the whole run.
+# verifypn writes stderr for the model as a whole and the peak memory is that
+# of the run, which holds the model for all queries, so neither can be split:
+# the stderr and resource samples are kept in the block of the first answered
+# unit and every unit gets the peak memory of the run.
+def run_batch(units: list[BenchmarkUnit], config: BenchmarkConfig) -> list[UnitOutput]:
+    stdout, stderr, usage = run_verifypn(units[0], [unit.query_index for unit in units], config, config.timeout * len(units))
+    shared, sections = split_batch_output(stdout)
+    verification_times: dict[int, float] = {}
+    for index, section in sections.items():
+        match = verification_time_pattern.search(section)
+        if match is not None:
+            verification_times[index] = float(match.group(1))
+    shared_time = None
+    if all(unit.query_index in verification_times for unit in units):
+        shared_time = max(usage.elapsed - sum(verification_times[unit.query_index] for unit in units), 0)
+    outputs = []
+    first = True
+    for unit in units:
+        section = sections.get(unit.query_index, "")
+        verification_time = verification_times.get(unit.query_index, 0)
+        if verification_time <= config.timeout and not has_answer(section):
+            outputs.append(run_unit(unit, config))
+            continue
+        if shared_time is None:
+            elapsed = usage.elapsed / len(units)
+        else:
+            elapsed = shared_time / len(units) + verification_time
+        exit_code = usage.exit_code
+        if verification_time > config.timeout or (shared_time is not None and elapsed > config.timeout):
+            section = drop_answer(section)
+            exit_code = 124
+            elapsed = config.timeout
+        elif exit_code not in (0, 1, 2, 130):
+            exit_code = 0
+        out = unit.get_header() + shared + section
+        err = unit.get_header() + (stderr if first else "")
+        if exit_code == 124:
+            out += "TIMEOUT\n"
+        batch = f"BATCH: {len(units)} {'-' if shared_time is None else f'{shared_time:.3f}'}\n"
+        samples = usage.samples if first else None
+        first = False
+        err += format_trailers(unit, usage.usage.ru_maxrss, samples, elapsed, usage.usage.ru_utime / len(units), usage.usage.ru_stime / len(units), batch)
+        measured = {
+            **measured_values(usage),
+            "time": elapsed,
+            "resource_samples": None if samples is None else list(samples),
+            "user_time": usage.usage.ru_utime / len(units),
+            "system_time": usage.usage.ru_stime / len(units),
+            "batch_size": len(units),
+            "shared_time": shared_time,
+        }
+        outputs.append(UnitOutput(unit, out, err, exit_code, elapsed, create_record(unit, out, err, exit_code, measured)))
+    return outputs
+
+# With batching the units of a group share one verifypn process, otherwise
+# every group holds a single unit.
+def run_group(units: list[BenchmarkUnit], config: BenchmarkConfig, batch: bool) -> list[UnitOutput]:
+    if batch:
+        return run_batch(units, config)
+    return [run_unit(unit, config) for unit in units]
+
+def available_memory_kb() -> int:
+    with open("/proc/meminfo") as f:
+        for line in f:
+            if line.startswith("MemAvailable:"):
+                return int(line.split()[1])
+    raise RuntimeError("Could not read MemAvailable from /proc/meminfo")
+
+def descendant_rss_kb(root_pid: int) -> int:
+    children: dict[int, list[int]] = {}
+    for entry in Path("/proc").iterdir():
+        if not entry.name.isdigit():
+            continue
+        try:
+            stat = (entry / "stat").read_text()
+        except OSError:
+            continue
+        ppid = int(stat[stat.rindex(")") + 2:].split()[1])
+        children.setdefault(ppid, []).append(int(entry.name))
+    total = 0
+    stack = list(children.get(root_pid, []))
+    while stack:
+        pid = stack.pop()
+        stack.extend(children.get(pid, []))
+        try:
+            total += int(Path(f"/proc/{pid}/statm").read_text().split()[1]) * PAGE_KB
+        except OSError:
+            continue
+    return total
+
+# A running job may still grow up to its budget, so the memory it has not
+# touched yet is treated as already taken when admitting the next one.
+def has_memory_for_job(config: BenchmarkConfig, running_jobs: int) -> bool:
+    promised = running_jobs * config.memory_per_job_kb - descendant_rss_kb(os.getpid())
+    return available_memory_kb() - max(promised, 0) >= config.memory_per_job_kb
+
+# Models retrieved with retrieve_models.py --lazy are extracted right before
+# their first unit is started. Units the caller appends to pending while the
+# outputs are consumed are run as well.
+def run_units(pending: deque[list[BenchmarkUnit]], config: BenchmarkConfig, jobs: int, batch: bool) -> Iterator[list[UnitOutput]]:
+    running: set[Future] = set()
+    store = ModelStore(config.models_path, config.archives_path)
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        while pending or running:
+            while pending and len(running) < jobs and (not running or has_memory_for_job(config, len(running))):
+                units = pending.popleft()
+                if store.ensure(units[0].model_name):
+                    print(f"Extracted {units[0].model_name}")
+                running.add(executor.submit(run_group, units, config, batch))
+            done, not_done = wait(running, timeout=ADMISSION_POLL_INTERVAL, return_when=FIRST_COMPLETED)
+            running = set(not_done)
+            for future in done:
+                outputs: list[UnitOutput] = future.result()
+                if any(output.exit_code == 130 for output in outputs):
+                    for other in running:
+                        other.cancel()
+                    raise KeyboardInterrupt()
+                yield outputs
+
+# Appends the output of a unit to the .out and .err files of its model and,
+# unless write_records is False, its record to the .jsonl file with the byte
+# span of its output after the header. Returns the new size of each file.
+def write_output(output: UnitOutput, config: BenchmarkConfig, write_records: bool) -> tuple[int, int, Optional[int]]:
+    prefix = output.unit.get_output_prefix(config)
+    header_size = len(output.unit.get_header().rstrip("\n").encode())
+    spans = []
+    sizes = []
+    for suffix, text in ((".out", output.out), (".err", output.err)):
+        data = text.encode()
+        with Path(f"{prefix}{suffix}").open("ab") as f:
+            f.write(data)
+            sizes.append(f.tell())
+        spans.append([sizes[-1] - len(data) + header_size, len(data) - header_size])
+    if not write_records:
+        return sizes[0], sizes[1], None
+    with Path(f"{prefix}.jsonl").open("ab") as f:
+        f.write((json.dumps({**output.record, "out": spans[0], "err": spans[1]}) + "\n").encode())
+        return sizes[0], sizes[1], f.tell()
+
+class JournalEntry:
+    def __init__(self, engine: str, model_name: str, category: str, query_index: int, exit_code: int, elapsed: float, out_size: int, err_size: int, finished_at: float, trial: int = 1, records_size: Optional[int] = None):
+        self.unit = BenchmarkUnit(engine, model_name, category, query_index, trial)
+        self.exit_code = exit_code
+        self.elapsed = elapsed
+        self.out_size = out_size
+        self.err_size = err_size
+        self.finished_at = finished_at
+        self.records_size = records_size
+
+    # Journals written before trials were repeated have no trial column, and
+    # those written before records were written have no records size.
+    @staticmethod
+    def fromRow(row: list[str]) -> Self:
+        return JournalEntry(row[0], row[1], row[2], int(row[3]), int(row[4]), float(row[5]), int(row[6]), int(row[7]), float(row[8]),
+            int(row[9]) if len(row) > 9 else 1, int(row[10]) if len(row) > 10 and row[10] != "" else None)
+
+    def toRow(self) -> list:
+        return [self.unit.engine, self.unit.model_name, self.unit.category, self.unit.query_index, self.exit_code, self.elapsed, self.out_size, self.err_size, self.finished_at, self.unit.trial,
+            "" if self.records_size is None else self.records_size]
+
+# Append-only record of the finished trials of the benchmark in
+# current-benchmark. Each entry also stores the size of the .out/.err files
+# right after the trial was written, so output written by a trial that never
+# made it into the journal can be cut off again when resuming.
+class BenchmarkJournal:
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries: dict[str, list[JournalEntry]] = {}
+        if path.exists():
+            with path.open("r", newline='') as f:
+                for row in csv.reader(f):
+                    try:
+                        entry = JournalEntry.fromRow(row)
+                    except (IndexError, ValueError):
+                        continue
+                    self.entries.setdefault(entry.unit.get_key(), []).append(entry)
+
+    def engines(self) -> set[str]:
+        return set(trials[0].unit.engine for trials in self.entries.values())
+
+    def trials(self, unit: BenchmarkUnit) -> list[JournalEntry]:
+        return self.entries.get(unit.get_key(), [])
+
+    # Whether every finished unit has its record, so the records of a resumed
+    # benchmark are only written if none are missing.
+    def has_records(self) -> bool:
+        return all(entry.records_size is not None for entry in chain.from_iterable(self.entries.values()))
+
+    def record(self, output: UnitOutput, out_size: int, err_size: int, records_size: Optional[int]):
+        entry = JournalEntry(output.unit.engine, output.unit.model_name, output.unit.category, output.unit.query_index, output.exit_code, output.elapsed, out_size, err_size, time.time(), output.unit.trial, records_size)
+        with self.path.open("a", newline='') as f:
+            csv.writer(f).writerow(entry.toRow())
+            f.flush()
+            os.fsync(f.fileno())
+        self.entries.setdefault(entry.unit.get_key(), []).append(entry)
+
+    def restore_outputs(self, config: BenchmarkConfig):
+        sizes: dict[str, dict[str, int]] = {}
+        for entry in sorted(chain.from_iterable(self.entries.values()), key=lambda x: x.finished_at):
+            sizes[str(entry.unit.get_output_prefix(config))] = {".out": entry.out_size, ".err": entry.err_size, ".jsonl": entry.records_size or 0}
+        for outputPath in chain(config.output_path.glob("*.out"), config.output_path.glob("*.err"), config.output_path.glob("*.jsonl")):
+            prefix = str(outputPath.with_suffix(""))
+            with outputPath.open("r+b") as f:
+                f.truncate(sizes.get(prefix, {}).get(outputPath.suffix, 0))
+
+# The .out, .err and .jsonl files are gzip compressed one by one unless the
+# archives are plain, and the index written next to the archive lets
+# process-results.py read the files of each model without reading the others.
+def pack_results(engine: str, config: BenchmarkConfig):
+    (config.output_path / "large").write_text("\n")
+    config.packed_path.mkdir(parents=True, exist_ok=True)
+    archive_path = config.packed_path / f"{engine}.tar"
+    with tarfile.open(str(archive_path), "w") as tarFile:
+        if config.compress_archives:
+            for path in sorted(config.output_path.iterdir()):
+                if path.name != JOURNAL_FILE_NAME:
+                    add_file(tarFile, path, f"./{path.name}", path.suffix in (".out", ".err", ".jsonl"))
+        else:
+            tarFile.add(str(config.output_path), arcname=".", filter=lambda x: None if x.name.endswith(JOURNAL_FILE_NAME) else x)
+    write_index(archive_path)
+
+# The runtime and status of a unit predicted from its earlier results. The
+# status is only predicted when every earlier result failed the same way.
+class UnitPrediction:
+    def __init__(self, time: float, status: Optional[str]):
+        self.time = time
+        self.status = status
+
+# Orders the units of a benchmark by their predicted runtime and sets apart
+# the ones that are known to fail. The predictions come from the results of
+# the same engine, search strategy and query in results.db.
+class UnitPlanner:
+    def __init__(self, results_path: Path, timeout: int, order: str, known_failures: str):
+        self.timeout = timeout
+        self.order = order
+        self.known_failures = known_failures
+        self.history: dict[str, list[tuple[str, Optional[float]]]] = {}
+        if (order != "file" or known_failures != "run") and results_path.exists():
+            with closing(sqlite3.connect(f"file:{results_path}?mode=ro", uri=True)) as db, closing(db.execute("""
+                SELECT e.name, qi.model_name, qi.query_name, qi.query_index, qr.status, qr.time FROM query_result qr
+                    JOIN query_instance qi ON qi.id = qr.query_instance_id
+                    JOIN experiment e ON e.id = qr.experiment_id
+                WHERE e.search_strategy = ?
+            """, (f"{SUCCESSOR_GENERATOR}_{SEARCH_STRATEGY}",))) as cur:
+                for engine, model_name, query_name, query_index, status, time in cur:
+                    key = BenchmarkUnit(engine, model_name, query_name, query_index).get_key()
+                    self.history.setdefault(key, []).append((status, time))
+
+    # Units without earlier results are predicted to take the full timeout.
+    def predict(self, unit: BenchmarkUnit) -> UnitPrediction:
+        results = self.history.get(unit.get_key(), [])
+        if len(results) == 0:
+            return UnitPrediction(self.timeout, None)
+        times = [self.timeout if status == "Timeout" or time is None else min(time, self.timeout) for status, time in results]
+        statuses = set(status for status, _ in results)
+        status = statuses.pop() if len(statuses) == 1 else None
+        return UnitPrediction(sum(times) / len(times), status if status in FAILURE_OUTPUTS else None)
+
+    # The units to run in the order they are started, and the units that are
+    # skipped with their predicted status.
+    def plan(self, units: list[BenchmarkUnit]) -> tuple[list[BenchmarkUnit], list[tuple[BenchmarkUnit, str]]]:
+        if self.order == "file" and self.known_failures == "run":
+            return units, []
+        predictions = {unit.get_key(): self.predict(unit) for unit in units}
+        if self.order != "file":
+            sign = -1 if self.order == "longest-first" else 1
+            units = sorted(units, key=lambda unit: sign * predictions[unit.get_key()].time)
+        if self.known_failures == "run":
+            return units, []
+        failing = [unit for unit in units if predictions[unit.get_key()].status is not None]
+        others = [unit for unit in units if predictions[unit.get_key()].status is None]
+        if self.known_failures == "last":
+            return others + failing, []
+        return others, [(unit, predictions[unit.get_key()].status) for unit in failing]
+
+# Stands in for the output of a unit that was not run because it is known to
+# fail, so it is still counted with its predicted status. The PREDICTED_STATUS
+# line marks the result as predicted, so it is not taken for a real run.
+def create_skipped_output(unit: BenchmarkUnit, status: str) -> UnitOutput:
+    out, err = FAILURE_OUTPUTS[status]
+    out = unit.get_header() + f"{PREDICTED_STATUS}{status} from earlier results\n" + out
+    err = unit.get_header() + err
+    return UnitOutput(unit, out, err, SKIPPED_EXIT_CODE, 0, create_record(unit, out, err, SKIPPED_EXIT_CODE, {}))
+
+# Decides how often a unit is run. Every unit gets trials runs, and up to
+# max_trials while its median time is below short_time or the confidence
+# interval of the median is wider than max_spread of it. Units that failed
+# are not repeated, as their time says nothing about the engine's speed.
+class TrialPolicy:
+    def __init__(self, trials: int, max_trials: int, short_time: float, max_spread: float):
+        self.trials = trials
+        self.max_trials = max(max_trials, trials)
+        self.short_time = short_time
+        self.max_spread = max_spread
+
+    def needs_trial(self, trials: list[JournalEntry]) -> bool:
+        if len(trials) == 0:
+            return True
+        if any(trial.exit_code not in (0, 1, 2) for trial in trials) or len(trials) >= self.max_trials:
+            return False
+        if len(trials) < self.trials:
+            return True
+        median, low, high = median_confidence_interval([trial.elapsed for trial in trials])
+        return median < self.short_time or high - low > self.max_spread * median
+
+# The units that run together. With batching these are the units of a model,
+# category and trial in the order their first unit was planned in, otherwise
+# each unit runs on its own.
+def group_units(units: list[BenchmarkUnit], batch: bool) -> list[list[BenchmarkUnit]]:
+    if not batch:
+        return [[unit] for unit in units]
+    groups: dict[tuple[str, str, int], list[BenchmarkUnit]] = {}
+    for unit in units:
+        groups.setdefault((unit.model_name, unit.category, unit.trial), []).append(unit)
+    return list(groups.values())
+
+def read_lines(path: Path) -> list[str]:
+    return [line.strip() for line in path.read_text().splitlines() if line.strip() != ""]
+
+def run_engine(engine: str, units: list[BenchmarkUnit], config: BenchmarkConfig, planner: UnitPlanner, policy: TrialPolicy, jobs: int, batch: bool):
+    if (config.packed_path / f"{engine}.tar").exists():
+        print(f"Skipping {engine} benchmark, already done.")
+        return
+    journal = BenchmarkJournal(config.output_path / JOURNAL_FILE_NAME)
+    if len(journal.entries) > 0 and journal.engines() == {engine}:
+        print(f"resuming {engine} benchmark, {len(journal.entries)} queries already done")
+        journal.restore_outputs(config)
+    else:
+        print(f"starting {engine} benchmark")
+        if config.output_path.exists():
+            shutil.rmtree(config.output_path)
+        config.output_path.mkdir(parents=True)
+        journal = BenchmarkJournal(config.output_path / JOURNAL_FILE_NAME)
+    write_records = journal.has_records()
+    remaining, skipped = planner.plan([unit for unit in units if len(journal.trials(unit)) == 0])
+    # Units interrupted between two of their trials continue with the next.
+    repeated = [unit.with_trial(len(journal.trials(unit)) + 1) for unit in units if len(journal.trials(unit)) > 0 and policy.needs_trial(journal.trials(unit))]
+    finished = len(units) - len(remaining) - len(skipped) - len(repeated)
+    for unit, status in skipped:
+        output = create_skipped_output(unit, status)
+        journal.record(output, *write_output(output, config, write_records))
+        finished += 1
+    if len(skipped) > 0:
+        print(f"Skipped {len(skipped)} queries that are known to fail, recorded with their predicted status")
+    batch = batch and engine in BATCH_ENGINES
+    pending = deque(group_units(repeated + remaining, batch))
+    for outputs in run_units(pending, config, jobs, batch):
+        next_trials = []
+        for output in outputs:
+            journal.record(output, *write_output(output, config, write_records))
+            trials = journal.trials(output.unit)
+            if policy.needs_trial(trials):
+                next_trials.append(output.unit.with_trial(len(trials) + 1))
+            else:
+                finished += 1
+            trial = f" trial {output.unit.trial}" if output.unit.trial > 1 else ""
+            print(f"[{finished}/{len(units)}] {output.unit.get_key()}{trial} exited with {output.exit_code} after {output.elapsed:.1f}s")
+        if len(next_trials) > 0:
+            pending.append(next_trials)
+    if all(not policy.needs_trial(journal.trials(unit)) for unit in units):
+        pack_results(engine, config)
+
+def main():
+    parser = ArgumentParser(prog="Runs the benchmark for every engine on a pool of worker processes")
+    parser.add_argument("engines", nargs='*', default=list(ENGINE_OPTIONS.keys()), help=f"engines to run, any of {', '.join(ENGINE_OPTIONS.keys())}")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="maximum number of verifypn processes running at once")
+    parser.add_argument("--memory-per-job", type=int, default=MEMORY_PER_JOB_KB, help="memory budget (ulimit -v) of each job in kB")
+    parser.add_argument("--timeout", type=int, default=PER_QUERY_TIMEOUT, help="timeout of each query in seconds")
+    parser.add_argument("--order", choices=ORDERS, default="file", help="runs the queries in file order or ordered by their runtime predicted from results.db")
+    parser.add_argument("--known-failures", choices=KNOWN_FAILURE_POLICIES, default="run", help="runs the queries that timed out or ran out of memory or bindings in every earlier result as usual, last, or skips them and records their predicted status")
+    parser.add_argument("--results", type=Path, default=Path("artifacts/results.db"), help="the results database the predictions are made from")
+    parser.add_argument("--trials", type=int, default=1, help="number of times each query is run")
+    parser.add_argument("--max-trials", type=int, default=None, help="runs queries up to this many times while they are shorter than --short-time or their median time is uncertain by more than --max-spread")
+    parser.add_argument("--short-time", type=float, default=SHORT_TRIAL_TIME, help="queries with a median time below this many seconds get trials up to --max-trials")
+    parser.add_argument("--max-spread", type=float, default=MAX_TRIAL_SPREAD, help="queries whose 95%% confidence interval of the median time is wider than this fraction of it get trials up to --max-trials")
+    parser.add_argument("--batch", default=False, action="store_true", help=f"runs all queries of a model and category in one verifypn process for the engines that support it ({', '.join(sorted(BATCH_ENGINES))}), with the time spent on none of them recorded as their shared time")
+    parser.add_argument("--plain-archives", default=False, action="store_true", help="packs the results of each engine into a plain tar instead of compressing each file in it")
+    parser.add_argument("--sample-interval", type=float, default=SAMPLE_INTERVAL, help="seconds between two samples of the memory and CPU time of a query, 0 disables sampling")
+    parser.add_argument("--models", type=Path, default=Path("target-models.txt"), help="file with one model name per line")
+    parser.add_argument("--units", type=Path, default=None, help="only runs the units listed in this file as <engine>:<model>:<category>:<index>, like the shards written by shard_benchmark.py")
+    parser.add_argument("--output-dir", type=Path, default=Path("artifacts"), help="directory of current-benchmark and packed-results")
+    parser.add_argument("--verifypn", type=Path, default=Path("artifacts/verifypn-linux64"))
+    args = parser.parse_args()
+    for engine in args.engines:
+        if engine not in ENGINE_OPTIONS:
+            parser.error(f"unknown engine {engine}")
+
+    artifacts_path = Path("artifacts")
+    config = BenchmarkConfig(
+        args.verifypn,
+        artifacts_path / "all-models",
+        artifacts_path / "model-archives",
+        args.output_dir / "current-benchmark",
+        args.output_dir / "packed-results",
+        args.timeout,
+        args.memory_per_job,
+        args.sample_interval,
+        not args.plain_archives,
+    )
+    unit_keys = None
+    if args.units is None:
+        model_names = read_lines(args.models)
+    else:
+        unit_lines = read_lines(args.units)
+        unit_keys = set(unit_lines)
+        model_names = list(dict.fromkeys(key.split(":")[1] for key in unit_lines))
+    planner = UnitPlanner(args.results, args.timeout, args.order, args.known_failures)
+    policy = TrialPolicy(args.trials, args.trials if args.max_trials is None else args.max_trials, args.short_time, args.max_spread)
+    for engine in args.engines:
+        units = create_units(engine, model_names)
+        if unit_keys is not None:
+            units = [unit for unit in units if unit.get_key() in unit_keys]
+            if len(units) == 0:
+                continue
+        run_engine(engine, units, config, planner, policy, args.jobs, args.batch)
+
+if __name__ == "__main__":
+    main()
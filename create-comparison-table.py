@@ -1,6 +1,7 @@
 #!/usr/bin/python3
 from argparse import ArgumentParser
 from itertools import islice
+from pathlib import Path
 import sqlite3
 
 from analysis_helper import Experiment, getExperimentId
@@ -14,8 +15,10 @@ prettyNames = {
 def main():
     parser = ArgumentParser(prog="Generates cactus graphs for all given experiments")
     parser.add_argument("experiments", nargs='+', help="all experiments included in the matrix in <name>-<strategy> format")    
+    parser.add_argument("--exclude-wrong", help="Counts answers that differ from the consensus as not answered", default=False, action="store_true")
+    parser.add_argument("--results", type=Path, help="The results database the table is made from", default=Path("artifacts/results.db"))
     args = parser.parse_args()
-    db = sqlite3.connect("artifacts/results.db")
+    db = sqlite3.connect(str(args.results))
 
     experimentIds = map(lambda e: getExperimentId(db, Experiment.fromFormat(e)), args.experiments)
 
@@ -35,6 +38,7 @@ def main():
             LEFT JOIN query_instance qi ON qi.id = qr.query_instance_id
             LEFT JOIN experiment e ON e.id = qr.experiment_id
         WHERE e.id IN ({",".join(map(lambda x: str(x), experimentIds))}) AND qi.query_name != 'ReachabilityDeadlock' AND qr.status = "Answered"
+            {"AND qr.id NOT IN (SELECT query_result_id FROM wrong_answer)" if args.exclude_wrong else ""}
         GROUP BY qr.experiment_id
         ORDER BY all_total DESC
     """)
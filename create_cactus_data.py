@@ -8,7 +8,7 @@ import sqlite3
 import sys
 from typing import List, Optional
 
-from analysis_helper import Experiment, getExperimentId
+from analysis_helper import Experiment, createTrivialQueryTable, getExperimentId
 
 
 parser = ArgumentParser(prog="Generates cactus graphs for all given experiments")
@@ -16,69 +16,49 @@ parser.add_argument("time_lower_threshold", type=float)
 parser.add_argument("experiments", nargs='+', help="all experiments included in the matrix in <name>-<strategy> format")
 parser.add_argument("--category", help="limits the cactus plot to one category", default=None)
 parser.add_argument("--memory", help="Uses memory instead of time", default=False, action="store_true")
+parser.add_argument("--exclude-wrong", help="Counts answers that differ from the consensus as not answered", default=False, action="store_true")
+parser.add_argument("--results", type=Path, help="The results database the graphs are made from", default=Path("artifacts/results.db"))
 args = parser.parse_args()
 
 CATEGORY = args.category
 USE_MEMORY = args.memory
+WRONG_ANSWER_FILTER = "AND qr.id NOT IN (SELECT query_result_id FROM wrong_answer)" if args.exclude_wrong else ""
 
-con = sqlite3.connect("artifacts/results.db")
+con = sqlite3.connect(str(args.results))
 
 allExperimentIds = [getExperimentId(con, Experiment.fromFormat(experimentFormat)) for experimentFormat in args.experiments]
 allExperiments: List[Experiment] = [Experiment.fromFormat(experimentFormat) for experimentFormat in args.experiments]
 
-def getSkipCount(con: sqlite3.Connection, all_experiments: List[int], time_lower_threshold: float):
-    cur = con.execute(f"""
-        SELECT COUNT(*) FROM (
-        SELECT 
-            iqi.id
-        FROM query_result iqr
-            LEFT JOIN query_instance iqi ON iqi.id = iqr.query_instance_id
-        WHERE iqr.experiment_id IN ({("?," * len(all_experiments))[:-1]})
-        GROUP BY iqr.query_instance_id
-        HAVING MAX(iqr.time) < ? AND COUNT(iqr.time) = COUNT(*))
-    """, (*all_experiments, time_lower_threshold))
+def getSkipCount(con: sqlite3.Connection, trivialTable: str):
+    cur = con.execute(f"SELECT COUNT(*) FROM {trivialTable}")
     return cur.fetchone()[0]
 
-skipCount = getSkipCount(con, allExperimentIds, args.time_lower_threshold)
+trivialTimeTable = createTrivialQueryTable(con, "time", allExperimentIds, args.time_lower_threshold)
+skipCount = getSkipCount(con, trivialTimeTable)
 
-def getTimes(con: sqlite3.Connection, experiment: int, all_experiments: List[int], time_lower_threshold: float, category: Optional[str]):
+def getTimes(con: sqlite3.Connection, experiment: int, trivialTable: str, category: Optional[str]):
     cur = con.execute(f"""
-        SELECT qr.time FROM query_result qr
+        SELECT COALESCE(ts.median_time, qr.time) AS time FROM query_result qr
             LEFT JOIN query_instance qi ON qi.id = qr.query_instance_id
-        WHERE qr.experiment_id = ? AND qr.status = "Answered" 
+            LEFT JOIN trial_summary ts ON ts.query_result_id = qr.id
+        WHERE qr.experiment_id = ? AND qr.status = "Answered" {WRONG_ANSWER_FILTER}
             AND qi.query_name != 'ReachabilityDeadlock'
             AND (qi.query_name = ? OR ? IS NULL)
-            AND qr.query_instance_id NOT IN (
-            SELECT 
-                iqi.id
-                FROM query_result iqr
-                LEFT JOIN query_instance iqi ON iqi.id = iqr.query_instance_id
-                WHERE iqr.experiment_id IN ({("?," * len(all_experiments))[:-1]})
-                GROUP BY iqr.query_instance_id
-                HAVING MAX(iqr.time) < ? AND COUNT(iqr.time) = COUNT(*)
-            )
-            ORDER BY qr.time
-    """, (experiment, category, category, *all_experiments, time_lower_threshold))
+            AND qr.query_instance_id NOT IN (SELECT query_instance_id FROM {trivialTable})
+            ORDER BY time
+    """, (experiment, category, category))
     return [(skipCount + i, 0.0001 if time[0] == 0 else time[0]) for i, time in enumerate(cur.fetchall())]
 
-def getMemory(con: sqlite3.Connection, experiment: int, all_experiments: List[int], memory_lower_threshold: float, category: Optional[str]):
+def getMemory(con: sqlite3.Connection, experiment: int, trivialTable: str, category: Optional[str]):
     cur = con.execute(f"""
         SELECT qr.max_memory FROM query_result qr
             LEFT JOIN query_instance qi ON qi.id = qr.query_instance_id
-        WHERE qr.experiment_id = ? AND qr.status = "Answered" 
+        WHERE qr.experiment_id = ? AND qr.status = "Answered" {WRONG_ANSWER_FILTER}
             AND qi.query_name != 'ReachabilityDeadlock'
             AND (qi.query_name = ? OR ? IS NULL)
-            AND qr.query_instance_id NOT IN (
-            SELECT 
-                iqi.id
-                FROM query_result iqr
-                LEFT JOIN query_instance iqi ON iqi.id = iqr.query_instance_id
-                WHERE iqr.experiment_id IN ({("?," * len(all_experiments))[:-1]})
-                GROUP BY iqr.query_instance_id
-                HAVING MAX(iqr.max_memory) < ? AND COUNT(iqr.max_memory) = COUNT(*)
-            )
+            AND qr.query_instance_id NOT IN (SELECT query_instance_id FROM {trivialTable})
             ORDER BY qr.max_memory
-    """, (experiment, category, category, *all_experiments, memory_lower_threshold))
+    """, (experiment, category, category))
     return [(skipCount + i, 0.0001 if time[0] == 0 else time[0]) for i, time in enumerate(cur.fetchall())]
 
 def createTab(out: TextIOWrapper, data: List[tuple[int, float]]):
@@ -87,6 +67,9 @@ def createTab(out: TextIOWrapper, data: List[tuple[int, float]]):
         i, time = dataPoint
         out.write(f"{i}\t{time}\n")
 
+if USE_MEMORY:
+    trivialMemoryTable = createTrivialQueryTable(con, "max_memory", allExperimentIds, args.time_lower_threshold)
+
 graphsDir = Path("document/graphs")
 graphsDir.mkdir(exist_ok=True)
 cactusDir = graphsDir / "cactus"
@@ -99,6 +82,6 @@ for experiment in allExperiments:
         postfix = f"_{CATEGORY}"
     with (graphsDir / f"cactus/{experiment.name}{postfix}{"-memory" if USE_MEMORY else ""}.tab").open("w") as f:
         if USE_MEMORY:
-            createTab(f, getMemory(con, id, allExperimentIds, args.time_lower_threshold, CATEGORY))
+            createTab(f, getMemory(con, id, trivialMemoryTable, CATEGORY))
         else:
-            createTab(f, getTimes(con, id, allExperimentIds, args.time_lower_threshold, CATEGORY))
+            createTab(f, getTimes(con, id, trivialTimeTable, CATEGORY))
@@ -0,0 +1,96 @@
+#!/usr/bin/python3
+from argparse import ArgumentParser
+from pathlib import Path
+import sqlite3
+import sys
+from typing import Self
+
+from query_lookup import Experiment, getExperimentId, getQueryResultId, getResourceSamples
+from create_plots import prettyNames
+
+PLOT_STYLES = ["solid,very thick,blue", "dashed,very thick,red", "dotted,very thick,black", "dashdotted,very thick,green"]
+
+class QuerySpec:
+    def __init__(self, model_name: str, query_name: str, query_index: int):
+        self.model_name = model_name
+        self.query_name = query_name
+        self.query_index = query_index
+
+    @staticmethod
+    def fromFormat(format: str) -> Self:
+        model_name, query_name, query_index = format.rsplit(":", 2)
+        return QuerySpec(model_name, query_name, int(query_index))
+
+    def getFileName(self) -> str:
+        return f"{self.model_name}_{self.query_name}_{self.query_index}"
+
+def createTab(samples: list[tuple[float, float, float, float]]) -> str:
+    lines = ["time\tmemory\n"]
+    for elapsed, memory, _, _ in samples:
+        lines.append(f"{elapsed}\t{memory:.0f}\n")
+    return "".join(lines)
+
+def createFigure(query: QuerySpec, plots: list[tuple[str, str]]) -> str:
+    lines = [
+        r"\begin{figure}[t]",
+        r"\centering",
+        r"    \pgfplotsset{width=8cm,height=6cm,compat=1.3}",
+        r"    \begin{tikzpicture}",
+        r"    \begin{axis}[",
+        r"        xmin=0,",
+        r"        ymin=0,",
+        r"        legend pos=north west,",
+        r"        xlabel={\scriptsize Time (s)},",
+        r"        ylabel={\scriptsize Memory (KB)},",
+        r"        thick,",
+        r"        grid=major,",
+        r"        legend cell align={left}",
+        r"    ]",
+        "",
+    ]
+    for (name, path), style in zip(plots, PLOT_STYLES * len(plots)):
+        lines.append(f"    \\addplot+[mark=none,{style}] table [x=time,y=memory] {{{path}}};")
+        lines.append(f"    \\addlegendentry{{{prettyNames.get(name, name)}}}")
+        lines.append("")
+    lines.extend([
+        r"    \end{axis}",
+        r"    \end{tikzpicture}",
+        f"    \\caption{{Memory over time of {query.model_name} {query.query_name} {query.query_index}}}",
+        f"    \\label{{fig:memory-{query.getFileName()}}}",
+        r"\end{figure}",
+    ])
+    return "\n".join(lines) + "\n"
+
+def main():
+    parser = ArgumentParser(prog="Generates memory over time graphs of single queries for the given experiments")
+    parser.add_argument("experiments", nargs='+', help="all experiments included in the graphs in <name>-<strategy> format")
+    parser.add_argument("--query", action="append", required=True, help="a query in <model>:<category>:<index> format, can be given multiple times")
+    parser.add_argument("--results", type=Path, default=Path("artifacts/results.db"), help="the results database the graphs are made from")
+    args = parser.parse_args()
+
+    con = sqlite3.connect(str(args.results))
+    experiments = [Experiment.fromFormat(experimentFormat) for experimentFormat in args.experiments]
+    experimentIds = [getExperimentId(con, experiment) for experiment in experiments]
+    documentDir = Path("document")
+    memoryDir = documentDir / "graphs" / "memory"
+    memoryDir.mkdir(parents=True, exist_ok=True)
+
+    figures = []
+    for query in map(QuerySpec.fromFormat, args.query):
+        plots = []
+        for experiment, id in zip(experiments, experimentIds):
+            queryResultId = getQueryResultId(con, id, query.model_name, query.query_name, query.query_index)
+            samples = None if queryResultId is None else getResourceSamples(con, queryResultId)
+            if samples is None or len(samples) == 0:
+                print(f"No resource samples of {query.getFileName()} for {experiment.name}", file=sys.stderr)
+                continue
+            path = Path("graphs") / "memory" / f"{experiment.name}_{query.getFileName()}.tab"
+            (documentDir / path).write_text(createTab(samples))
+            plots.append((experiment.name, str(path)))
+        if len(plots) > 0:
+            figures.append(createFigure(query, plots))
+    (documentDir / "memory-over-time.tex").write_text("\n".join(figures))
+    print(f"Wrote {len(figures)} memory over time graphs to {documentDir / 'memory-over-time.tex'}")
+
+if __name__ == "__main__":
+    main()
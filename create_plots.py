@@ -0,0 +1,217 @@
+#!/usr/bin/python3
+from argparse import ArgumentParser
+import hashlib
+from itertools import combinations
+import json
+import numpy as np
+from pathlib import Path
+import sqlite3
+from typing import Callable, List, Optional
+
+from analysis_helper import Experiment, ResultsFrame, clampRatioIntervals, clampRatios, getExperimentId
+from trial_statistics import MIN_CONFIDENT_VALUES
+
+
+CATEGORIES = [None, "ReachabilityCardinality", "ReachabilityFireability"]
+CARDINALITY_CATEGORIES = ["ReachabilityCardinality", "LTLCardinality"]
+FIREABILITY_CATEGORIES = ["ReachabilityFireability", "LTLFireability"]
+# Bump when the content of the generated files changes, so they are all redone.
+OUTPUT_VERSION = 2
+
+prettyNames = {
+    "Baseline": "Unfolding",
+    "ExplicitCPN": "Explicit",
+}
+
+# The results of the plotted experiments, loaded once. The hash of each
+# experiment identifies the rows the outputs made from it depend on.
+class PlotData:
+    def __init__(self, con: sqlite3.Connection, experiments: List[Experiment]):
+        self.experiments = experiments
+        self.experiment_ids = [getExperimentId(con, experiment) for experiment in experiments]
+        self.frame = ResultsFrame.load(con, self.experiment_ids)
+        self.hashes: dict[int, str] = {}
+        for id in self.experiment_ids:
+            experimentFrame = self.frame.forExperiment(id)
+            experimentHash = hashlib.blake2b(digest_size=16)
+            for name in ResultsFrame.CATEGORICAL_COLUMNS:
+                experimentHash.update(repr(experimentFrame.values(name)).encode())
+            for name in ResultsFrame.NUMERIC_COLUMNS:
+                experimentHash.update(experimentFrame[name].tobytes())
+            self.hashes[id] = experimentHash.hexdigest()
+
+    def getInputHash(self, output: str, experimentIds: List[int]) -> str:
+        inputHash = hashlib.blake2b(digest_size=16)
+        inputHash.update(f"{OUTPUT_VERSION}:{output}".encode())
+        for id in experimentIds:
+            inputHash.update(self.hashes[id].encode())
+        return inputHash.hexdigest()
+
+def getCactus(frame: ResultsFrame, answered: np.ndarray, experimentId: int, skipCount: int, trivial: np.ndarray, column: str, category: Optional[str]) -> List[tuple[int, float]]:
+    mask = (frame.isExperiment(experimentId) & answered & frame.isCategory(category)
+        & ~frame.isValue("query_name", "ReachabilityDeadlock") & ~np.isin(frame["query_instance_id"], trivial))
+    values = np.sort(frame[column][mask])
+    return list(enumerate(np.where(values == 0, 0.0001, values).tolist(), skipCount))
+
+# Time ratios come with the low and high bound of their confidence interval.
+def getRatios(frame: ResultsFrame, experimentA: int, experimentB: int, column: str, category: Optional[str]) -> List[tuple]:
+    a, b = frame.select(frame.isExperiment(experimentA) & frame.isCategory(category)).align(frame.forExperiment(experimentB))
+    if column == "time":
+        ratios, low, high = clampRatioIntervals(*ResultsFrame.getTimeRatioIntervals(a, b))
+        return list(zip(range(len(ratios)), ratios.tolist(), low.tolist(), high.tolist()))
+    return list(enumerate(clampRatios(ResultsFrame.getRatios(a, b, column)).tolist()))
+
+def createTab(data: List[tuple], columns: List[str], valueFormat: str) -> str:
+    lines = [f"counter\t{"\t".join(columns)}\n"]
+    for i, *values in data:
+        lines.append(f"{i}\t{"\t".join(f"{value:{valueFormat}}" for value in values)}\n")
+    return "".join(lines)
+
+def createComparisonTable(data: PlotData, answered: np.ndarray) -> str:
+    frame = data.frame
+    answered = answered & ~frame.isValue("query_name", "ReachabilityDeadlock")
+    positive = (frame.isValue("query_type", "ef") & frame.isValue("result", "Satisfied")) | (frame.isValue("query_type", "ag") & frame.isValue("result", "Unsatisfied"))
+    negative = (frame.isValue("query_type", "ag") & frame.isValue("result", "Satisfied")) | (frame.isValue("query_type", "ef") & frame.isValue("result", "Unsatisfied"))
+    groups = [np.ones(len(frame), dtype=bool), frame.isIn("query_name", CARDINALITY_CATEGORIES), frame.isIn("query_name", FIREABILITY_CATEGORIES)]
+    tableRows: list[tuple[str, list[int]]] = []
+    for experiment, id in zip(data.experiments, data.experiment_ids):
+        rows = answered & frame.isExperiment(id)
+        counts = [int(np.count_nonzero(rows & group & kind)) for group in groups for kind in (rows, positive, negative)]
+        if counts[0] > 0:
+            tableRows.append((experiment.name, counts))
+    tableRows.sort(key=lambda x: -x[1][0])
+    lines = [
+        r"\begin{table}[htbp]",
+        r"\centering",
+        r"\begin{tabular}{|l|c|c|c|c|c|c|c|c|c|}",
+        r"\hline",
+        r"\multirow{2}{*}{Engine}&\multicolumn{3}{c|}{All}&\multicolumn{3}{c|}{Cardinality}&\multicolumn{3}{c|}{Fireability}",
+        r"\\\cline{2-10}",
+        r"&$\ast$&+&-&$\ast$&+&-&$\ast$&+&-",
+        r"\\\hline",
+    ]
+    for name, counts in tableRows:
+        lines.append(f"{prettyNames[name]}&{"&".join(map(str, counts))}\n\\\\")
+        lines.append(r"\hline")
+    lines.extend([
+        r"\end{tabular}",
+        r"\caption{Comparison of Explicit and Unfolding where + means positive answers, - means negative answers and $\ast$ means both}",
+        r"\label{tab:comparison-table}",
+        r"\end{table}",
+    ])
+    return "\n".join(lines) + "\n"
+
+# For every pair of experiments, the queries both answered where the first is
+# faster or slower than the second with 95% confidence, meaning the confidence
+# intervals of their median times do not overlap, and the median time ratio.
+# Only queries with enough trials in both for a real interval are decided.
+def createSpeedupTable(data: PlotData, answered: np.ndarray) -> str:
+    frame = data.frame
+    answered = answered & ~frame.isValue("query_name", "ReachabilityDeadlock")
+    lines = [
+        r"\begin{table}[htbp]",
+        r"\centering",
+        r"\begin{tabular}{|l|c|c|c|c|c|}",
+        r"\hline",
+        r"Engines&Both answered&Faster&Slower&Undecided&Median ratio",
+        r"\\\hline",
+    ]
+    for (experimentA, idA), (experimentB, idB) in combinations(zip(data.experiments, data.experiment_ids), 2):
+        a, b = frame.select(answered & frame.isExperiment(idA)).align(frame.select(answered & frame.isExperiment(idB)))
+        decided = (a["trial_count"] >= MIN_CONFIDENT_VALUES) & (b["trial_count"] >= MIN_CONFIDENT_VALUES)
+        faster = int(np.count_nonzero(decided & (a["time_high"] < b["time_low"])))
+        slower = int(np.count_nonzero(decided & (a["time_low"] > b["time_high"])))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratios = a["time"] / b["time"]
+        ratios = ratios[np.isfinite(ratios)]
+        medianRatio = f"{np.median(ratios):.3f}" if len(ratios) > 0 else "-"
+        lines.append(f"{prettyNames[experimentA.name]}/{prettyNames[experimentB.name]}&{len(a)}&{faster}&{slower}&{len(a) - faster - slower}&{medianRatio}\n\\\\")
+        lines.append(r"\hline")
+    lines.extend([
+        r"\end{tabular}",
+        rf"\caption{{Queries where the first engine is faster or slower than the second with 95\% confidence over at least {MIN_CONFIDENT_VALUES} trials each, and the median ratio of their median times}}",
+        r"\label{tab:speedup-table}",
+        r"\end{table}",
+    ])
+    return "\n".join(lines) + "\n"
+
+# Writes an output only when the rows it is made from changed since the last
+# run, or when it is missing.
+class OutputWriter:
+    def __init__(self, hashesPath: Path, force: bool):
+        self.hashes_path = hashesPath
+        self.hashes: dict[str, str] = {}
+        if hashesPath.exists() and not force:
+            with hashesPath.open("r") as f:
+                self.hashes = json.load(f)
+        self.written = 0
+        self.skipped = 0
+
+    def write(self, path: Path, inputHash: str, create: Callable[[], str]):
+        if self.hashes.get(str(path)) == inputHash and path.exists():
+            self.skipped += 1
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(create())
+        self.hashes[str(path)] = inputHash
+        self.written += 1
+
+    def save(self):
+        with self.hashes_path.open("w") as f:
+            json.dump(self.hashes, f, indent=1, sort_keys=True)
+
+def main():
+    parser = ArgumentParser(prog="Generates all cactus and ratio graphs and the comparison table for the given experiments")
+    parser.add_argument("experiments", nargs='+', help="all experiments included in the graphs in <name>-<strategy> format")
+    parser.add_argument("--time-lower-threshold", type=float, default=-1, help="leaves out queries every experiment answers faster than this in the cactus graphs")
+    parser.add_argument("--force", default=False, action="store_true", help="regenerates every output even if its input did not change")
+    parser.add_argument("--exclude-wrong", default=False, action="store_true", help="counts answers that differ from the consensus as not answered in the cactus graphs and the comparison table")
+    parser.add_argument("--results", type=Path, default=Path("artifacts/results.db"), help="the results database the graphs are made from")
+    args = parser.parse_args()
+
+    con = sqlite3.connect(str(args.results))
+    print("Loading results...")
+    data = PlotData(con, [Experiment.fromFormat(experimentFormat) for experimentFormat in args.experiments])
+    con.close()
+
+    documentDir = Path("document")
+    graphsDir = documentDir / "graphs"
+    graphsDir.mkdir(parents=True, exist_ok=True)
+    writer = OutputWriter(graphsDir / "input-hashes.json", args.force)
+    experimentIds = data.experiment_ids
+    threshold = args.time_lower_threshold
+    trivialTime = data.frame.getTrivialQueryInstances("time", threshold)
+    trivialMemory = data.frame.getTrivialQueryInstances("max_memory", threshold)
+    answered = data.frame.isStatus("Answered")
+    if args.exclude_wrong:
+        answered &= ~data.frame.isWrong()
+    answeredKey = "correct" if args.exclude_wrong else "all"
+
+    for category in CATEGORIES:
+        postfix = "" if category is None else f"_{category}"
+        for useMemory in (False, True):
+            memoryPostfix = "-memory" if useMemory else ""
+            print(f"Creating ratio and cactus data with category {category or 'all'}{' for memory' if useMemory else ''}")
+            trivial = trivialMemory if useMemory else trivialTime
+            column = "max_memory" if useMemory else "time"
+            for experiment, id in zip(data.experiments, experimentIds):
+                path = graphsDir / "cactus" / f"{experiment.name}{postfix}{memoryPostfix}.tab"
+                writer.write(path, data.getInputHash(f"cactus:{threshold}:{answeredKey}:{path}", experimentIds),
+                    lambda: createTab(getCactus(data.frame, answered, id, len(trivialTime), trivial, column, category), ["memory" if useMemory else "time"], ""))
+            for experimentA, idA in zip(data.experiments, experimentIds):
+                for experimentB, idB in zip(data.experiments, experimentIds):
+                    if idA == idB:
+                        continue
+                    path = graphsDir / "ratio" / f"{experimentA.name}_{experimentB.name}{postfix}{memoryPostfix}.tab"
+                    writer.write(path, data.getInputHash(f"ratio:{path}", [idA, idB]),
+                        lambda: createTab(getRatios(data.frame, idA, idB, column, category), ["memory"] if useMemory else ["time", "low", "high"], "f"))
+
+    writer.write(documentDir / "comparison-table.tex", data.getInputHash(f"comparison-table:{answeredKey}", experimentIds),
+        lambda: createComparisonTable(data, answered))
+    writer.write(documentDir / "speedup-table.tex", data.getInputHash(f"speedup-table:{answeredKey}", experimentIds),
+        lambda: createSpeedupTable(data, answered))
+    writer.save()
+    print(f"Wrote {writer.written} files, {writer.skipped} were up to date")
+
+if __name__ == "__main__":
+    main()
@@ -8,7 +8,7 @@ import sqlite3
 import sys
 from typing import List, Optional
 
-from analysis_helper import Experiment, getExperimentId
+from analysis_helper import Experiment, ResultsFrame, clampRatioIntervals, clampRatios, getExperimentId
 
 
 parser = ArgumentParser(prog="Generates cactus graphs for all given experiments")
@@ -16,6 +16,7 @@ parser.add_argument("experiment_a", help="The first experiment <name>-<strategy>
 parser.add_argument("experiment_b", help="The second experiment <name>-<strategy> format")
 parser.add_argument("--category", help="limits the cactus plot to one category", default=None)
 parser.add_argument("--memory", help="Uses memory instead of time", default=False, action="store_true")
+parser.add_argument("--results", type=Path, help="The results database the graphs are made from", default=Path("artifacts/results.db"))
 args = parser.parse_args()
 
 CATEGORY = args.category
@@ -23,62 +24,30 @@ EXPERIMENT_A = args.experiment_a
 EXPERIMENT_B = args.experiment_b
 USE_MEMORY = args.memory
 
-con = sqlite3.connect("artifacts/results.db")
+con = sqlite3.connect(str(args.results))
 
 aParsed = Experiment.fromFormat(EXPERIMENT_A)
 bParsed = Experiment.fromFormat(EXPERIMENT_B)
 
 aId = getExperimentId(con, aParsed)
 bId = getExperimentId(con, bParsed)
+frame = ResultsFrame.load(con, [aId, bId])
 
 
-def getTimes(con: sqlite3.Connection, experimenta: int, experimentb: int, category: Optional[str]):
-    cur = con.execute(f"""
-        SELECT
-            CASE WHEN qra.result IS NULL AND qrb.result IS NULL THEN 0
-                WHEN qra.result IS NULL AND qrb.result IS NOT NULL THEN 1000000000000
-                WHEN qra.result IS NULL AND qrb.result IS NULL THEN 1
-                ELSE qra.time/qrb.time END AS ratio
-        FROM query_instance qi
-            LEFT JOIN query_result qra ON qra.query_instance_id = qi.id
-            LEFT JOIN query_result qrb ON qrb.query_instance_id = qi.id
-        WHERE 
-            qra.experiment_id = ?
-            AND qrb.experiment_id = ?
-            AND (qi.query_name = ? OR ? IS NULL)
-        ORDER BY ratio
-    """, (experimenta, experimentb, category, category))
-    rows: List[tuple[float]] = cur.fetchall()
-    max_value = max(map(lambda x: x[0] if x[0] < 1000000000000 else -1, rows))
-    min_value = min(map(lambda x: x[0] if x[0] > 0 else 1000000000000, rows))
-    return [(i, min_value if time[0] == 0 else (time[0] if time[0] < 1000000000000 else max_value)) for i, time in enumerate(rows)]
+# Time ratios are of the median times and come with the low and high bound of
+# their confidence interval.
+def getRatios(frame: ResultsFrame, experimenta: int, experimentb: int, category: Optional[str], column: str):
+    a, b = frame.select(frame.isExperiment(experimenta) & frame.isCategory(category)).align(frame.forExperiment(experimentb))
+    if column == "time":
+        ratios, low, high = clampRatioIntervals(*ResultsFrame.getTimeRatioIntervals(a, b))
+        return list(zip(range(len(ratios)), ratios.tolist(), low.tolist(), high.tolist()))
+    return list(enumerate(clampRatios(ResultsFrame.getRatios(a, b, column)).tolist()))
 
-def getMemory(con: sqlite3.Connection, experimenta: int, experimentb: int, category: Optional[str]):
-    cur = con.execute(f"""
-        SELECT
-            CASE WHEN qra.result IS NULL AND qrb.result IS NULL THEN 0
-                WHEN qra.result IS NULL AND qrb.result IS NOT NULL THEN 1000000000000
-                WHEN qra.result IS NULL AND qrb.result IS NULL THEN 1
-                ELSE qra.max_memory/qrb.max_memory END AS ratio
-        FROM query_instance qi
-            LEFT JOIN query_result qra ON qra.query_instance_id = qi.id
-            LEFT JOIN query_result qrb ON qrb.query_instance_id = qi.id
-        WHERE 
-            qra.experiment_id = ?
-            AND qrb.experiment_id = ?
-            AND (qi.query_name = ? OR ? IS NULL)
-        ORDER BY ratio
-    """, (experimenta, experimentb, category, category))
-    rows: List[tuple[float]] = cur.fetchall()
-    max_value = max(map(lambda x: x[0] if x[0] < 1000000000000 else -1, rows))
-    min_value = min(map(lambda x: x[0] if x[0] > 0 else 1000000000000, rows))
-    return [(i, min_value if time[0] == 0 else (time[0] if time[0] < 1000000000000 else max_value)) for i, time in enumerate(rows)]
-
-def createTab(out: TextIOWrapper, data: List[tuple[int, float]]):
-    out.write(f"counter\t{"memory" if USE_MEMORY else "time"}\n")
+def createTab(out: TextIOWrapper, data: List[tuple]):
+    out.write("counter\tmemory\n" if USE_MEMORY else "counter\ttime\tlow\thigh\n")
     for dataPoint in data:
-        i, time = dataPoint
-        out.write(f"{i}\t{time:f}\n")
+        i, *values = dataPoint
+        out.write(f"{i}\t{"\t".join(f"{value:f}" for value in values)}\n")
 
 postfix = ""
 if (CATEGORY != None):
@@ -88,7 +57,4 @@ output_directory = Path("document/graphs/ratio")
 output_directory.mkdir(parents=True, exist_ok=True)
 
 with (output_directory / f"{aParsed.name}_{bParsed.name}{postfix}{"-memory" if USE_MEMORY else ""}.tab").open("w") as f:
-    if USE_MEMORY:
-        createTab(f, getMemory(con, aId, bId, CATEGORY))
-    else:
-        createTab(f, getTimes(con, aId, bId, CATEGORY))
+    createTab(f, getRatios(frame, aId, bId, CATEGORY, "max_memory" if USE_MEMORY else "time"))
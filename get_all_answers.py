@@ -1,12 +1,21 @@
 #!/usr/bin/python3
-import asyncio
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+import csv
+from email.utils import formatdate
 from enum import Enum
+import hashlib
 from html.parser import HTMLParser
-from io import TextIOWrapper
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
 from pathlib import Path
 from re import match, search
-from time import sleep
-from typing import Iterable
+import shutil
+import sqlite3
+from typing import Iterable, Optional
+from urllib.error import HTTPError
+from urllib.parse import parse_qs, urlparse
 import urllib.request
 
 class ParserState(Enum):
@@ -26,8 +35,82 @@ def getClasses(attrs: list[tuple[str, str | None]]) -> Iterable[str]:
     if (classAttr is not None and classAttr[1] is not None):
         return classAttr[1].split(' ')
     return []
+
+ANSWER_BATCH_SIZE = 10000
+CSV_PATH = Path("artifacts/consensus-answers.csv")
+
+# The consensus answers with the index of the query within its model and
+# category, starting from 1 like query_instance.query_index.
+class ConsensusAnswerStore:
+    def __init__(self, db: sqlite3.Connection):
+        self.db = db
+        self.batch: list[tuple[str, str, int, str]] = []
+        db.execute("""
+        CREATE TABLE IF NOT EXISTS consensus_answer (
+            id INTEGER PRIMARY KEY,
+            model_name TEXT NOT NULL,
+            category TEXT NOT NULL,
+            query_index INTEGER NOT NULL,
+            answer TEXT NOT NULL,
+            UNIQUE (model_name, category, query_index)
+        ) STRICT;
+        """)
+
+    def count(self) -> int:
+        with closing(self.db.execute("SELECT COUNT(*) FROM consensus_answer")) as cur:
+            return cur.fetchone()[0]
+
+    def add(self, modelName: str, category: str, queryIndex: int, answer: str):
+        self.batch.append((modelName, category, queryIndex, answer))
+        if len(self.batch) >= ANSWER_BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        with closing(self.db.cursor()) as cur:
+            cur.executemany("""
+                INSERT INTO consensus_answer (model_name, category, query_index, answer) VALUES (?, ?, ?, ?)
+                ON CONFLICT (model_name, category, query_index) DO UPDATE SET answer = excluded.answer
+            """, self.batch)
+        self.batch.clear()
+
+    def exportCsv(self, path: Path):
+        with path.open("w") as f, closing(self.db.execute("SELECT model_name, category, query_index, answer FROM consensus_answer ORDER BY id")) as cur:
+            for modelName, category, queryIndex, answer in cur:
+                f.write(f"{modelName},{category},{queryIndex - 1},{answer}\n")
+
+    def importCsv(self, path: Path):
+        with path.open("r", newline='') as f:
+            for row in csv.reader(f):
+                self.add(row[0], row[1], int(row[2]) + 1, row[3])
+        self.flush()
+
+# Whether the database at dbPath has consensus answers. It is opened read-only,
+# so a missing database is not created.
+def hasConsensusAnswers(dbPath: Path) -> bool:
+    if not dbPath.exists():
+        return False
+    with closing(sqlite3.connect(f"file:{dbPath}?mode=ro", uri=True)) as db:
+        with closing(db.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name = 'consensus_answer'")) as cur:
+            if cur.fetchone()[0] == 0:
+                return False
+        with closing(db.execute("SELECT EXISTS (SELECT 1 FROM consensus_answer)")) as cur:
+            return cur.fetchone()[0] == 1
+
+# Imports the csv that earlier versions of this package stored the consensus
+# answers in when the database has none, so trees with only the csv keep
+# working. The database is only created when there is a csv to import.
+def importLegacyCsv(dbPath: Path, csvPath: Path):
+    if hasConsensusAnswers(dbPath):
+        return
+    if not csvPath.exists():
+        raise FileNotFoundError(f"Neither {dbPath} nor {csvPath} has consensus answers, run get_all_answers.py first")
+    print(f"Importing the consensus answers from {csvPath} into {dbPath}")
+    with closing(sqlite3.connect(str(dbPath))) as db:
+        ConsensusAnswerStore(db).importCsv(csvPath)
+        db.commit()
+
 class MCCResultParser(HTMLParser):
-    def __init__(self, output: TextIOWrapper, *args):
+    def __init__(self, output: ConsensusAnswerStore, *args):
         super().__init__(*args)
         self.state = ParserState.INIT
         self.category = None
@@ -35,8 +118,25 @@ class MCCResultParser(HTMLParser):
         self.currentVariation = None
         self.output = output
         self.resultCount = 0
+        self.text: list[str] = []
+
+    # When the page is fed in chunks, the text between two tags can arrive in
+    # several pieces, so it is only handled once the next tag starts.
+    def handle_data(self, data):
+        self.text.append(data)
+
+    def flushText(self):
+        if len(self.text) > 0:
+            data = "".join(self.text)
+            self.text.clear()
+            self.handle_text(data)
+
+    def close(self):
+        super().close()
+        self.flushText()
 
     def handle_starttag(self, tag, attrs):
+        self.flushText()
         if self.state == ParserState.INIT:
             if any(map(lambda x: x == 'secondarytitle', getClasses(attrs))):
                 self.state = ParserState.READING_CATEGORY
@@ -56,12 +156,13 @@ class MCCResultParser(HTMLParser):
                 self.state = ParserState.READ_RESULT_STRING
     
     def handle_endtag(self, tag):
+        self.flushText()
         if self.state == ParserState.READING_CATEGORY:
             self.state = ParserState.LOOK_FOR_TABLE
         if self.state == ParserState.FOUND_MODEL_TITLE:
             self.state = ParserState.READ_RESULT
 
-    def handle_data(self, data):
+    def handle_text(self, data):
         if self.state == ParserState.READING_CATEGORY:
             m = search(r"Results for (.+)", data, )
             if (m is None):
@@ -88,38 +189,183 @@ class MCCResultParser(HTMLParser):
             self.state = ParserState.READ_RESULT
 
     def addAnswers(self, category: str, modelName: str, variation: str, answerString: str):
-        queryIndex = 0
+        queryIndex = 1
         for answer in answerString.replace(" ", "").replace(")", "").replace("(", ""):
-            self.output.write(f"{modelName}-{variation},{category},{queryIndex},{answer}\n")
+            self.output.add(f"{modelName}-{variation}", category, queryIndex, answer)
             queryIndex += 1
             self.resultCount += 1
 
-links = [
-    "https://mcc.lip6.fr/2024/index.php?CONTENT=results/ReachabilityCardinality.html&TITLE=Results%20for%20ReachabilityCardinality",
-    "https://mcc.lip6.fr/2024/index.php?CONTENT=results/ReachabilityFireability.html&TITLE=Results%20for%20ReachabilityFireability",
-    "https://mcc.lip6.fr/2024/index.php?CONTENT=results/LTLCardinality.html&TITLE=Results%20for%20LTLCardinality",
-    "https://mcc.lip6.fr/2024/index.php?CONTENT=results/LTLFireability.html&TITLE=Results%20for%20LTLFireability",
-    "https://mcc.lip6.fr/2024/index.php?CONTENT=results/CTLCardinality.html&TITLE=Results%20for%20CTLCardinality",
-    "https://mcc.lip6.fr/2024/index.php?CONTENT=results/CTLFireability.html&TITLE=Results%20for%20CTLFireability",
-    "https://mcc.lip6.fr/2024/index.php?CONTENT=results/OneSafe.html&TITLE=Results%20for%20OneSafe",
-    "https://mcc.lip6.fr/2024/index.php?CONTENT=results/Liveness.html&TITLE=Results%20for%20Liveness",
-    "https://mcc.lip6.fr/2024/index.php?CONTENT=results/StableMarking.html&TITLE=Results%20for%20StableMarking",
-    "https://mcc.lip6.fr/2024/index.php?CONTENT=results/QuasiLiveness.html&TITLE=Results%20for%20QuasiLiveness",
-    "https://mcc.lip6.fr/2024/index.php?CONTENT=results/ReachabilityDeadlock.html&TITLE=Results%20for%20ReachabilityDeadlock"
+MCC_URL = "https://mcc.lip6.fr/2024/"
+CATEGORIES = [
+    "ReachabilityCardinality",
+    "ReachabilityFireability",
+    "LTLCardinality",
+    "LTLFireability",
+    "CTLCardinality",
+    "CTLFireability",
+    "OneSafe",
+    "Liveness",
+    "StableMarking",
+    "QuasiLiveness",
+    "ReachabilityDeadlock",
 ]
+REQUEST_TIMEOUT = 120
+PAGE_CHUNK_SIZE = 1 << 16
+
+def getLink(baseUrl: str, category: str) -> str:
+    return f"{baseUrl}index.php?CONTENT=results/{category}.html&TITLE=Results%20for%20{category}"
+
+# The results page a link points to, like ReachabilityCardinality.html.
+def getPageName(url: str) -> str:
+    return Path(parse_qs(urlparse(url).query)["CONTENT"][0]).name
+
+def writeAtomically(path: Path, data: bytes):
+    temporaryPath = path.with_name(path.name + ".tmp")
+    temporaryPath.write_bytes(data)
+    temporaryPath.replace(path)
+
+# Keeps every downloaded page on disk, keyed by its url. A cached page is
+# revalidated with its ETag and Last-Modified, so it is only downloaded again
+# when it changed. In offline mode only the cached pages are used.
+class PageCache:
+    def __init__(self, directory: Path, offline: bool):
+        self.directory = directory
+        self.offline = offline
+        directory.mkdir(parents=True, exist_ok=True)
+
+    def getPaths(self, url: str) -> tuple[Path, Path]:
+        key = hashlib.sha256(url.encode()).hexdigest()
+        return self.directory / f"{key}.html", self.directory / f"{key}.json"
+
+    def fetch(self, url: str) -> Path:
+        pagePath, metadataPath = self.getPaths(url)
+        metadata: Optional[dict] = None
+        if pagePath.exists() and metadataPath.exists():
+            with metadataPath.open("r") as f:
+                metadata = json.load(f)
+        if self.offline:
+            if metadata is None:
+                raise RuntimeError(f"{url} is not cached")
+            return pagePath
+        request = urllib.request.Request(url)
+        if metadata is not None:
+            if metadata["etag"] is not None:
+                request.add_header("If-None-Match", metadata["etag"])
+            if metadata["last_modified"] is not None:
+                request.add_header("If-Modified-Since", metadata["last_modified"])
+        # The page is streamed to disk, so it is never held in memory as a whole.
+        temporaryPath = pagePath.with_name(pagePath.name + ".tmp")
+        try:
+            with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response, temporaryPath.open("wb") as f:
+                shutil.copyfileobj(response, f, PAGE_CHUNK_SIZE)
+                etag = response.headers.get("ETag")
+                lastModified = response.headers.get("Last-Modified")
+        except HTTPError as e:
+            if e.code == 304 and metadata is not None:
+                print(f"{getPageName(url)} is unchanged, using the cached page")
+                return pagePath
+            raise
+        temporaryPath.replace(pagePath)
+        writeAtomically(metadataPath, json.dumps({"url": url, "etag": etag, "last_modified": lastModified}).encode())
+        return pagePath
 
-def retrieveAndWriteAnswers(url: str, outf: TextIOWrapper):
-    contents = urllib.request.urlopen(url).read().decode('utf-8')
-    parser = MCCResultParser(outf)
-    parser.feed(contents)
+# Serves saved results pages, named like ReachabilityCardinality.html, from a
+# directory instead of downloading them.
+class ReplayPages:
+    def __init__(self, directory: Path):
+        self.directory = directory
+
+    def fetch(self, url: str) -> Path:
+        return self.directory / getPageName(url)
+
+# A stand-in for the MCC web site that serves the pages of a replay directory,
+# with the ETag and Last-Modified headers the cache revalidates with.
+class ReplayRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        try:
+            pagePath = self.server.directory / getPageName(self.path)
+        except KeyError:
+            self.send_error(400, "missing CONTENT parameter")
+            return
+        if not pagePath.is_file():
+            self.send_error(404)
+            return
+        contents = pagePath.read_bytes()
+        etag = f'"{hashlib.sha256(contents).hexdigest()}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(contents)))
+        self.send_header("ETag", etag)
+        self.send_header("Last-Modified", formatdate(pagePath.stat().st_mtime, usegmt=True))
+        self.end_headers()
+        self.wfile.write(contents)
+
+def serveReplay(directory: Path, port: int):
+    server = ThreadingHTTPServer(("localhost", port), ReplayRequestHandler)
+    server.directory = directory
+    print(f"Serving {directory} on {MCC_URL.replace('https://mcc.lip6.fr', f'http://localhost:{port}')}")
+    server.serve_forever()
+
+def retrieveAndWriteAnswers(pagePath: Path, store: ConsensusAnswerStore):
+    parser = MCCResultParser(store)
+    with pagePath.open("r", encoding="utf-8") as f:
+        while chunk := f.read(PAGE_CHUNK_SIZE):
+            parser.feed(chunk)
+    parser.close()
+    store.flush()
     print(f"got {parser.resultCount} total results")
 
-artifacts_path = Path("artifacts")
-out_path = (artifacts_path / "consensus-answers.csv")
-if out_path.exists():
-    print("consensus-answers.csv already exists, skipping retrieval")
-else: 
-    with out_path.open("w") as f:
-        for link in links:
-            print(f"Doing {link}")
-            retrieveAndWriteAnswers(link, f)
+def main():
+    parser = ArgumentParser(prog="Retrieves the consensus answers of MCC24 into artifacts/consensus-answers.db")
+    parser.add_argument("--jobs", type=int, default=4, help="number of pages downloaded at the same time")
+    parser.add_argument("--cache", type=Path, default=Path("artifacts/mcc-cache"), help="directory the downloaded pages are cached in")
+    parser.add_argument("--offline", default=False, action="store_true", help="only use the cached pages")
+    parser.add_argument("--replay", type=Path, default=None, help="read the results pages from this directory instead of downloading them")
+    parser.add_argument("--base-url", default=MCC_URL, help="download the pages from a stand-in for the MCC web site")
+    parser.add_argument("--serve", type=int, default=None, metavar="PORT", help="serve the --replay directory as a stand-in for the MCC web site")
+    parser.add_argument("--export-csv", type=Path, nargs="?", const=CSV_PATH, default=None, metavar="PATH", help="also write the answers as csv")
+    parser.add_argument("--import-csv", type=Path, default=None, metavar="PATH", help=f"read the answers from a csv written by --export-csv instead of the MCC web site, by default {CSV_PATH} if it exists")
+    args = parser.parse_args()
+
+    if args.serve is not None:
+        if args.replay is None:
+            parser.error("--serve needs a --replay directory")
+        serveReplay(args.replay, args.serve)
+        return
+
+    artifacts_path = Path("artifacts")
+    db = sqlite3.connect(str(artifacts_path / "consensus-answers.db"))
+    store = ConsensusAnswerStore(db)
+    try:
+        if store.count() > 0:
+            print("Consensus answers already exist, skipping retrieval")
+        elif args.import_csv is not None:
+            store.importCsv(args.import_csv)
+        elif CSV_PATH.exists():
+            print(f"Importing the consensus answers from {CSV_PATH}")
+            store.importCsv(CSV_PATH)
+        else:
+            source = ReplayPages(args.replay) if args.replay is not None else PageCache(args.cache, args.offline)
+            links = [getLink(args.base_url, category) for category in CATEGORIES]
+            # The pages are downloaded concurrently but parsed in order, so the
+            # answers keep the same order. They are committed all at once.
+            with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+                for link, pagePath in zip(links, executor.map(source.fetch, links)):
+                    print(f"Doing {link}")
+                    retrieveAndWriteAnswers(pagePath, store)
+        db.commit()
+        if args.export_csv is not None:
+            store.exportCsv(args.export_csv)
+    except BaseException:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/python3
+from argparse import ArgumentParser
+from contextlib import closing, contextmanager
+import importlib.util
+from pathlib import Path
+import sqlite3
+import tempfile
+import time
+from types import ModuleType
+from typing import Iterator
+from urllib.parse import quote
+
+def load_script(name: str) -> ModuleType:
+    spec = importlib.util.spec_from_file_location(name.replace("-", "_"), Path(__file__).with_name(f"{name}.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+process_results = load_script("process-results")
+
+# The tables that hold one row per query result, copied with their
+# query_result_id remapped. wrong_answer, trial_summary and query_summary are
+# recomputed instead, and live_result only matters to the database it was
+# watched into.
+RESULT_TABLES = {
+    "resource_usage": ["sample_count", "samples"],
+    "query_trial": ["trial", "time", "status", "max_memory", "verification_time"],
+    "query_batch": ["batch_size", "shared_time"],
+    "predicted_result": [],
+}
+
+def execute(db: sqlite3.Connection, sql: str, parameters: tuple = ()) -> int:
+    with closing(db.execute(sql, parameters)) as cur:
+        return cur.rowcount
+
+def read_only_uri(path: Path) -> str:
+    return f"file:{quote(str(path.resolve()))}?mode=ro"
+
+# The URI the source database is attached from, which is read-only so merging
+# never changes it. A source with an older schema is upgraded in a temporary
+# copy instead of in place.
+@contextmanager
+def open_source(source_path: Path) -> Iterator[str]:
+    with closing(sqlite3.connect(read_only_uri(source_path), uri=True)) as source:
+        with closing(source.execute("PRAGMA user_version")) as cur:
+            version = cur.fetchone()[0]
+        if version >= len(process_results.SCHEMA_MIGRATIONS):
+            yield read_only_uri(source_path)
+            return
+        with tempfile.TemporaryDirectory() as directory:
+            copy_path = Path(directory) / source_path.name
+            with closing(sqlite3.connect(str(copy_path))) as copy:
+                source.backup(copy)
+                print(f"Upgrading a copy of {source_path}, which has an older schema")
+                process_results.upgrade_schema(copy)
+            yield read_only_uri(copy_path)
+
+# Maps the ids of a table of the source database to the ids of the rows with
+# the same natural key in the merged one, adding the rows it does not have.
+# Only the source rows matching the condition are mapped.
+def map_ids(db: sqlite3.Connection, table: str, key: list[str], columns: list[str], condition: str = "TRUE"):
+    join = " AND ".join(f"m.{column} = s.{column}" for column in key)
+    execute(db, f"""
+        INSERT INTO main.{table} ({", ".join(columns)})
+        SELECT {", ".join(f"MIN(s.{column})" if column not in key else f"s.{column}" for column in columns)} FROM source.{table} s
+        WHERE {condition} AND NOT EXISTS (SELECT 1 FROM main.{table} m WHERE {join})
+        GROUP BY {", ".join(f"s.{column}" for column in key)}
+    """)
+    execute(db, f"CREATE TEMP TABLE {table}_map (source_id INTEGER PRIMARY KEY, id INTEGER NOT NULL)")
+    execute(db, f"""
+        INSERT INTO {table}_map (source_id, id)
+        SELECT s.id, MIN(m.id) FROM source.{table} s
+            JOIN main.{table} m ON {join}
+        WHERE {condition}
+        GROUP BY s.id
+    """)
+
+# Copies the query results of the source database that the merged one has no
+# result of the same experiment and query instance for, together with their
+# logs, resource samples, trials and batches, all in bulk statements. The
+# source of each copied query result is the database it was first added to,
+# which is the source database itself unless it was merged into it.
+# Returns the number of copied and of left out query results.
+def merge_database(db: sqlite3.Connection, source_path: Path) -> tuple[int, int]:
+    with open_source(source_path) as source_uri:
+        return merge_attached(db, source_path, source_uri)
+
+def merge_attached(db: sqlite3.Connection, source_path: Path, source_uri: str) -> tuple[int, int]:
+    execute(db, "ATTACH DATABASE ? AS source", (source_uri,))
+    try:
+        map_ids(db, "experiment", ["name", "search_strategy"], ["name", "search_strategy"])
+        map_ids(db, "query_instance", ["model_name", "query_name", "query_index"], ["model_name", "query_name", "query_index", "query_type", "expected_answer"])
+        execute(db, "INSERT OR IGNORE INTO main.source_database (name) VALUES (?)", (str(source_path.resolve()),))
+        map_ids(db, "source_database", ["name"], ["name"])
+        with closing(db.execute("SELECT id FROM main.source_database WHERE name = ?", (str(source_path.resolve()),))) as cur:
+            source_database_id = cur.fetchone()[0]
+        with closing(db.execute("SELECT COALESCE(MAX(id), 0) FROM main.query_result")) as cur:
+            offset = cur.fetchone()[0]
+
+        # The first query result of each experiment and query instance of the
+        # source that is new. Their ids in the merged database follow the
+        # query results already there, in the order of the source ids.
+        execute(db, """
+            CREATE TEMP TABLE query_result_map (
+                id INTEGER PRIMARY KEY,
+                source_id INTEGER NOT NULL,
+                experiment_id INTEGER NOT NULL,
+                query_instance_id INTEGER NOT NULL,
+                UNIQUE (experiment_id, query_instance_id)
+            )
+        """)
+        execute(db, """
+            INSERT OR IGNORE INTO query_result_map (source_id, experiment_id, query_instance_id)
+            SELECT qr.id, em.id, qm.id FROM source.query_result qr
+                JOIN experiment_map em ON em.source_id = qr.experiment_id
+                JOIN query_instance_map qm ON qm.source_id = qr.query_instance_id
+            WHERE NOT EXISTS (SELECT 1 FROM main.query_result m WHERE m.experiment_id = em.id AND m.query_instance_id = qm.id)
+            ORDER BY qr.id
+        """)
+        copied = execute(db, """
+            INSERT INTO main.query_result (id, experiment_id, query_instance_id, time, status, result, max_memory, states, color_reduction_time, verification_time)
+            SELECT rm.id + ?, rm.experiment_id, rm.query_instance_id, qr.time, qr.status, qr.result, qr.max_memory, qr.states, qr.color_reduction_time, qr.verification_time FROM query_result_map rm
+                JOIN source.query_result qr ON qr.id = rm.source_id
+            ORDER BY rm.id
+        """, (offset,))
+        with closing(db.execute("SELECT COUNT(*) FROM source.query_result")) as cur:
+            left_out = cur.fetchone()[0] - copied
+        # The logs of the copied query results and the bases they are
+        # compressed with. The bases of the logs that are new get the ids of
+        # their copies.
+        with closing(db.execute("SELECT COALESCE(MAX(id), 0) FROM main.log_blob")) as cur:
+            last_log_blob_id = cur.fetchone()[0]
+        map_ids(db, "log_blob", ["hash"], ["hash", "data"], """s.id IN (
+            WITH RECURSIVE used (id) AS (
+                SELECT x.stdout FROM source.extended_result x JOIN query_result_map rm ON rm.source_id = x.query_result_id
+                UNION SELECT x.stderr FROM source.extended_result x JOIN query_result_map rm ON rm.source_id = x.query_result_id
+                UNION SELECT b.base FROM source.log_blob b JOIN used u ON u.id = b.id WHERE b.base IS NOT NULL
+            )
+            SELECT id FROM used
+        )""")
+        execute(db, """
+            UPDATE main.log_blob SET base = (
+                SELECT bm.id FROM source.log_blob s
+                    JOIN log_blob_map bm ON bm.source_id = s.base
+                WHERE s.hash = main.log_blob.hash
+            )
+            WHERE id > ?
+        """, (last_log_blob_id,))
+
+        for table, columns in RESULT_TABLES.items():
+            execute(db, f"""
+                INSERT INTO main.{table} ({", ".join(["query_result_id", *columns])})
+                SELECT {", ".join(["rm.id + ?", *(f"s.{column}" for column in columns)])} FROM query_result_map rm
+                    JOIN source.{table} s ON s.query_result_id = rm.source_id
+            """, (offset,))
+        execute(db, """
+            INSERT INTO main.extended_result (query_result_id, stdout, stderr)
+            SELECT rm.id + ?, so.id, se.id FROM query_result_map rm
+                JOIN source.extended_result x ON x.query_result_id = rm.source_id
+                JOIN log_blob_map so ON so.source_id = x.stdout
+                JOIN log_blob_map se ON se.source_id = x.stderr
+            ORDER BY rm.id
+        """, (offset,))
+        execute(db, """
+            INSERT INTO main.result_source (query_result_id, source_database_id)
+            SELECT rm.id + ?, COALESCE(sm.id, ?) FROM query_result_map rm
+                LEFT JOIN source.result_source rs ON rs.query_result_id = rm.source_id
+                LEFT JOIN source_database_map sm ON sm.source_id = rs.source_database_id
+        """, (offset, source_database_id))
+        execute(db, """
+            INSERT INTO main.processed_files (file_name)
+            SELECT DISTINCT s.file_name FROM source.processed_files s
+            WHERE s.file_name NOT IN (SELECT file_name FROM main.processed_files)
+        """)
+        if copied > 0:
+            process_results.update_query_summary(db, offset + 1, offset + copied)
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    finally:
+        for table in ["experiment", "query_instance", "log_blob", "source_database", "query_result"]:
+            execute(db, f"DROP TABLE IF EXISTS temp.{table}_map")
+        execute(db, "DETACH DATABASE source")
+    return copied, left_out
+
+def main():
+    parser = ArgumentParser(prog="Merges results databases of other machines or runs into one")
+    parser.add_argument("sources", nargs='+', type=Path, help="the results databases to merge, in order of precedence")
+    parser.add_argument("--results", type=Path, default=Path("artifacts/results.db"), help="the results database the others are merged into, created if it does not exist")
+    args = parser.parse_args()
+    for source in args.sources:
+        if not source.exists():
+            parser.error(f"{source} does not exist")
+        if source.resolve() == args.results.resolve():
+            parser.error(f"cannot merge {source} into itself")
+
+    args.results.parent.mkdir(parents=True, exist_ok=True)
+    db = sqlite3.connect(str(args.results), uri=True)
+    execute(db, "PRAGMA cache_size = -262144")
+    execute(db, "PRAGMA temp_store = MEMORY")
+    process_results.upgrade_schema(db)
+    for source in args.sources:
+        start = time.perf_counter()
+        copied, left_out = merge_database(db, source)
+        print(f"Merged {copied} results from {source} in {time.perf_counter() - start:.1f}s, left out {left_out} that were already there")
+    process_results.update_trial_summary(db)
+    db.commit()
+    print("Validating answers...")
+    process_results.validate_answers(db)
+    db.commit()
+    db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import gzip
+import json
+from pathlib import Path
+import shutil
+import tarfile
+from tarfile import TarFile, TarInfo
+import tempfile
+from typing import BinaryIO, Optional
+
+COMPRESSED_SUFFIX = ".gz"
+COMPRESS_LEVEL = 6
+
+# The sidecar file of an archive with the offset and size of each of its
+# files, so any of them can be read without reading the tar headers before it.
+def get_index_path(archive_path: Path) -> Path:
+    return archive_path.with_name(archive_path.name + ".index.json")
+
+# The name of a file in an archive without the suffix of its compression.
+def get_member_name(info: TarInfo) -> str:
+    return info.name.removesuffix(COMPRESSED_SUFFIX)
+
+# Adds the content of stream to the archive as info, gzip compressed if
+# compress is True. The size of info is set from what is written.
+def add_stream(tarFile: TarFile, info: TarInfo, stream: BinaryIO, compress: bool):
+    with tempfile.TemporaryFile() as data:
+        if compress:
+            info.name += COMPRESSED_SUFFIX
+            with gzip.GzipFile(filename="", fileobj=data, mode="wb", compresslevel=COMPRESS_LEVEL, mtime=0) as compressed:
+                shutil.copyfileobj(stream, compressed)
+        else:
+            shutil.copyfileobj(stream, data)
+        info.size = data.tell()
+        data.seek(0)
+        tarFile.addfile(info, data)
+
+def add_file(tarFile: TarFile, path: Path, name: str, compress: bool):
+    with path.open("rb") as f:
+        add_stream(tarFile, tarFile.gettarinfo(str(path), name), f, compress)
+
+def write_index(archive_path: Path):
+    with tarfile.open(str(archive_path), "r") as tarFile:
+        members = {info.name: [info.offset_data, info.size] for info in tarFile if info.isfile()}
+    stat = archive_path.stat()
+    get_index_path(archive_path).write_text(json.dumps({"size": stat.st_size, "mtime": stat.st_mtime_ns, "members": members}))
+
+# The files of an archive from its index, or None if it has no index or the
+# index is of an earlier version of the archive. Like the query index cache,
+# the index is only trusted while the archive keeps its size and modification
+# time, so an archive that was rewritten or copied is read through its tar
+# headers instead.
+def read_index(archive_path: Path) -> Optional[list[TarInfo]]:
+    index_path = get_index_path(archive_path)
+    if not index_path.exists():
+        return None
+    index = json.loads(index_path.read_text())
+    stat = archive_path.stat()
+    if index["size"] != stat.st_size or index.get("mtime") != stat.st_mtime_ns:
+        return None
+    members = []
+    for name, (offset, size) in index["members"].items():
+        info = TarInfo(name)
+        info.type = tarfile.REGTYPE
+        info.offset_data = offset
+        info.size = size
+        members.append(info)
+    return members
+
+# The files of an opened archive, from its index if it has a valid one and
+# from its tar headers otherwise.
+def list_members(tarFile: TarFile) -> list[TarInfo]:
+    members = read_index(Path(tarFile.name)) if tarFile.name is not None else None
+    if members is None:
+        members = [info for info in tarFile if info.isfile()]
+    return members
+
+# Reads a file of an archive as a stream, decompressing it if it is
+# compressed.
+def open_member(tarFile: TarFile, info: TarInfo) -> BinaryIO:
+    f = tarFile.extractfile(info)
+    if f is None:
+        raise Exception("Could not find specific file in tar file")
+    if info.name.endswith(COMPRESSED_SUFFIX):
+        return gzip.GzipFile(fileobj=f, mode="rb")
+    return f
+
+def read_member(tarFile: TarFile, info: TarInfo) -> bytes:
+    with open_member(tarFile, info) as f:
+        return f.read()
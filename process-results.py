@@ -1,17 +1,30 @@
 #!/usr/bin/python3
+from argparse import ArgumentParser
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from contextlib import closing
-import csv
-from itertools import islice
+import hashlib
+from io import TextIOWrapper
+from itertools import chain, groupby, repeat
+import json
 from pathlib import Path
 import re
 import sqlite3
+import struct
+import time
 from tarfile import TarFile, TarInfo
 import tarfile
-from typing import Iterator, Optional
-from result_parser import QueryInstance, QueryResult, Result, Status
+from typing import Iterable, Iterator, Optional
+import zlib
+from benchmark_scheduler import JOURNAL_FILE_NAME, PER_QUERY_TIMEOUT, BenchmarkJournal, BenchmarkUnit, JournalEntry, UnitPlanner, create_units, read_lines
+from get_all_answers import importLegacyCsv
+from packed_archive import get_member_name, list_members, open_member, read_member
+from query_lookup import LOG_DICTIONARY_SIZE
+from result_parser import QueryInstance, QueryResult, Result, Status, large_header_pattern, sliceLog
+from trial_statistics import median_confidence_interval
 import xml.etree.ElementTree as ET
 
-def create_tables(db: sqlite3.Connection):
+def create_initial_tables(db: sqlite3.Connection):
     db.execute("""
     CREATE TABLE IF NOT EXISTS experiment (id INTEGER PRIMARY KEY, name, search_strategy);
     """)
@@ -37,16 +50,30 @@ def create_tables(db: sqlite3.Connection):
     );
     """)
 
+    db.execute("""
+    CREATE TABLE IF NOT EXISTS log_blob (
+        id INTEGER PRIMARY KEY,
+        hash UNIQUE,
+        data
+    );
+    """)
+
     db.execute("""
     CREATE TABLE IF NOT EXISTS extended_result (
         id INTEGER PRIMARY KEY,
         query_result_id,
         stdout,
         stderr,
-        FOREIGN KEY(query_result_id) REFERENCES query_result(id)
+        FOREIGN KEY(query_result_id) REFERENCES query_result(id),
+        FOREIGN KEY(stdout) REFERENCES log_blob(id),
+        FOREIGN KEY(stderr) REFERENCES log_blob(id)
     );
     """)
 
+    db.execute("""
+    CREATE INDEX IF NOT EXISTS extended_result_query_result_id ON extended_result (query_result_id);
+    """)
+
     db.execute("""
     CREATE TABLE IF NOT EXISTS processed_files (
         id INTEGER PRIMARY KEY,
@@ -54,19 +81,297 @@ def create_tables(db: sqlite3.Connection):
     );
     """)
 
+def create_strict_tables(db: sqlite3.Connection):
+    db.execute("""
+    CREATE TABLE experiment_strict (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL,
+        search_strategy TEXT NOT NULL
+    ) STRICT;
+    """)
+
+    db.execute("""
+    CREATE TABLE query_instance_strict (
+        id INTEGER PRIMARY KEY,
+        model_name TEXT NOT NULL,
+        query_name TEXT NOT NULL,
+        query_index INTEGER NOT NULL,
+        query_type TEXT,
+        expected_answer TEXT
+    ) STRICT;
+    """)
+
+    db.execute("""
+    CREATE TABLE query_result_strict (
+        id INTEGER PRIMARY KEY,
+        experiment_id INTEGER NOT NULL,
+        query_instance_id INTEGER NOT NULL,
+        time REAL,
+        status TEXT NOT NULL,
+        result TEXT,
+        max_memory REAL,
+        states INTEGER,
+        color_reduction_time REAL,
+        verification_time REAL,
+        FOREIGN KEY(experiment_id) REFERENCES experiment(id),
+        FOREIGN KEY(query_instance_id) REFERENCES query_instance(id)
+    ) STRICT;
+    """)
+
+    db.execute("""
+    CREATE TABLE log_blob_strict (
+        id INTEGER PRIMARY KEY,
+        hash BLOB NOT NULL UNIQUE,
+        data BLOB NOT NULL
+    ) STRICT;
+    """)
+
+    db.execute("""
+    CREATE TABLE extended_result_strict (
+        id INTEGER PRIMARY KEY,
+        query_result_id INTEGER NOT NULL,
+        stdout INTEGER NOT NULL,
+        stderr INTEGER NOT NULL,
+        FOREIGN KEY(query_result_id) REFERENCES query_result(id),
+        FOREIGN KEY(stdout) REFERENCES log_blob(id),
+        FOREIGN KEY(stderr) REFERENCES log_blob(id)
+    ) STRICT;
+    """)
+
+    db.execute("""
+    CREATE TABLE processed_files_strict (
+        id INTEGER PRIMARY KEY,
+        file_name TEXT NOT NULL
+    ) STRICT;
+    """)
+
+    # The columns keep their order, so the rows can be copied as they are.
+    for table in ["experiment", "query_instance", "query_result", "log_blob", "extended_result", "processed_files"]:
+        db.execute(f"INSERT INTO {table}_strict SELECT * FROM {table}")
+        db.execute(f"DROP TABLE {table}")
+        db.execute(f"ALTER TABLE {table}_strict RENAME TO {table}")
+
+    db.execute("""
+    CREATE INDEX experiment_name ON experiment (name, search_strategy);
+    """)
+
+    db.execute("""
+    CREATE INDEX query_instance_key ON query_instance (model_name, query_name, query_index);
+    """)
+
+    # Covers the per experiment lookups of the plot and table scripts, which
+    # then never have to read the query_result rows themselves.
+    db.execute("""
+    CREATE INDEX query_result_experiment ON query_result (experiment_id, query_instance_id, status, result, time, max_memory);
+    """)
+
+    db.execute("""
+    CREATE INDEX extended_result_query_result_id ON extended_result (query_result_id);
+    """)
+
+# Minimum and maximum time and memory of each query instance over all
+# experiments. process_and_insert keeps it up to date with every batch.
+def create_query_summary(db: sqlite3.Connection):
+    db.execute("""
+    CREATE TABLE query_summary (
+        query_instance_id INTEGER PRIMARY KEY,
+        result_count INTEGER NOT NULL,
+        time_count INTEGER NOT NULL,
+        min_time REAL,
+        max_time REAL,
+        memory_count INTEGER NOT NULL,
+        min_memory REAL,
+        max_memory REAL,
+        FOREIGN KEY(query_instance_id) REFERENCES query_instance(id)
+    ) STRICT;
+    """)
+    with closing(db.execute("SELECT MIN(id), MAX(id) FROM query_result")) as cur:
+        first_id, last_id = cur.fetchone()
+    if first_id is not None:
+        update_query_summary(db, first_id, last_id)
+
+# The answered results that differ from the consensus answer of their query,
+# filled in by validate_answers.
+def create_wrong_answer(db: sqlite3.Connection):
+    db.execute("""
+    CREATE TABLE wrong_answer (
+        query_result_id INTEGER PRIMARY KEY,
+        expected_answer TEXT NOT NULL,
+        FOREIGN KEY(query_result_id) REFERENCES query_result(id)
+    ) STRICT;
+    """)
+
+# The memory and CPU time series the benchmark scheduler samples while a query
+# runs. samples holds sample_count rows of elapsed seconds, memory in kB, user
+# and system CPU seconds as zlib compressed little endian doubles.
+def create_resource_usage(db: sqlite3.Connection):
+    db.execute("""
+    CREATE TABLE resource_usage (
+        query_result_id INTEGER PRIMARY KEY,
+        sample_count INTEGER NOT NULL,
+        samples BLOB NOT NULL,
+        FOREIGN KEY(query_result_id) REFERENCES query_result(id)
+    ) STRICT;
+    """)
+
+# The trials the benchmark scheduler repeated a query in, after the first one
+# that is the query_result row itself, and the median time over all trials of
+# each such query result with its 95% confidence interval. trial_summary is
+# filled in by update_trial_summary.
+def create_query_trial(db: sqlite3.Connection):
+    db.execute("""
+    CREATE TABLE query_trial (
+        query_result_id INTEGER NOT NULL,
+        trial INTEGER NOT NULL,
+        time REAL,
+        status TEXT NOT NULL,
+        max_memory REAL,
+        verification_time REAL,
+        PRIMARY KEY (query_result_id, trial),
+        FOREIGN KEY(query_result_id) REFERENCES query_result(id)
+    ) STRICT;
+    """)
+
+    db.execute("""
+    CREATE TABLE trial_summary (
+        query_result_id INTEGER PRIMARY KEY,
+        trial_count INTEGER NOT NULL,
+        median_time REAL NOT NULL,
+        time_low REAL NOT NULL,
+        time_high REAL NOT NULL,
+        FOREIGN KEY(query_result_id) REFERENCES query_result(id)
+    ) STRICT;
+    """)
+
+# The batched verifypn run a query result came from, when the benchmark
+# scheduler ran all queries of a model and category in one process. Every
+# query result of the run has its batch_size and shared_time, the time the run
+# spent on none of its queries, mostly loading and reducing the model.
+# shared_time is NULL when not every query of the run reported its
+# verification time.
+def create_query_batch(db: sqlite3.Connection):
+    db.execute("""
+    CREATE TABLE query_batch (
+        query_result_id INTEGER PRIMARY KEY,
+        batch_size INTEGER NOT NULL,
+        shared_time REAL,
+        FOREIGN KEY(query_result_id) REFERENCES query_result(id)
+    ) STRICT;
+    """)
+
+# The query results and later trials that process-results.py --watch added
+# from current-benchmark while the benchmark was running. Processing their
+# archive afterwards skips them and removes them from here.
+def create_live_result(db: sqlite3.Connection):
+    db.execute("""
+    CREATE TABLE live_result (
+        query_result_id INTEGER NOT NULL,
+        trial INTEGER NOT NULL,
+        PRIMARY KEY (query_result_id, trial),
+        FOREIGN KEY(query_result_id) REFERENCES query_result(id)
+    ) STRICT;
+    """)
+
+# The databases merge-results.py copied query results from, and the database
+# each copied query result first came from. Query results added by
+# process-results.py itself have no result_source row.
+def create_result_source(db: sqlite3.Connection):
+    db.execute("""
+    CREATE TABLE source_database (
+        id INTEGER PRIMARY KEY,
+        name TEXT NOT NULL UNIQUE
+    ) STRICT;
+    """)
+
+    db.execute("""
+    CREATE TABLE result_source (
+        query_result_id INTEGER PRIMARY KEY,
+        source_database_id INTEGER NOT NULL,
+        FOREIGN KEY(query_result_id) REFERENCES query_result(id),
+        FOREIGN KEY(source_database_id) REFERENCES source_database(id)
+    ) STRICT;
+    """)
+
+# A log compressed with the start of another log as preset dictionary refers to
+# that log as its base. See pack_log.
+def create_log_blob_base(db: sqlite3.Connection):
+    db.execute("""
+    ALTER TABLE log_blob ADD COLUMN base INTEGER REFERENCES log_blob(id);
+    """)
+
+# The query results of queries the benchmark scheduler skipped because every
+# earlier result of them failed the same way. They only hold the status it
+# predicted from those results and no time or memory.
+def create_predicted_result(db: sqlite3.Connection):
+    db.execute("""
+    CREATE TABLE predicted_result (
+        query_result_id INTEGER PRIMARY KEY,
+        FOREIGN KEY(query_result_id) REFERENCES query_result(id)
+    ) STRICT;
+    """)
+
+# Each migration upgrades the schema by one version. The version of a database
+# is kept in its user_version, so older databases are upgraded in place.
+SCHEMA_MIGRATIONS = [create_initial_tables, create_strict_tables, create_query_summary, create_wrong_answer, create_resource_usage, create_query_trial, create_query_batch, create_live_result, create_result_source, create_log_blob_base, create_predicted_result]
+
+def upgrade_schema(db: sqlite3.Connection):
+    with closing(db.execute("PRAGMA user_version")) as cur:
+        version = cur.fetchone()[0]
+    if version >= len(SCHEMA_MIGRATIONS):
+        return
+    db.commit()
+    # sqlite3 does not open a transaction for DDL statements by itself.
+    db.execute("BEGIN")
+    try:
+        for new_version, migration in enumerate(SCHEMA_MIGRATIONS[version:], version + 1):
+            print(f"Upgrading database schema to version {new_version}")
+            migration(db)
+            db.execute(f"PRAGMA user_version = {new_version}")
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+
+# Adds the query_result rows with ids from first_id to last_id to the summary.
+def update_query_summary(db: sqlite3.Connection, first_id: int, last_id: int):
+    with closing(db.execute("""
+        INSERT INTO query_summary
+            (query_instance_id, result_count, time_count, min_time, max_time, memory_count, min_memory, max_memory)
+        SELECT
+            query_instance_id, COUNT(*), COUNT(time), MIN(time), MAX(time), COUNT(max_memory), MIN(max_memory), MAX(max_memory)
+        FROM query_result
+        WHERE id BETWEEN ? AND ?
+        GROUP BY query_instance_id
+        ON CONFLICT (query_instance_id) DO UPDATE SET
+            result_count = result_count + excluded.result_count,
+            time_count = time_count + excluded.time_count,
+            min_time = MIN(COALESCE(min_time, excluded.min_time), COALESCE(excluded.min_time, min_time)),
+            max_time = MAX(COALESCE(max_time, excluded.max_time), COALESCE(excluded.max_time, max_time)),
+            memory_count = memory_count + excluded.memory_count,
+            min_memory = MIN(COALESCE(min_memory, excluded.min_memory), COALESCE(excluded.min_memory, min_memory)),
+            max_memory = MAX(COALESCE(max_memory, excluded.max_memory), COALESCE(excluded.max_memory, max_memory))
+    """, (first_id, last_id))):
+        pass
+
 class ConsensusAnswer:
     def __init__(self, model_name: str, category: str, index: int, consensus: Optional[QueryResult]):
         self.model_name = model_name
         self.category = category
-        self.index = index + 1
+        self.index = index
         self.consensus = consensus
 
 
+# Only the answers for colored models are read, in the order get_all_answers.py
+# stored them. Trees with only the csv of earlier versions get it imported.
 def read_consensus_answers(answerPath: Path) -> Iterator[ConsensusAnswer]:
-    with answerPath.open("r", newline='') as csvFile:
-        csvReader = csv.reader(csvFile)
-        for row in csvReader:
-            yield ConsensusAnswer(row[0], row[1], int(row[2]),
+    importLegacyCsv(answerPath, answerPath.with_suffix(".csv"))
+    with closing(sqlite3.connect(str(answerPath))) as answers_db, closing(answers_db.execute("""
+        SELECT model_name, category, query_index, answer FROM consensus_answer
+        WHERE instr(model_name, 'COL') > 0
+        ORDER BY id
+    """)) as cur:
+        for row in cur:
+            yield ConsensusAnswer(row[0], row[1], row[2],
                 QueryResult.Satisfied if row[3] == "T"
                     else (QueryResult.Unsatisfied if row[3] == "F" else None))
 
@@ -87,67 +392,252 @@ def parse_query_and_type(property: ET.Element) -> tuple[str, int, Optional[str]]
     else:
         return query_name, index, None
 
+PROPERTY_TAG = "{http://mcc.lip6.fr/}property"
+QUERY_INDEX_CACHE_VERSION = 1
+
+# The properties of a query file in file order, as the query index from the
+# property id and the query type. Each property is dropped once it is read.
+def index_query_file(queryFilePath: str) -> list[tuple[int, Optional[str]]]:
+    properties: list[tuple[int, Optional[str]]] = []
+    root: Optional[ET.Element] = None
+    for event, element in ET.iterparse(queryFilePath, events=("start", "end")):
+        if root is None:
+            root = element
+        elif event == "end" and element.tag == PROPERTY_TAG:
+            _, index, query_type = parse_query_and_type(element)
+            properties.append((index, query_type))
+            root.clear()
+    return properties
+
+# Indexes every query file, reusing the cached index of files with the same
+# modification time as when they were cached.
+class QueryIndex:
+    def __init__(self, cachePath: Path):
+        self.cache_path = cachePath
+        self.files: dict[str, tuple[int, list[tuple[int, Optional[str]]]]] = {}
+        if cachePath.exists():
+            with cachePath.open("r") as f:
+                cache = json.load(f)
+            if cache["version"] == QUERY_INDEX_CACHE_VERSION:
+                for path, (mtime, properties) in cache["files"].items():
+                    self.files[path] = (mtime, [(index, query_type) for index, query_type in properties])
+
+    def update(self, queryFilePaths: Iterable[Path], jobs: int):
+        stale: list[tuple[str, int]] = []
+        for queryFilePath in queryFilePaths:
+            path = str(queryFilePath)
+            mtime = queryFilePath.stat().st_mtime_ns
+            cached = self.files.get(path)
+            if cached is None or cached[0] != mtime:
+                stale.append((path, mtime))
+        if len(stale) == 0:
+            return
+        print(f"Indexing {len(stale)} query files...")
+        paths = [path for path, _ in stale]
+        if jobs > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                indexed = list(executor.map(index_query_file, paths, chunksize=16))
+        else:
+            indexed = list(map(index_query_file, paths))
+        for (path, mtime), properties in zip(stale, indexed):
+            self.files[path] = (mtime, properties)
+        temporaryPath = self.cache_path.with_name(self.cache_path.name + ".tmp")
+        with temporaryPath.open("w") as f:
+            json.dump({"version": QUERY_INDEX_CACHE_VERSION, "files": self.files}, f)
+        temporaryPath.replace(self.cache_path)
+
+    def properties(self, queryFilePath: Path) -> list[tuple[int, Optional[str]]]:
+        return self.files[str(queryFilePath)][1]
+
 NON_DYNAMIC_QUERY_CATEGORIES = ["ReachabilityDeadlock", "OneSafe", "Liveness", "StableMarking", "QuasiLiveness"]
 DYNAMIC_QUERY_CATEGORIES = ["ReachabilityCardinality", "ReachabilityFireability", "LTLCardinality", "LTLFireability", "CTLCardinality", "CTLFireability"]
-def create_query_instances(db: sqlite3.Connection, consensus_answers_path: Path, all_models_path: Path):
+def create_query_instances(db: sqlite3.Connection, consensus_answers_path: Path, all_models_path: Path, query_index_path: Path, jobs: int = 1):
     with closing(db.execute("SELECT COUNT(*) FROM query_instance")) as cur:
         if cur.fetchone()[0] > 0:
             print("Query instances already exist, skipping creation")
             return
-    known_models: set[str] = set()
-    consensus_answers = read_consensus_answers(consensus_answers_path)
+    consensus_answers = list(read_consensus_answers(consensus_answers_path))
+    known_models = set(answer.model_name for answer in consensus_answers)
+    unknown_models = [path.name for path in Path(all_models_path).glob("*") if path.name not in known_models]
+    query_files = set((answer.model_name, answer.category) for answer in consensus_answers if answer.category in DYNAMIC_QUERY_CATEGORIES)
+    query_files.update((model_name, queryCategory) for model_name in unknown_models for queryCategory in DYNAMIC_QUERY_CATEGORIES)
+    query_file_paths = {query_file: Path(all_models_path) / query_file[0] / (query_file[1] + ".xml") for query_file in sorted(query_files)}
+    # Models left out by retrieve_models.py have no query files, so the type
+    # of their queries stays unknown.
+    query_file_paths = {query_file: path for query_file, path in query_file_paths.items() if path.exists()}
+    query_index = QueryIndex(query_index_path)
+    query_index.update(query_file_paths.values(), jobs)
+    properties = {query_file: query_index.properties(path) for query_file, path in query_file_paths.items()}
+
     queries_to_insert: list[tuple] = []
-    for consensus_answer in filter(lambda x : 'COL' in x.model_name, consensus_answers):
-        known_models.add(consensus_answer.model_name)
+    for consensus_answer in consensus_answers:
         expected_answer = None if consensus_answer.consensus == None else consensus_answer.consensus.name
         query_type = None
         if consensus_answer.category in DYNAMIC_QUERY_CATEGORIES:
-            parsed = ET.parse(str(Path(all_models_path) / consensus_answer.model_name / (consensus_answer.category + ".xml")))
-            for queryElement in islice(parsed.iterfind(".//{http://mcc.lip6.fr/}property"), consensus_answer.index - 1, consensus_answer.index):
-                _, _, query_type = parse_query_and_type(queryElement)
+            file_properties = properties.get((consensus_answer.model_name, consensus_answer.category), [])
+            if consensus_answer.index <= len(file_properties):
+                _, query_type = file_properties[consensus_answer.index - 1]
         if (consensus_answer.category == "ReachabilityDeadlock"):
             query_type = "ef"
         queries_to_insert.append((consensus_answer.model_name, consensus_answer.category, consensus_answer.index, query_type, expected_answer))
-    for modelDirectoryPath in Path(all_models_path).glob("*"):
-        model_name = modelDirectoryPath.name 
-        if (modelDirectoryPath.name not in known_models):
-            for queryCategory in DYNAMIC_QUERY_CATEGORIES:
-                parsed = ET.parse(str(modelDirectoryPath / (queryCategory + ".xml")))
-                for queryElement in parsed.iterfind(".//{http://mcc.lip6.fr/}property"):
-                    _, index, query_type = parse_query_and_type(queryElement)
-                    queries_to_insert.append((model_name, queryCategory, index, query_type, None))
-            for queryCategory in NON_DYNAMIC_QUERY_CATEGORIES:
-                query_type = None if queryCategory != "ReachabilityDeadlock" else "ef"
-                queries_to_insert.append((model_name, queryCategory, 1, query_type, None))
+    for model_name in unknown_models:
+        for queryCategory in DYNAMIC_QUERY_CATEGORIES:
+            for index, query_type in properties.get((model_name, queryCategory), []):
+                queries_to_insert.append((model_name, queryCategory, index, query_type, None))
+        for queryCategory in NON_DYNAMIC_QUERY_CATEGORIES:
+            query_type = None if queryCategory != "ReachabilityDeadlock" else "ef"
+            queries_to_insert.append((model_name, queryCategory, 1, query_type, None))
     with closing(db.cursor()) as cur:
         cur.executemany("""
             INSERT INTO query_instance (model_name, query_name, query_index, query_type, expected_answer)
             VALUES (?, ?, ?, ?, ?)
         """, queries_to_insert)
 
-def read_or_fail(tarFile: TarFile, tarFileInfo: TarInfo):
-    f = tarFile.extractfile(tarFileInfo)
-    if f == None:
-        raise Exception("Could not find specific file in tar file")
-    with f as fi:
-        return fi.read().decode()
-
-def process_tar(tarFile: TarFile) -> Iterator[Result]:
-    is_large_job = any(map(lambda x: x.endswith('large'), tarFile.getnames()))
-    for outInfo in tarFile.getmembers():
-        if not outInfo.path.endswith(".out"):
+def open_or_fail(tarFile: TarFile, tarFileInfo: TarInfo) -> TextIOWrapper:
+    return TextIOWrapper(open_member(tarFile, tarFileInfo), encoding="utf-8")
+
+# The files of the archive keyed by their name without the compression
+# suffix, read from the index of the archive if it has one.
+def index_tar(tarFile: TarFile) -> tuple[dict[str, TarInfo], bool]:
+    members: dict[str, TarInfo] = {}
+    is_large_job = False
+    for info in list_members(tarFile):
+        members[get_member_name(info)] = info
+        is_large_job = is_large_job or info.name.endswith('large')
+    return members, is_large_job
+
+# The .out and .err files of each model, with the .jsonl file of records the
+# benchmark scheduler writes next to them if there is one.
+def pair_members(members: dict[str, TarInfo]) -> Iterator[tuple[TarInfo, TarInfo, Optional[TarInfo]]]:
+    for name, outInfo in members.items():
+        if not name.endswith(".out"):
             continue
-        try:
-            outContent = read_or_fail(tarFile, outInfo)
-            errContent = read_or_fail(tarFile, tarFile.getmember(outInfo.path.removesuffix(".out") + ".err"))
-            results = Result.fromOutErr(outContent, errContent, is_large_job)
-            for result in results:
+        errInfo = members.get(name.removesuffix(".out") + ".err")
+        if errInfo is None:
+            continue
+        yield outInfo, errInfo, members.get(name.removesuffix(".out") + ".jsonl")
+
+# Results with records are decoded from them, and their logs are only read
+# when they are stored. Archives from before the records are parsed from the
+# logs.
+def parse_members(tarFile: TarFile, outInfo: TarInfo, errInfo: TarInfo, recordsInfo: Optional[TarInfo], is_large_job: bool, store_logs: bool) -> Iterator[Result]:
+    if recordsInfo is not None:
+        out = read_member(tarFile, outInfo) if store_logs else None
+        err = read_member(tarFile, errInfo) if store_logs else None
+        with open_or_fail(tarFile, recordsInfo) as records:
+            yield from Result.fromRecords(records, out, err)
+        return
+    with open_or_fail(tarFile, outInfo) as outFile, open_or_fail(tarFile, errInfo) as errFile:
+        yield from Result.fromOutErrStreams(outFile, errFile, is_large_job)
+
+def process_tar(tarFile: TarFile, store_logs: bool = True) -> Iterator[Result]:
+    members, is_large_job = index_tar(tarFile)
+    for outInfo, errInfo, recordsInfo in pair_members(members):
+        for result in parse_members(tarFile, outInfo, errInfo, recordsInfo, is_large_job, store_logs):
+            yield result
+
+# Raw logs are stored zlib compressed in log_blob and shared between all
+# queries with the exact same output, keyed by a hash of the uncompressed text.
+# The logs of the other queries of an archive member are compressed with the
+# start of the log of its first query, their base, as preset dictionary, so the
+# model loading and reduction output the queries of a model have in common is
+# not stored again for each of them.
+def pack_log(text: str, base: Optional[tuple[str, tuple]] = None) -> tuple[bytes, bytes, Optional[tuple]]:
+    data = text.encode()
+    hash = hashlib.blake2b(data, digest_size=16).digest()
+    if base is None:
+        return hash, zlib.compress(data), None
+    compressor = zlib.compressobj(zdict=base[0].encode()[:LOG_DICTIONARY_SIZE])
+    return hash, compressor.compress(data) + compressor.flush(), base[1]
+
+class LogStore:
+    def __init__(self, db: sqlite3.Connection):
+        self.db = db
+        with closing(db.execute("SELECT hash, id FROM log_blob")) as cur:
+            self.blob_ids: dict[bytes, int] = dict(cur.fetchall())
+
+    def add(self, packed_log: tuple[bytes, bytes, Optional[tuple]]) -> int:
+        hash, data, base = packed_log
+        blob_id = self.blob_ids.get(hash)
+        if blob_id is None:
+            base_id = None if base is None else self.add(base)
+            with closing(self.db.execute("INSERT INTO log_blob (hash, data, base) VALUES (?, ?, ?) RETURNING id", (hash, data, base_id))) as cur:
+                blob_id = cur.fetchone()[0]
+            self.blob_ids[hash] = blob_id
+        return blob_id
+
+def pack_resource_samples(samples: list[tuple[float, float, float, float]]) -> tuple[int, bytes]:
+    values = list(chain.from_iterable(samples))
+    return len(samples), zlib.compress(struct.pack(f"<{len(values)}d", *values))
+
+# The part of a Result that ends up in the database. The values are ordered as
+# the query_result columns after experiment_id and query_instance_id.
+def compact_result(result: Result, logs: Optional[tuple]) -> tuple:
+    return (
+        result.query_instance.model_name,
+        result.query_instance.query_name,
+        result.query_instance.query_index,
+        result.strategy,
+        result.trial,
+        logs,
+        None if result.resourceSamples is None else pack_resource_samples(result.resourceSamples),
+        None if result.batchSize is None else (result.batchSize, result.sharedTime),
+        result.predicted,
+        result.time,
+        result.status.name,
+        None if result.result == None else result.result.name,
+        result.maxMemory,
+        result.states,
+        result.colorReductionTime,
+        result.verificationTime
+    )
+
+# Compacts the results of one archive member, whose logs are packed with those
+# of the first result as base.
+def compact_results(results: Iterable[Result], store_logs: bool) -> Iterator[tuple]:
+    bases = None
+    for result in results:
+        if not store_logs:
+            yield compact_result(result, None)
+        elif bases is None:
+            logs = (pack_log(result.fullOut), pack_log(result.fullErr))
+            bases = ((result.fullOut, logs[0]), (result.fullErr, logs[1]))
+            yield compact_result(result, logs)
+        else:
+            yield compact_result(result, (pack_log(result.fullOut, bases[0]), pack_log(result.fullErr, bases[1])))
+
+worker_tar_files: dict[str, TarFile] = {}
+MAX_PAIRS_IN_FLIGHT = 256
+INSERT_BATCH_SIZE = 10000
+
+def parse_member_pair(tarPath: str, outInfo: TarInfo, errInfo: TarInfo, recordsInfo: Optional[TarInfo], is_large_job: bool, store_logs: bool) -> list[tuple]:
+    tarFile = worker_tar_files.get(tarPath)
+    if tarFile is None:
+        tarFile = tarfile.open(tarPath, "r")
+        worker_tar_files[tarPath] = tarFile
+    return list(compact_results(parse_members(tarFile, outInfo, errInfo, recordsInfo, is_large_job, store_logs), store_logs))
+
+def compact_tar(tarFile: TarFile, store_logs: bool) -> Iterator[tuple]:
+    members, is_large_job = index_tar(tarFile)
+    for outInfo, errInfo, recordsInfo in pair_members(members):
+        yield from compact_results(parse_members(tarFile, outInfo, errInfo, recordsInfo, is_large_job, store_logs), store_logs)
+
+def process_tar_parallel(executor: ProcessPoolExecutor, tarPath: str, tarFile: TarFile, store_logs: bool) -> Iterator[tuple]:
+    members, is_large_job = index_tar(tarFile)
+    # Only a bounded number of pairs is in flight at a time, so parsed results
+    # never pile up faster than they are inserted.
+    in_flight: deque[Future] = deque()
+    for outInfo, errInfo, recordsInfo in pair_members(members):
+        in_flight.append(executor.submit(parse_member_pair, tarPath, outInfo, errInfo, recordsInfo, is_large_job, store_logs))
+        while len(in_flight) >= MAX_PAIRS_IN_FLIGHT or (len(in_flight) > 0 and in_flight[0].done()):
+            for result in in_flight.popleft().result():
                 yield result
-        except KeyError:
-            pass
+    while in_flight:
+        for result in in_flight.popleft().result():
+            yield result
 
 
-def process_directory(already_processed_files: set[str], directory: Path) -> Iterator[tuple[str, Result] | str]:
+def process_directory(already_processed_files: set[str], directory: Path, executor: Optional[ProcessPoolExecutor], store_logs: bool) -> Iterator[tuple[str, tuple] | str]:
     for filePath in directory.glob("*.tar"):
         bench_name = filePath.name.split(".")[0]
         if (bench_name in already_processed_files):
@@ -155,57 +645,20 @@ def process_directory(already_processed_files: set[str], directory: Path) -> Ite
             continue
         with tarfile.open(str(filePath), "r") as tarFile:
             print(f"adding file {filePath.name} to database")
-            for result in process_tar(tarFile):
+            if executor is None:
+                results = compact_tar(tarFile, store_logs)
+            else:
+                results = process_tar_parallel(executor, str(filePath), tarFile, store_logs)
+            for result in results:
                 yield (bench_name, result)
             yield bench_name
 
-def process_and_insert(db: sqlite3.Connection, directory: Path):
-    experiment_id_map: dict[str, int] = {}
-    query_instance_id_map: dict[str, int] = {}
-
-    with closing(db.execute("SELECT id, name, search_strategy FROM experiment")) as cur:
-        for row in cur.fetchall():
-            experiment_id_map[f"{row[1]}#{row[2]}"] = row[0]
-
-    with closing(db.execute("SELECT id, model_name, query_name, query_index, query_type FROM query_instance")) as cur:
-        for row in cur.fetchall():
-            query_instance_id_map[f"{row[1]}#{row[2]}#{row[3]}"] = row[0]
-
-    cur = db.execute("SELECT file_name FROM processed_files")
-    already_processed_files = set(map(lambda x: x[0], cur.fetchall()))
-    cur.close()
-    rows_to_insert: list[tuple] = []
-
-    for item in process_directory(already_processed_files, directory):
-        if type(item) is str:
-            with closing(db.execute("INSERT INTO processed_files (file_name) VALUES (?)", (item,))):
-                pass
-            continue
-        else:
-            experiment_name: str = item[0]
-            result: Result = item[1]
-            experiment_id_key = f"{experiment_name}-{result.strategy}"
-            if (experiment_id_key not in experiment_id_map):
-                cur = db.execute("INSERT INTO experiment (name, search_strategy) VALUES (?, ?) RETURNING id", (experiment_name, result.strategy))
-                id = cur.fetchone()
-                cur.close()
-                experiment_id_map[experiment_id_key] = id[0]
-
-            rows_to_insert.append((
-                experiment_id_map[experiment_id_key],
-                query_instance_id_map[f"{result.query_instance.model_name}#{result.query_instance.query_name}#{result.query_instance.query_index}"],
-                result.time,
-                result.status.name,
-                None if result.result == None else result.result.name,
-                result.maxMemory,
-                result.states,
-                result.colorReductionTime,
-                result.verificationTime
-            ))
+def insert_batch(db: sqlite3.Connection, rows_to_insert: list[tuple], extended_rows_to_insert: list[tuple], resource_rows_to_insert: list[tuple], trial_rows_to_insert: list[tuple], batch_rows_to_insert: list[tuple], predicted_rows_to_insert: list[tuple]):
     with closing(db.cursor()) as cur:
         cur.executemany("""
             INSERT INTO query_result
                 (
+                    id,
                     experiment_id,
                     query_instance_id,
                     time,
@@ -217,19 +670,415 @@ def process_and_insert(db: sqlite3.Connection, directory: Path):
                     verification_time
                 )
             VALUES
-                (?,?,?,?,?,?,?,?,?)
+                (?,?,?,?,?,?,?,?,?,?)
         """, rows_to_insert)
+        cur.executemany("INSERT INTO extended_result (query_result_id, stdout, stderr) VALUES (?, ?, ?)", extended_rows_to_insert)
+        cur.executemany("INSERT INTO resource_usage (query_result_id, sample_count, samples) VALUES (?, ?, ?)", resource_rows_to_insert)
+        cur.executemany("INSERT INTO query_trial (query_result_id, trial, time, status, max_memory, verification_time) VALUES (?, ?, ?, ?, ?, ?)", trial_rows_to_insert)
+        cur.executemany("INSERT INTO query_batch (query_result_id, batch_size, shared_time) VALUES (?, ?, ?)", batch_rows_to_insert)
+        cur.executemany("INSERT INTO predicted_result (query_result_id) VALUES (?)", predicted_rows_to_insert)
+    if len(rows_to_insert) > 0:
+        update_query_summary(db, rows_to_insert[0][0], rows_to_insert[-1][0])
+    rows_to_insert.clear()
+    extended_rows_to_insert.clear()
+    resource_rows_to_insert.clear()
+    trial_rows_to_insert.clear()
+    batch_rows_to_insert.clear()
+    predicted_rows_to_insert.clear()
+
+# Adds compact results to query_result and the tables next to it, written in
+# batches of INSERT_BATCH_SIZE. Repeated trials of a query come after its
+# first trial and are added to the query_trial rows of that query result.
+# Results that were added live from current-benchmark are listed in
+# live_result and skipped when they come again from their archive.
+class ResultInserter:
+    def __init__(self, db: sqlite3.Connection):
+        self.db = db
+        self.experiment_id_map: dict[str, int] = {}
+        self.query_instance_id_map: dict[str, int] = {}
+        with closing(db.execute("SELECT id, name, search_strategy FROM experiment")) as cur:
+            for row in cur.fetchall():
+                self.experiment_id_map[f"{row[1]}#{row[2]}"] = row[0]
+        with closing(db.execute("SELECT id, model_name, query_name, query_index, query_type FROM query_instance")) as cur:
+            for row in cur.fetchall():
+                self.query_instance_id_map[f"{row[1]}#{row[2]}#{row[3]}"] = row[0]
+        with closing(db.execute("SELECT COALESCE(MAX(id), 0) FROM query_result")) as cur:
+            self.next_query_result_id = cur.fetchone()[0] + 1
+        self.live_ids: dict[tuple[int, int, int], int] = {}
+        with closing(db.execute("""
+            SELECT qr.experiment_id, qr.query_instance_id, lr.trial, qr.id FROM live_result lr
+                JOIN query_result qr ON qr.id = lr.query_result_id
+        """)) as cur:
+            for experiment_id, query_instance_id, trial, query_result_id in cur:
+                self.live_ids[(experiment_id, query_instance_id, trial)] = query_result_id
+        self.first_trial_ids: dict[tuple[int, int], int] = {key[:2]: id for key, id in self.live_ids.items() if key[2] == 1}
+        self.log_store = LogStore(db)
+        self.rows_to_insert: list[tuple] = []
+        self.extended_rows_to_insert: list[tuple] = []
+        self.resource_rows_to_insert: list[tuple] = []
+        self.trial_rows_to_insert: list[tuple] = []
+        self.batch_rows_to_insert: list[tuple] = []
+        self.predicted_rows_to_insert: list[tuple] = []
+        self.live_rows_to_insert: list[tuple] = []
+
+    # Adds a result of the given experiment unless it was added live before,
+    # and marks it as live if live is True. Returns whether it was added.
+    def add(self, experiment_name: str, result: tuple, live: bool = False) -> bool:
+        model_name, query_name, query_index, strategy, trial, logs, resource_samples, batch, predicted, *values = result
+        experiment_id_key = f"{experiment_name}#{strategy}"
+        if (experiment_id_key not in self.experiment_id_map):
+            cur = self.db.execute("INSERT INTO experiment (name, search_strategy) VALUES (?, ?) RETURNING id", (experiment_name, strategy))
+            id = cur.fetchone()
+            cur.close()
+            self.experiment_id_map[experiment_id_key] = id[0]
+
+        result_key = (self.experiment_id_map[experiment_id_key], self.query_instance_id_map[f"{model_name}#{query_name}#{query_index}"])
+        live_id = self.live_ids.get((*result_key, trial))
+        if live_id is not None:
+            if trial == 1:
+                self.first_trial_ids[result_key] = live_id
+            return False
+        if trial > 1 and result_key in self.first_trial_ids:
+            time, status, _, max_memory, _, _, verification_time = values
+            self.trial_rows_to_insert.append((self.first_trial_ids[result_key], trial, time, status, max_memory, verification_time))
+            if live:
+                self.live_rows_to_insert.append((self.first_trial_ids[result_key], trial))
+                self.live_ids[(*result_key, trial)] = self.first_trial_ids[result_key]
+            return True
+        query_result_id = self.next_query_result_id
+        self.first_trial_ids[result_key] = query_result_id
+        self.rows_to_insert.append((query_result_id, *result_key, *values))
+        if logs is not None:
+            self.extended_rows_to_insert.append((query_result_id, self.log_store.add(logs[0]), self.log_store.add(logs[1])))
+        if resource_samples is not None:
+            self.resource_rows_to_insert.append((query_result_id, *resource_samples))
+        if batch is not None:
+            self.batch_rows_to_insert.append((query_result_id, *batch))
+        if predicted:
+            self.predicted_rows_to_insert.append((query_result_id,))
+        if live:
+            self.live_rows_to_insert.append((query_result_id, trial))
+            self.live_ids[(*result_key, trial)] = query_result_id
+        self.next_query_result_id += 1
+        if len(self.rows_to_insert) >= INSERT_BATCH_SIZE:
+            self.flush()
+        return True
+
+    def flush(self):
+        insert_batch(self.db, self.rows_to_insert, self.extended_rows_to_insert, self.resource_rows_to_insert, self.trial_rows_to_insert, self.batch_rows_to_insert, self.predicted_rows_to_insert)
+        with closing(self.db.executemany("INSERT INTO live_result (query_result_id, trial) VALUES (?, ?)", self.live_rows_to_insert)):
+            pass
+        self.live_rows_to_insert.clear()
+
+    # The results of the experiments of an archive that has been fully
+    # processed are no longer live.
+    def finish_archive(self, experiment_name: str):
+        self.flush()
+        self.first_trial_ids.clear()
+        with closing(self.db.execute("""
+            DELETE FROM live_result WHERE query_result_id IN (
+                SELECT qr.id FROM query_result qr
+                    JOIN experiment e ON e.id = qr.experiment_id
+                WHERE e.name = ?
+            )
+        """, (experiment_name,))):
+            pass
+
+# Each archive is committed together with its processed_files row once it is
+# fully read.
+def process_and_insert(db: sqlite3.Connection, directory: Path, jobs: int = 1, store_logs: bool = True):
+    cur = db.execute("SELECT file_name FROM processed_files")
+    already_processed_files = set(map(lambda x: x[0], cur.fetchall()))
+    cur.close()
+    inserter = ResultInserter(db)
+
+    executor = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else None
+    try:
+        for item in process_directory(already_processed_files, directory, executor, store_logs):
+            if type(item) is str:
+                inserter.finish_archive(item)
+                with closing(db.execute("INSERT INTO processed_files (file_name) VALUES (?)", (item,))):
+                    pass
+                db.commit()
+                continue
+            else:
+                inserter.add(item[0], item[1])
+    except BaseException:
+        # Everything since the last finished file belongs to the file that
+        # failed, so it is dropped together with its processed_files marker.
+        db.rollback()
+        raise
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+# The tables besides query_result with rows of query results, which lose the
+# rows of the query results that are replaced.
+QUERY_RESULT_TABLES = ["extended_result", "resource_usage", "query_trial", "query_batch", "live_result", "result_source", "predicted_result", "wrong_answer", "trial_summary"]
+
+# The model whose results an .out, .err or .jsonl file of an archive holds,
+# from its name <model>_<engine>-1.
+def get_member_model(name: str) -> str:
+    return Path(name).name.rsplit("_", 1)[0]
+
+# Removes the query results of a model from the experiments of an archive,
+# together with their rows in the other tables. Their logs stay in log_blob,
+# where the same logs added again find them.
+def delete_model_results(db: sqlite3.Connection, experiment_name: str, model_name: str):
+    replaced = """
+        SELECT qr.id FROM query_result qr
+            JOIN experiment e ON e.id = qr.experiment_id
+            JOIN query_instance qi ON qi.id = qr.query_instance_id
+        WHERE e.name = ? AND qi.model_name = ?
+    """
+    for table in QUERY_RESULT_TABLES:
+        with closing(db.execute(f"DELETE FROM {table} WHERE query_result_id IN ({replaced})", (experiment_name, model_name))):
+            pass
+    with closing(db.execute(f"DELETE FROM query_result WHERE id IN ({replaced})", (experiment_name, model_name))):
+        pass
+
+# The query_summary rows of the query instances of a model, computed again from
+# all their query results.
+def rebuild_query_summary(db: sqlite3.Connection, model_name: str):
+    with closing(db.execute("DELETE FROM query_summary WHERE query_instance_id IN (SELECT id FROM query_instance WHERE model_name = ?)", (model_name,))):
+        pass
+    with closing(db.execute("""
+        INSERT INTO query_summary
+            (query_instance_id, result_count, time_count, min_time, max_time, memory_count, min_memory, max_memory)
+        SELECT
+            query_instance_id, COUNT(*), COUNT(time), MIN(time), MAX(time), COUNT(max_memory), MIN(max_memory), MAX(max_memory)
+        FROM query_result
+        WHERE query_instance_id IN (SELECT id FROM query_instance WHERE model_name = ?)
+        GROUP BY query_instance_id
+    """, (model_name,))):
+        pass
+
+# Replaces the results of the given models with those in the processed
+# archives of the directory. Only the files of these models are read, which the
+# index of an archive lets it seek to directly. Everything is committed at once
+# at the end.
+def reingest_models(db: sqlite3.Connection, directory: Path, model_names: list[str], store_logs: bool):
+    with closing(db.execute("SELECT file_name FROM processed_files")) as cur:
+        processed = set(row[0] for row in cur)
+    inserter = ResultInserter(db)
+    found = set()
+    try:
+        for filePath in sorted(directory.glob("*.tar")):
+            bench_name = filePath.name.split(".")[0]
+            if bench_name not in processed:
+                print(f"Skipping {filePath.name}, which is not processed yet")
+                continue
+            with tarfile.open(str(filePath), "r") as tarFile:
+                members, is_large_job = index_tar(tarFile)
+                for outInfo, errInfo, recordsInfo in pair_members(members):
+                    model_name = get_member_model(get_member_name(outInfo))
+                    if model_name not in model_names:
+                        continue
+                    print(f"Re-adding {model_name} from {filePath.name}")
+                    found.add(model_name)
+                    delete_model_results(db, bench_name, model_name)
+                    for result in compact_results(parse_members(tarFile, outInfo, errInfo, recordsInfo, is_large_job, store_logs), store_logs):
+                        inserter.add(bench_name, result)
+                    inserter.flush()
+                    inserter.first_trial_ids.clear()
+        for model_name in model_names:
+            if model_name not in found:
+                print(f"No processed archive has results of {model_name}")
+            rebuild_query_summary(db, model_name)
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+
+def read_span(path: Path, start: int, end: int) -> bytes:
+    with path.open("rb") as f:
+        f.seek(start)
+        return f.read(end - start)
+
+# Like an archive, current-benchmark has the large marker once it is packed.
+# Until then the header format is told from the header of the log itself.
+def is_large_log(directory: Path, log: str) -> bool:
+    return (directory / "large").exists() or re.match(r"\s*" + large_header_pattern, log) is not None
+
+# The result of a finished unit of the running benchmark. Its output lies
+# between the file sizes in the journal entry before it of the same model and
+# those in its own entry, and its record, if there is one, likewise.
+def read_live_result(prefix: Path, entry: JournalEntry, previous: Optional[JournalEntry]) -> Result:
+    out_start = 0 if previous is None else previous.out_size
+    err_start = 0 if previous is None else previous.err_size
+    out = read_span(Path(f"{prefix}.out"), out_start, entry.out_size)
+    err = read_span(Path(f"{prefix}.err"), err_start, entry.err_size)
+    if entry.records_size is None:
+        out_text = out.decode(errors="replace")
+        return next(iter(Result.fromOutErr(out_text, err.decode(errors="replace"), is_large_log(prefix.parent, out_text))))
+    records_start = 0 if previous is None else previous.records_size or 0
+    record = json.loads(read_span(Path(f"{prefix}.jsonl"), records_start, entry.records_size))
+    outSpan = [record["out"][0] - out_start, record["out"][1]]
+    errSpan = [record["err"][0] - err_start, record["err"][1]]
+    return Result.fromRecord(record, sliceLog(out, outSpan), sliceLog(err, errSpan))
+
+# The journal keys and trials of the units that were added live.
+def live_unit_keys(db: sqlite3.Connection) -> set[tuple[str, int]]:
+    with closing(db.execute("""
+        SELECT e.name, qi.model_name, qi.query_name, qi.query_index, lr.trial FROM live_result lr
+            JOIN query_result qr ON qr.id = lr.query_result_id
+            JOIN experiment e ON e.id = qr.experiment_id
+            JOIN query_instance qi ON qi.id = qr.query_instance_id
+    """)) as cur:
+        return set((BenchmarkUnit(engine, model_name, query_name, query_index).get_key(), trial) for engine, model_name, query_name, query_index, trial in cur)
+
+# Prints how many queries of the engine are done with each status and, if the
+# benchmarked models are known, the time left. The remaining queries are
+# predicted from their earlier results and run as many at a time as the
+# finished ones did on average.
+def report_progress(db: sqlite3.Connection, engine: str, journal: BenchmarkJournal, model_names: Optional[list[str]], planner: UnitPlanner):
+    with closing(db.execute("""
+        SELECT qr.status, COUNT(*) FROM live_result lr
+            JOIN query_result qr ON qr.id = lr.query_result_id
+            JOIN experiment e ON e.id = qr.experiment_id
+        WHERE e.name = ? AND lr.trial = 1
+        GROUP BY qr.status
+    """, (engine,))) as cur:
+        counts = dict(cur.fetchall())
+    line = f"{engine}: {sum(counts.values())}"
+    if model_names is not None:
+        units = create_units(engine, model_names)
+        line += f"/{len(units)}"
+    line += " queries, " + ", ".join(f"{counts.get(status.name, 0)} {status}" for status in Status)
+    entries = list(chain.from_iterable(journal.entries.values()))
+    if model_names is not None and len(entries) > 0:
+        remaining = [unit for unit in units if len(journal.trials(unit)) == 0]
+        busy = sum(entry.elapsed for entry in entries)
+        wall = max(entry.finished_at for entry in entries) - min(entry.finished_at - entry.elapsed for entry in entries)
+        parallelism = max(busy / wall if wall > 0 else 1, 1)
+        line += f", {sum(planner.predict(unit).time for unit in remaining) / parallelism / 3600:.1f}h left"
+    print(line)
+
+# Adds the units of the running benchmark in current-benchmark to the database
+# as the benchmark scheduler finishes them, every interval seconds until it is
+# interrupted. Engines whose archive was processed already are left alone, as
+# their results are in the database.
+def watch_benchmark(db: sqlite3.Connection, current_path: Path, model_names: Optional[list[str]], results_path: Path, interval: float, store_logs: bool):
+    inserter = ResultInserter(db)
+    planner = UnitPlanner(results_path, PER_QUERY_TIMEOUT, "longest-first", "run")
+    added = live_unit_keys(db)
+    try:
+        while True:
+            journal = BenchmarkJournal(current_path / JOURNAL_FILE_NAME)
+            with closing(db.execute("SELECT file_name FROM processed_files")) as cur:
+                processed = set(row[0] for row in cur)
+            previous: dict[str, JournalEntry] = {}
+            try:
+                for entry in sorted(chain.from_iterable(journal.entries.values()), key=lambda x: x.finished_at):
+                    prefix = current_path / f"{entry.unit.model_name}_{entry.unit.engine}-1"
+                    key = (entry.unit.get_key(), entry.unit.trial)
+                    if entry.unit.engine not in processed and key not in added:
+                        result = read_live_result(prefix, entry, previous.get(str(prefix)))
+                        inserter.add(entry.unit.engine, next(compact_results([result], store_logs)), live=True)
+                        added.add(key)
+                    previous[str(prefix)] = entry
+            except OSError as e:
+                # The scheduler removes current-benchmark when it starts the
+                # next engine, which is picked up in the next round.
+                print(f"Could not read {e.filename}, retrying")
+            inserter.flush()
+            db.commit()
+            for engine in sorted(journal.engines() - processed):
+                report_progress(db, engine, journal, model_names, planner)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        inserter.flush()
+        db.commit()
+
+# Compares every answered result with the consensus answer of its query in a
+# single statement and reports the mismatches per experiment and category.
+def validate_answers(db: sqlite3.Connection):
+    with closing(db.execute("DELETE FROM wrong_answer")):
+        pass
+    with closing(db.execute("""
+        INSERT INTO wrong_answer (query_result_id, expected_answer)
+        SELECT qr.id, qi.expected_answer FROM query_result qr
+            JOIN query_instance qi ON qi.id = qr.query_instance_id
+        WHERE qr.status = 'Answered' AND qr.result IS NOT NULL AND qi.expected_answer IS NOT NULL
+            AND qr.result != qi.expected_answer
+    """)):
+        pass
+    with closing(db.execute("""
+        SELECT e.name, e.search_strategy, qi.query_name, COUNT(*), COUNT(wa.query_result_id) FROM query_result qr
+            JOIN query_instance qi ON qi.id = qr.query_instance_id
+            JOIN experiment e ON e.id = qr.experiment_id
+            LEFT JOIN wrong_answer wa ON wa.query_result_id = qr.id
+        WHERE qr.status = 'Answered' AND qr.result IS NOT NULL AND qi.expected_answer IS NOT NULL
+        GROUP BY qr.experiment_id, qi.query_name
+        ORDER BY e.name, e.search_strategy, qi.query_name
+    """)) as cur:
+        rows = cur.fetchall()
+    checked = sum(row[3] for row in rows)
+    wrong = sum(row[4] for row in rows)
+    print(f"Validated {checked} answers against the consensus, {wrong} are wrong")
+    for name, strategy, category, category_checked, category_wrong in rows:
+        if category_wrong > 0:
+            print(f"    {name}-{strategy} {category}: {category_wrong} of {category_checked} answers are wrong")
+
+# Recomputes the median time and its confidence interval of every query result
+# with repeated trials.
+def update_trial_summary(db: sqlite3.Connection):
+    with closing(db.execute("DELETE FROM trial_summary")):
+        pass
+    with closing(db.execute("""
+        SELECT qr.id, qr.time, qt.time FROM query_trial qt
+            JOIN query_result qr ON qr.id = qt.query_result_id
+        ORDER BY qr.id, qt.trial
+    """)) as cur:
+        rows_to_insert = []
+        for query_result_id, rows in groupby(cur, key=lambda x: x[0]):
+            rows = list(rows)
+            times = [time for time in chain([rows[0][1]], (row[2] for row in rows)) if time is not None]
+            if len(times) > 0:
+                rows_to_insert.append((query_result_id, len(times), *median_confidence_interval(times)))
+    with closing(db.executemany("""
+        INSERT INTO trial_summary (query_result_id, trial_count, median_time, time_low, time_high) VALUES (?, ?, ?, ?, ?)
+    """, rows_to_insert)):
+        pass
+    if len(rows_to_insert) > 0:
+        print(f"Summarized the trials of {len(rows_to_insert)} query results that were run more than once")
 
 def main():
+    parser = ArgumentParser(prog="Adds the packed benchmark results to the results database")
+    parser.add_argument("--jobs", type=int, default=1, help="number of worker processes used to parse the results")
+    parser.add_argument("--skip-logs", default=False, action="store_true", help="do not store the raw output of each query")
+    parser.add_argument("--results", type=Path, default=Path("artifacts/results.db"), help="the results database the results are added to")
+    parser.add_argument("--watch", default=False, action="store_true", help="adds the queries of the running benchmark in artifacts/current-benchmark as they finish and reports the progress until interrupted, instead of processing artifacts/packed-results")
+    parser.add_argument("--interval", type=float, default=10, help="seconds between two rounds of --watch")
+    parser.add_argument("--models", type=Path, default=Path("target-models.txt"), help="file with the benchmarked models, one name per line, from which --watch estimates the time left")
+    parser.add_argument("--reingest", action="append", metavar="MODEL", help="reads the results of this model again from the processed archives in artifacts/packed-results and replaces those in the database, instead of processing new archives, can be given multiple times")
+    args = parser.parse_args()
+
     artifacts_path = Path("artifacts")
     artifacts_path.mkdir(exist_ok=True)
 
-    db = sqlite3.connect(str(artifacts_path / "results.db"))
-    create_tables(db)
+    db = sqlite3.connect(str(args.results))
+    upgrade_schema(db)
     print("Creating query instances...")
-    create_query_instances(db, artifacts_path / "consensus-answers.csv", artifacts_path / "all-models")
-    print("Processing results...")
-    process_and_insert(db, artifacts_path / "packed-results")
+    create_query_instances(db, artifacts_path / "consensus-answers.db", artifacts_path / "all-models", artifacts_path / "query-index.json", args.jobs)
+    db.commit()
+    if args.watch:
+        print("Watching the running benchmark...")
+        model_names = read_lines(args.models) if args.models.exists() else None
+        watch_benchmark(db, artifacts_path / "current-benchmark", model_names, args.results, args.interval, not args.skip_logs)
+        db.close()
+        return
+    if args.reingest is not None:
+        print("Re-adding the results of the given models...")
+        reingest_models(db, artifacts_path / "packed-results", args.reingest, not args.skip_logs)
+    else:
+        print("Processing results...")
+        process_and_insert(db, artifacts_path / "packed-results", args.jobs, not args.skip_logs)
+    db.commit()
+    update_trial_summary(db)
+    db.commit()
+    print("Validating answers...")
+    validate_answers(db)
     db.commit()
     db.close()
 
@@ -0,0 +1,79 @@
+import sqlite3
+import struct
+from typing import Optional, Self
+import zlib
+
+# The lookups of single query results and their logs and resource samples.
+# Unlike analysis_helper, nothing here needs NumPy, so show-query-log.py runs
+# without it.
+class Experiment:
+    def __init__(self, name: str, strategy: str):
+        self.name = name
+        self.strategy = strategy
+        if self.name.startswith('V2baseline'):
+            self.type = 'baseline'
+        elif self.strategy.lower() == "default":
+            self.type = "baseline"
+        elif self.strategy.lower().startswith("e"):
+            self.type = "even"
+        else:
+            self.type = "fixed"
+
+    def __repr__(self):
+        return f"<Experiment {self.name} {self.strategy}>"
+    
+    @staticmethod
+    def fromFormat(format: str) -> Self:
+        name, strategy = format.split("-")
+        return Experiment(name, strategy)
+    
+    def getFullStrategyName(self) -> str:
+        if (self.type == "even"):
+            return f"EVEN-{self.getStrategyWithoutSuccessorGen()}"
+        elif (self.type == "fixed"):
+            return f"FIX-{self.getStrategyWithoutSuccessorGen()}"
+        else:
+            return "baseline"
+    def getStrategyWithoutSuccessorGen(self) -> str:
+        return self.strategy.split("_")[1]
+
+def getExperimentId(con: sqlite3.Connection, experiment: Experiment):
+    res = con.execute("SELECT id FROM experiment WHERE name=? AND search_strategy=?", (experiment.name, experiment.strategy))
+    return res.fetchone()[0]
+def getQueryResultId(con: sqlite3.Connection, experimentId: int, modelName: str, queryName: str, queryIndex: int) -> Optional[int]:
+    res = con.execute("""
+        SELECT qr.id FROM query_result qr
+            JOIN query_instance qi ON qi.id = qr.query_instance_id
+        WHERE qr.experiment_id = ? AND qi.model_name = ? AND qi.query_name = ? AND qi.query_index = ?
+    """, (experimentId, modelName, queryName, queryIndex))
+    row = res.fetchone()
+    return None if row is None else row[0]
+
+# zlib only looks back 32 KiB, so a log compressed against its base only gets
+# the start of the base as preset dictionary.
+LOG_DICTIONARY_SIZE = 32 * 1024
+
+def getLogBlob(con: sqlite3.Connection, blobId: int) -> str:
+    data, base = con.execute("SELECT data, base FROM log_blob WHERE id = ?", (blobId,)).fetchone()
+    if base is None:
+        return zlib.decompress(data).decode()
+    decompressor = zlib.decompressobj(zdict=getLogBlob(con, base).encode()[:LOG_DICTIONARY_SIZE])
+    return (decompressor.decompress(data) + decompressor.flush()).decode()
+
+# The raw output is only decompressed here, so the logs of a single query can
+# be inspected without touching the rest of the log_blob table.
+def getQueryLog(con: sqlite3.Connection, queryResultId: int) -> Optional[tuple[str, str]]:
+    res = con.execute("SELECT stdout, stderr FROM extended_result WHERE query_result_id = ?", (queryResultId,))
+    row = res.fetchone()
+    if row is None:
+        return None
+    return getLogBlob(con, row[0]), getLogBlob(con, row[1])
+
+# The memory and CPU time the benchmark scheduler sampled while the query ran,
+# as rows of elapsed seconds, memory in kB, user and system CPU seconds.
+def getResourceSamples(con: sqlite3.Connection, queryResultId: int) -> Optional[list[tuple[float, float, float, float]]]:
+    res = con.execute("SELECT sample_count, samples FROM resource_usage WHERE query_result_id = ?", (queryResultId,))
+    row = res.fetchone()
+    if row is None:
+        return None
+    return list(struct.iter_unpack("<4d", zlib.decompress(row[1])))
@@ -4,7 +4,7 @@ set -e
 mkdir -p artifacts
 
 ./get_all_answers.py
-./retrieve_models.sh
+./retrieve_models.py
 ./run-benchmarks.sh
-./process-results.py
+./process-results.py --jobs $(nproc)
 ./create-plots.sh
\ No newline at end of file
@@ -1,13 +1,20 @@
 
+from collections import deque
 from enum import Enum
+from io import StringIO
+from itertools import zip_longest
+import json
 import re
-from typing import Iterable, Optional, Self
+from typing import Iterable, Iterator, Optional, Self, TextIO
 
 QUERY_SATISFIED = "Query is satisfied"
 QUERY_UNSATISFIED = "Query is NOT satisfied"
 QUERY_TIMEOUT = "TIMEOUT"
 OUT_OF_MEMORY = "std::bad_alloc"
 TOO_MANY_BINDINGS = "TOO_MANY_BINDINGS"
+# Starts the output the benchmark scheduler writes in place of a query it
+# skipped, followed by the status it predicted.
+PREDICTED_STATUS = "SKIPPED: predicted "
 
 class Status(Enum):
     Answered = 0,
@@ -32,19 +39,134 @@ class QueryInstance:
     def get_key(self):
         return f"{self.model_name}:{self.query_name}:{self.query_index}"
 
-class OutputMatch:
-    def __init__(self, name: str, category: str, strategy: str, query_index: int, outResult: str, errResult: str):
-        self.name = name
-        self.category = category
-        self.strategy = strategy.replace("-", "_")
-        self.query_index = query_index
-        self.outResult = outResult
-        self.errResult = errResult
+header_pattern = r"#{6}\s+RUNNING\s+([^_]+)_([^\.]+)\.xml_([A-Za-z]+)\s+X\s+([0-9]+)\s+#{6}"
+large_header_pattern = r"#{6}\s+RUNNING\s+([^\s]+)\s+X\s+([^\s]+)\s+X\s+([^\s]+)\s+X\s+([0-9]+)\s+#{6}"
+pattern = header_pattern + r"([^#]+)"
+large_pattern = large_header_pattern + r"([^#]+)"
+block_pattern = re.compile(header_pattern + r"([^#]*)")
+large_block_pattern = re.compile(large_header_pattern + r"([^#]*)")
+
+BLOCK_READ_SIZE = 1 << 16
+
+# Headers start on a new line, so a block that is followed by another header
+# ends with the newline before it, which belongs to that header. Without it the
+# body is the output written for the query, as the benchmark scheduler records
+# it.
+def withoutHeaderNewline(body: str) -> str:
+    return body[:-1] if body.endswith("\n") else body
+
+# Streaming equivalent of re.finditer(pattern, ...): yields the header groups
+# and body of every block. The stream is read in chunks and only the block
+# that is still unfinished at the end of a chunk is carried over, so memory is
+# bounded by the largest block rather than the whole log.
+def iterBlocks(stream: TextIO | str, blockPattern: re.Pattern) -> Iterator[tuple[tuple, str]]:
+    buffer = ""
+    if isinstance(stream, str):
+        buffer, stream = stream, StringIO()
+    pos = 0
+    readSize = BLOCK_READ_SIZE
+    while True:
+        chunk = stream.read(readSize)
+        eof = chunk == ""
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        if eof:
+            blocks = blockPattern.findall(buffer)
+            for groups in blocks[:-1]:
+                if groups[4] != "":
+                    yield groups[:4], withoutHeaderNewline(groups[4])
+            # The body of the last block runs to the end of the log unless a
+            # header or stray # follows it.
+            if len(blocks) > 0 and blocks[-1][4] != "":
+                body = blocks[-1][4]
+                yield blocks[-1][:4], body if buffer.rfind("#") + 1 + len(body) == len(buffer) else withoutHeaderNewline(body)
+            return
+        unfinished = False
+        for m in blockPattern.finditer(buffer):
+            if m.end() == len(buffer):
+                pos = m.start()
+                unfinished = True
+                break
+            groups = m.groups()
+            if groups[4] != "":
+                yield groups[:4], withoutHeaderNewline(groups[4])
+            pos = m.end()
+        if unfinished:
+            readSize = max(BLOCK_READ_SIZE, len(buffer) - pos)
+        else:
+            readSize = BLOCK_READ_SIZE
+            pos = max(pos, buffer.rfind("\n", pos))
+
+# Pairs the stdout and stderr blocks by their header instead of by position,
+# so a block missing from one of the streams only affects its own query.
+# Blocks without a partner are yielded last with None in place of the partner.
+def joinBlocks(outBlocks: Iterable[tuple[tuple, str]], errBlocks: Iterable[tuple[tuple, str]]) -> Iterator[tuple[Optional[tuple[tuple, str]], Optional[tuple[tuple, str]]]]:
+    pendingOut: dict[tuple, deque] = {}
+    pendingErr: dict[tuple, deque] = {}
+    for outBlock, errBlock in zip_longest(outBlocks, errBlocks):
+        if outBlock is not None and errBlock is not None and outBlock[0] == errBlock[0] and outBlock[0] not in pendingErr and outBlock[0] not in pendingOut:
+            yield outBlock, errBlock
+            continue
+        if outBlock is not None:
+            key = outBlock[0]
+            if key in pendingErr:
+                yield outBlock, popPending(pendingErr, key)
+            else:
+                pendingOut.setdefault(key, deque()).append(outBlock)
+        if errBlock is not None:
+            key = errBlock[0]
+            if key in pendingOut:
+                yield popPending(pendingOut, key), errBlock
+            else:
+                pendingErr.setdefault(key, deque()).append(errBlock)
+    for blocks in pendingOut.values():
+        for block in blocks:
+            yield block, None
+    for blocks in pendingErr.values():
+        for block in blocks:
+            yield None, block
+
+def popPending(pending: dict[tuple, deque], key: tuple) -> tuple[tuple, str]:
+    blocks = pending[key]
+    block = blocks.popleft()
+    if len(blocks) == 0:
+        del pending[key]
+    return block
+
+time_pattern = re.compile(r"real\s+([0-9]+)m([0-9]+(?:\.[0-9]+)?)s")
+total_time_pattern = re.compile(r"TOTAL_TIME: ([0-9]+(?:\.[0-9]+)?)s")
+memory_pattern = re.compile(r"MAX_MEMORY: ([0-9]+)kB")
+passed_states_pattern = re.compile(r"passed states: ([0-9]+)")
+verification_time_pattern = re.compile(r"Spent ([0-9]+(?:\.[0-9]+)?) on verification")
+color_reduction_time_pattern = re.compile(r"Colored structural reductions computed in ([0-9]+(?:\.[0-9]+)?(?:e[+\-][0-9]+)?) seconds")
+resource_samples_pattern = re.compile(r"RESOURCE_SAMPLES:[ \t]*([^\n]*)")
+trial_pattern = re.compile(r"TRIAL: ([0-9]+)")
+batch_pattern = re.compile(r"BATCH: ([0-9]+) ([0-9]+(?:\.[0-9]+)?|-)")
+# The trailers /usr/bin/time, the benchmark scheduler and bash's time write
+# after the output of a query, in the order they write them, so a single scan
+# of stderr finds all of them. Logs where something else lies between them
+# fall back to a scan per field.
+trailer_pattern = re.compile(
+    r"MAX_MEMORY: ([0-9]+)kB\n"
+    r"(?:RESOURCE_SAMPLES:[ \t]*([^\n]*)\n)?"
+    r"(?:BATCH: ([0-9]+) ([0-9]+(?:\.[0-9]+)?|-)\n)?"
+    r"\s*real\s+([0-9]+)m([0-9]+(?:\.[0-9]+)?)s")
+
+# The RESOURCE_SAMPLES trailer of the benchmark scheduler as (elapsed seconds,
+# memory kB, user seconds, system seconds) tuples.
+def parseResourceSamples(text: str) -> list[tuple[float, float, float, float]]:
+    samples = []
+    for sample in text.split():
+        elapsed, memory, user, system = sample.split(":")
+        samples.append((float(elapsed), float(memory), float(user), float(system)))
+    return samples
+
+def sliceLog(log: bytes, span: list[int]) -> str:
+    offset, length = span
+    return log[offset:offset + length].decode(errors="replace")
 
-pattern = r"#{6}\s+RUNNING\s+([^_]+)_([^\.]+)\.xml_([A-Za-z]+)\s+X\s+([0-9]+)\s+#{6}([^#]+)"
-large_pattern= r"#{6}\s+RUNNING\s+([^\s]+)\s+X\s+([^\s]+)\s+X\s+([^\s]+)\s+X\s+([0-9]+)\s+#{6}([^#]+)"
 class Result:
-    def __init__(self, query_instance: QueryInstance, time: Optional[float], status: Status, result: Optional[QueryResult], maxMemory: Optional[float], states: Optional[int], strategy: str, colorReductionTime: Optional[float], verificationTime: Optional[float], fullOut: str, fullErr: str):
+    def __init__(self, query_instance: QueryInstance, time: Optional[float], status: Status, result: Optional[QueryResult], maxMemory: Optional[float], states: Optional[int], strategy: str, colorReductionTime: Optional[float], verificationTime: Optional[float], fullOut: str, fullErr: str, resourceSamples: Optional[list[tuple[float, float, float, float]]] = None, trial: int = 1, batchSize: Optional[int] = None, sharedTime: Optional[float] = None, predicted: bool = False):
         self.query_instance = query_instance
         self.time = time
         self.status = status
@@ -56,71 +178,124 @@ class Result:
         self.fullErr = fullErr
         self.colorReductionTime = colorReductionTime
         self.verificationTime = verificationTime
+        self.resourceSamples = resourceSamples
+        self.trial = trial
+        self.batchSize = batchSize
+        self.sharedTime = sharedTime
+        self.predicted = predicted
+
+    # The JSON record the benchmark scheduler writes for a result next to the
+    # .out and .err files. It adds out and err, the byte offset and length of
+    # the output of the query in them after its header.
+    def toRecord(self) -> dict:
+        return {
+            "model": self.query_instance.model_name,
+            "category": self.query_instance.query_name,
+            "query_index": self.query_instance.query_index,
+            "strategy": self.strategy,
+            "trial": self.trial,
+            "status": self.status.name,
+            "result": None if self.result is None else self.result.name,
+            "time": self.time,
+            "max_memory": self.maxMemory,
+            "states": self.states,
+            "color_reduction_time": self.colorReductionTime,
+            "verification_time": self.verificationTime,
+            "resource_samples": self.resourceSamples,
+            "batch_size": self.batchSize,
+            "shared_time": self.sharedTime,
+            "predicted": self.predicted,
+        }
+
+    @staticmethod
+    def fromRecord(record: dict, fullOut: str, fullErr: str) -> Self:
+        samples = record.get("resource_samples")
+        return Result(
+            QueryInstance(record["model"], record["category"], record["query_index"]),
+            record["time"],
+            Status[record["status"]],
+            None if record["result"] is None else QueryResult[record["result"]],
+            record["max_memory"],
+            record["states"],
+            record["strategy"],
+            record["color_reduction_time"],
+            record["verification_time"],
+            fullOut,
+            fullErr,
+            None if samples is None else [tuple(sample) for sample in samples],
+            record.get("trial", 1),
+            record.get("batch_size"),
+            record.get("shared_time"),
+            record.get("predicted", False),
+        )
+
+    # Decodes the JSON lines of records instead of parsing the logs. The output
+    # of each query is only cut out of out and err when they are given.
+    @staticmethod
+    def fromRecords(records: Iterable[str], out: Optional[bytes], err: Optional[bytes]) -> Iterator[Self]:
+        for line in records:
+            if line.strip() == "":
+                continue
+            record = json.loads(line)
+            fullOut = "" if out is None else sliceLog(out, record["out"])
+            fullErr = "" if err is None else sliceLog(err, record["err"])
+            yield Result.fromRecord(record, fullOut, fullErr)
 
     @staticmethod
     def fromOutErr(out: str, err: str, is_large_job: bool) -> Iterable[Self]:
-        if is_large_job:
-            matches = zip(re.finditer(large_pattern, out), re.finditer(large_pattern, err))
-            
-            return map(
-                lambda t: Result.__fromOutErrSingle(t),
-                map(lambda t: OutputMatch(
-                    t[0].group(1),
-                    t[0].group(3),
-                    t[0].group(2),
-                    int(t[0].group(4)),
-                    t[0].group(5),
-                    t[1].group(5)
-                ), matches)
-            )
-        else:
-            matches = zip(re.finditer(pattern, out), re.finditer(pattern, err))
-            return map(
-                lambda t: Result.__fromOutErrSingle(t),
-                map(lambda t: OutputMatch(
-                    t[0].group(1),
-                    t[0].group(2),
-                    t[0].group(3),
-                    int(t[0].group(4)),
-                    t[0].group(5),
-                    t[1].group(5)
-                ), matches)
-            )
+        return Result.fromOutErrStreams(out, err, is_large_job)
 
     @staticmethod
-    def __fromOutErrSingle(outputMatch: OutputMatch) -> Self:
-        name = outputMatch.name
-        category = outputMatch.category
-        strategy = outputMatch.strategy
-        query_index = outputMatch.query_index
-        outResult = outputMatch.outResult
-        errResult = outputMatch.errResult
-        timeMatch = re.search(r"real\s+([0-9]+)m([0-9]+(\.[0-9]+)?)s", errResult)
-        timeMatch2 = re.search(r"TOTAL_TIME: ([0-9]+(\.[0-9]+)?)s", errResult)
-        memoryMatch = re.search("MAX_MEMORY: ([0-9]+)kB", errResult)
-        passedListMatch = re.search(r"passed states: ([0-9]+)", outResult)
-        verificationTimeMatch = re.search(r"Spent ([0-9]+(\.[0-9]+)?) on verification", outResult)
-        colorReductionTimeMatch = re.search(r"Colored structural reductions computed in ([0-9]+(\.[0-9]+)?(e(\+|\-)[0-9]+)?) seconds", outResult)
-        time = None
-        status = Status.Error
-        maxMemory = None
+    def fromOutErrStreams(out: TextIO | str, err: TextIO | str, is_large_job: bool) -> Iterator[Self]:
+        blockPattern = large_block_pattern if is_large_job else block_pattern
+        for outBlock, errBlock in joinBlocks(iterBlocks(out, blockPattern), iterBlocks(err, blockPattern)):
+            header = (outBlock if outBlock is not None else errBlock)[0]
+            if is_large_job:
+                name, strategy, category, query_index = header
+            else:
+                name, category, strategy, query_index = header
+            yield Result.__fromOutErrSingle(name, category, strategy, int(query_index), "" if outBlock is None else outBlock[1], "" if errBlock is None else errBlock[1])
+
+    # The result of the output of a single query, without its header.
+    @staticmethod
+    def fromBlock(name: str, category: str, strategy: str, query_index: int, out: str, err: str) -> Self:
+        return Result.__fromOutErrSingle(name, category, strategy, query_index, out, err)
+
+    @staticmethod
+    def __fromOutErrSingle(name: str, category: str, strategy: str, query_index: int, outResult: str, errResult: str) -> Self:
+        passedListMatch = passed_states_pattern.search(outResult)
+        verificationTimeMatch = verification_time_pattern.search(outResult)
+        colorReductionTimeMatch = color_reduction_time_pattern.search(outResult)
+        trialMatch = trial_pattern.search(errResult) if "TRIAL: " in errResult else None
         result = None
-        colorReductionTime = None
-        verificationTime = None
-        exploredCount = None
-        if (verificationTimeMatch is not None):
-            verificationTime = float(verificationTimeMatch.group(1))
-        if (timeMatch != None):
-            time = float(timeMatch.group(2)) + float(timeMatch.group(1)) * 60.0
-        elif (timeMatch2 != None):
-            time = float(timeMatch2.group(1))
-        if (memoryMatch != None):
-            maxMemory = float(memoryMatch.group(1))
-        if (colorReductionTimeMatch != None):
-            colorReductionTime = float(colorReductionTimeMatch.group(1))
-        if (passedListMatch is not None):
-            exploredCount = float(passedListMatch.group(1))
-        if (verificationTime is None and exploredCount is not None):
+        trailerMatch = trailer_pattern.search(errResult)
+        if (trailerMatch is not None):
+            maxMemory = float(trailerMatch.group(1))
+            samples = trailerMatch.group(2)
+            batchSize = None if trailerMatch.group(3) is None else int(trailerMatch.group(3))
+            shared = trailerMatch.group(4)
+            time = float(trailerMatch.group(6)) + float(trailerMatch.group(5)) * 60.0
+        else:
+            timeMatch = time_pattern.search(errResult)
+            timeMatch2 = total_time_pattern.search(errResult) if timeMatch is None else None
+            memoryMatch = memory_pattern.search(errResult)
+            resourceSamplesMatch = resource_samples_pattern.search(errResult)
+            batchMatch = batch_pattern.search(errResult)
+            time = None
+            if (timeMatch is not None):
+                time = float(timeMatch.group(2)) + float(timeMatch.group(1)) * 60.0
+            elif (timeMatch2 is not None):
+                time = float(timeMatch2.group(1))
+            maxMemory = None if memoryMatch is None else float(memoryMatch.group(1))
+            samples = None if resourceSamplesMatch is None else resourceSamplesMatch.group(1)
+            batchSize = None if batchMatch is None else int(batchMatch.group(1))
+            shared = None if batchMatch is None else batchMatch.group(2)
+        resourceSamples = None if samples is None else parseResourceSamples(samples)
+        sharedTime = None if shared is None or shared == "-" else float(shared)
+        verificationTime = None if verificationTimeMatch is None else float(verificationTimeMatch.group(1))
+        colorReductionTime = None if colorReductionTimeMatch is None else float(colorReductionTimeMatch.group(1))
+        exploredCount = None if passedListMatch is None else float(passedListMatch.group(1))
+        if (verificationTime is None and exploredCount is not None and time is not None):
             verificationTime = time - (colorReductionTime if colorReductionTime is not None else 0)
         if (QUERY_SATISFIED in outResult):
             status = Status.Answered
@@ -136,7 +311,5 @@ class Result:
             status = Status.OutOfMemory
         else:
             status = Status.Error
-        
-        return Result(QueryInstance(name, category, query_index), time, status, result, maxMemory, exploredCount, strategy, colorReductionTime, verificationTime, outputMatch.outResult, outputMatch.errResult)
-        
 
+        return Result(QueryInstance(name, category, query_index), time, status, result, maxMemory, exploredCount, strategy.replace("-", "_"), colorReductionTime, verificationTime, outResult, errResult, resourceSamples, 1 if trialMatch is None else int(trialMatch.group(1)), batchSize, sharedTime, PREDICTED_STATUS in outResult)
@@ -0,0 +1,157 @@
+#!/usr/bin/python3
+from argparse import ArgumentParser
+from concurrent.futures import Future, ProcessPoolExecutor
+import os
+from pathlib import Path, PurePosixPath
+import shutil
+import tarfile
+from typing import BinaryIO, Optional
+import urllib.request
+
+INPUTS_URL = "https://mcc.lip6.fr/2024/archives/INPUTS-2024.tar.gz"
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# The model an entry of INPUTS-2024.tar.gz holds, or None for the P/T models
+# and everything that is not a model archive.
+def get_model_name(memberName: str) -> Optional[str]:
+    path = PurePosixPath(memberName)
+    if path.suffix != ".tgz" or path.name.startswith(".") or "-PT-" in path.name:
+        return None
+    return path.stem
+
+# Unpacks the archive of one model into a hidden directory next to its final
+# place and renames it there, so a model directory is either complete or
+# missing even if the extraction is interrupted.
+def extract_model(archivePath: Path, modelsPath: Path) -> str:
+    name = archivePath.stem
+    partialPath = modelsPath / f".{name}.partial"
+    if partialPath.exists():
+        shutil.rmtree(partialPath)
+    with tarfile.open(archivePath, "r:gz") as tarFile:
+        tarFile.extraction_filter = tarfile.data_filter
+        tarFile.extractall(partialPath)
+    extracted = list(partialPath.iterdir())
+    modelPath = extracted[0] if len(extracted) == 1 and extracted[0].is_dir() else partialPath
+    modelPath.rename(modelsPath / name)
+    if partialPath.exists():
+        partialPath.rmdir()
+    archivePath.unlink()
+    return name
+
+# The colored models of the benchmark, either extracted into models_path or
+# still packed as archives_path/<name>.tgz until they are first needed.
+class ModelStore:
+    def __init__(self, modelsPath: Path, archivesPath: Path):
+        self.models_path = modelsPath
+        self.archives_path = archivesPath
+
+    def archive_path(self, name: str) -> Path:
+        return self.archives_path / f"{name}.tgz"
+
+    def is_extracted(self, name: str) -> bool:
+        return (self.models_path / name).is_dir()
+
+    def is_available(self, name: str) -> bool:
+        return self.is_extracted(name) or self.archive_path(name).exists()
+
+    def names(self) -> list[str]:
+        extracted = [path.name for path in self.models_path.glob("*") if path.is_dir() and not path.name.startswith(".")]
+        packed = [path.stem for path in self.archives_path.glob("*.tgz")]
+        return sorted(set(extracted) | set(packed))
+
+    # The size of the model.pnml of a model, or None if it is not retrieved.
+    def model_size(self, name: str) -> Optional[int]:
+        if self.is_extracted(name):
+            return (self.models_path / name / "model.pnml").stat().st_size
+        if self.archive_path(name).exists():
+            with tarfile.open(self.archive_path(name), "r:gz") as tarFile:
+                for member in tarFile:
+                    if PurePosixPath(member.name).name == "model.pnml":
+                        return member.size
+        return None
+
+    # Extracts a packed model, returning whether anything was extracted.
+    def ensure(self, name: str) -> bool:
+        if self.is_extracted(name) or not self.archive_path(name).exists():
+            return False
+        self.models_path.mkdir(parents=True, exist_ok=True)
+        extract_model(self.archive_path(name), self.models_path)
+        return True
+
+def copy_to_file(source: BinaryIO, path: Path):
+    temporaryPath = path.with_name(path.name + ".tmp")
+    with temporaryPath.open("wb") as f:
+        shutil.copyfileobj(source, f, COPY_BUFFER_SIZE)
+    temporaryPath.replace(path)
+
+# Reads the outer archive front to back and only writes out the archives of the
+# selected models. Each of them is handed to the pool to be extracted while the
+# rest of the outer archive is still being read.
+def retrieve_models(inputs: BinaryIO, store: ModelStore, selected: Optional[set[str]], lazy: bool, jobs: int) -> int:
+    store.archives_path.mkdir(parents=True, exist_ok=True)
+    store.models_path.mkdir(parents=True, exist_ok=True)
+    retrieved = 0
+    futures: list[Future] = []
+    with ProcessPoolExecutor(max_workers=jobs) as executor, tarfile.open(fileobj=inputs, mode="r|gz") as tarFile:
+        for member in tarFile:
+            name = get_model_name(member.name)
+            if name is None or not member.isfile() or (selected is not None and name not in selected):
+                continue
+            if store.is_available(name):
+                continue
+            source = tarFile.extractfile(member)
+            if source is None:
+                continue
+            copy_to_file(source, store.archive_path(name))
+            retrieved += 1
+            if not lazy:
+                futures.append(executor.submit(extract_model, store.archive_path(name), store.models_path))
+        for future in futures:
+            print(f"Extracted {future.result()}")
+    return retrieved
+
+def read_model_names(path: Path) -> set[str]:
+    return set(line.strip() for line in path.read_text().splitlines() if line.strip() != "")
+
+def main():
+    parser = ArgumentParser(prog="Retrieves the colored models of MCC24 into artifacts/all-models")
+    parser.add_argument("--models", type=Path, default=Path("target-models.txt"), help="only retrieves the models listed in this file, if it exists")
+    parser.add_argument("--inputs", type=Path, default=Path("artifacts/INPUTS-2024.tar.gz"), help="the MCC inputs archive, which is streamed from the MCC web site if it does not exist")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="number of models extracted at once")
+    parser.add_argument("--lazy", default=False, action="store_true", help="only stores the archive of each model, which the benchmark scheduler extracts when it first runs the model")
+    parser.add_argument("--list", default=False, action="store_true", help="prints the name of every retrieved model instead of retrieving them")
+    args = parser.parse_args()
+
+    artifactsPath = Path("artifacts")
+    store = ModelStore(artifactsPath / "all-models", artifactsPath / "model-archives")
+    if args.list:
+        for name in store.names():
+            print(name)
+        return
+
+    selected = read_model_names(args.models) if args.models.exists() else None
+    if selected is not None:
+        missing = [name for name in selected if not store.is_available(name)]
+        if len(missing) == 0:
+            print(f"All {len(selected)} models in {args.models} are already retrieved, skipping retrieval")
+            return
+        print(f"Retrieving {len(missing)} models listed in {args.models}")
+    elif len(store.names()) > 0:
+        print(f"{store.models_path} already has models, skipping retrieval")
+        return
+    else:
+        print("Retrieving all colored models")
+    if args.inputs.exists():
+        with args.inputs.open("rb") as inputs:
+            retrieved = retrieve_models(inputs, store, selected, args.lazy, args.jobs)
+    else:
+        with urllib.request.urlopen(INPUTS_URL) as inputs:
+            retrieved = retrieve_models(inputs, store, selected, args.lazy, args.jobs)
+    print(f"Retrieved {retrieved} models{' to be extracted when first used' if args.lazy else ''}")
+    if selected is not None:
+        for name in sorted(selected):
+            if not store.is_available(name):
+                print(f"Model {name} was not found in the MCC inputs")
+
+if __name__ == "__main__":
+    main()
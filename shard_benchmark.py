@@ -0,0 +1,232 @@
+#!/usr/bin/python3
+from argparse import ArgumentParser
+from bisect import bisect_right
+from contextlib import ExitStack
+import heapq
+import json
+import os
+from pathlib import Path
+import re
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+from typing import BinaryIO, Iterator, Optional
+
+from benchmark_scheduler import ENGINE_OPTIONS, PER_QUERY_TIMEOUT, BenchmarkUnit, UnitPlanner, create_units, read_lines
+from packed_archive import COMPRESSED_SUFFIX, add_stream, get_member_name, open_member, read_member, write_index
+from result_parser import large_header_pattern
+from retrieve_models import ModelStore
+
+GRANULARITIES = ["model", "unit"]
+header_pattern = re.compile(large_header_pattern)
+
+def get_shard_path(shards_path: Path, shard: int) -> Path:
+    return shards_path / f"shard-{shard}.txt"
+
+def get_shard_output_path(shards_path: Path, shard: int) -> Path:
+    return shards_path / str(shard)
+
+# The predicted runtime of every unit. Units without earlier results are
+# estimated from the size of their model, scaled by the seconds per byte of
+# the units that have earlier results, or by the timeout per byte of the
+# largest model if none have.
+def estimate_costs(units: list[BenchmarkUnit], planner: UnitPlanner, store: ModelStore) -> dict[str, float]:
+    sizes: dict[str, Optional[int]] = {}
+    for unit in units:
+        if unit.model_name not in sizes:
+            sizes[unit.model_name] = store.model_size(unit.model_name)
+    known = [unit for unit in units if unit.get_key() in planner.history]
+    known_size = sum(sizes[unit.model_name] or 0 for unit in known)
+    if known_size > 0:
+        seconds_per_byte = sum(planner.predict(unit).time for unit in known) / known_size
+    else:
+        seconds_per_byte = planner.timeout / max([size for size in sizes.values() if size is not None], default=1)
+    costs: dict[str, float] = {}
+    for unit in units:
+        size = sizes[unit.model_name]
+        if unit.get_key() in planner.history or size is None:
+            costs[unit.get_key()] = planner.predict(unit).time
+        else:
+            costs[unit.get_key()] = min(size * seconds_per_byte, planner.timeout)
+    return costs
+
+# Longest processing time first: the most expensive group goes to the shard
+# with the least work so far. The longest shard is then at most a third longer
+# than in the best possible split.
+def split_into_shards(groups: list[list[BenchmarkUnit]], costs: dict[str, float], shard_count: int) -> list[tuple[float, list[BenchmarkUnit]]]:
+    group_costs = [(sum(costs[unit.get_key()] for unit in group), group) for group in groups]
+    group_costs.sort(key=lambda x: -x[0])
+    shards: list[tuple[float, list[BenchmarkUnit]]] = [(0.0, []) for _ in range(shard_count)]
+    loads = [(0.0, shard) for shard in range(shard_count)]
+    for cost, group in group_costs:
+        load, shard = heapq.heappop(loads)
+        shards[shard][1].extend(group)
+        shards[shard] = (load + cost, shards[shard][1])
+        heapq.heappush(loads, (load + cost, shard))
+    return shards
+
+def plan_shards(shards_path: Path, shard_count: int, engines: list[str], model_names: list[str], planner: UnitPlanner, store: ModelStore, granularity: str):
+    units = [unit for engine in engines for unit in create_units(engine, model_names)]
+    costs = estimate_costs(units, planner, store)
+    if granularity == "model":
+        by_model: dict[str, list[BenchmarkUnit]] = {}
+        for unit in units:
+            by_model.setdefault(unit.model_name, []).append(unit)
+        groups = list(by_model.values())
+    else:
+        groups = [[unit] for unit in units]
+    shards_path.mkdir(parents=True, exist_ok=True)
+    for shard, (cost, shard_units) in enumerate(split_into_shards(groups, costs, shard_count), 1):
+        get_shard_path(shards_path, shard).write_text("".join(f"{unit.get_key()}\n" for unit in shard_units))
+        print(f"Shard {shard}: {len(shard_units)} queries, {cost / 3600:.2f} predicted hours")
+
+# The blocks of a .out or .err file keyed by their header and how often the
+# header came before, which tells the repeated trials of a query apart. Each
+# block runs up to the next header, so the text is kept exactly as it was
+# written.
+def split_blocks(text: str) -> Iterator[tuple[tuple, str]]:
+    matches = list(header_pattern.finditer(text))
+    if len(matches) > 0 and matches[0].start() > 0:
+        yield (), text[:matches[0].start()]
+    occurrences: dict[tuple, int] = {}
+    for match, next_match in zip(matches, matches[1:] + [None]):
+        occurrence = occurrences.get(match.groups(), 0)
+        occurrences[match.groups()] = occurrence + 1
+        yield (*match.groups(), occurrence), text[match.start():len(text) if next_match is None else next_match.start()]
+
+# Where each block of a .out or .err file of a shard starts in it and in the
+# merged file, or None if it was left out as a duplicate.
+BlockMoves = list[tuple[int, Optional[int]]]
+
+def merge_blocks(sources: list[tuple[int, tarfile.TarFile, tarfile.TarInfo]], merged: BinaryIO) -> dict[int, BlockMoves]:
+    seen: set[tuple] = set()
+    block_moves: dict[int, BlockMoves] = {}
+    for shard, tarFile, info in sources:
+        text = read_member(tarFile, info).decode(errors="replace")
+        moves = block_moves.setdefault(shard, [])
+        position = 0
+        for key, block in split_blocks(text):
+            data = block.encode()
+            if key not in seen:
+                seen.add(key)
+                moves.append((position, merged.tell()))
+                merged.write(data)
+            else:
+                moves.append((position, None))
+            position += len(data)
+    return block_moves
+
+# The span of a record moved along with the block it lies in.
+def move_span(moves: BlockMoves, span: list[int]) -> Optional[list[int]]:
+    start, merged_start = moves[bisect_right([start for start, _ in moves], span[0]) - 1]
+    return None if merged_start is None else [span[0] - start + merged_start, span[1]]
+
+def merge_records(name: str, sources: list[tuple[int, tarfile.TarFile, tarfile.TarInfo]], block_moves: dict[str, dict[int, BlockMoves]], merged: BinaryIO):
+    prefix = name.removesuffix(".jsonl")
+    for shard, tarFile, info in sources:
+        for line in read_member(tarFile, info).decode().splitlines():
+            if line.strip() == "":
+                continue
+            record = json.loads(line)
+            out = move_span(block_moves[f"{prefix}.out"][shard], record["out"])
+            err = move_span(block_moves[f"{prefix}.err"][shard], record["err"])
+            if out is not None and err is not None:
+                merged.write((json.dumps({**record, "out": out, "err": err}) + "\n").encode())
+
+# Combines the archives of an engine from every shard into one archive, so it
+# is processed as a single experiment. The same query may only be in more
+# than one shard if shards were rerun, and then the first shard's is kept.
+# The records of a model are moved along with its blocks, and only kept if
+# every shard with its .out file has them. A file of the merged archive is
+# compressed if it was compressed in any shard.
+def merge_engine(engine: str, shard_archives: list[Path], output_path: Path):
+    member_sources: dict[str, list[tuple[int, tarfile.TarFile, tarfile.TarInfo]]] = {}
+    block_moves: dict[str, dict[int, BlockMoves]] = {}
+    temporary_path = output_path.with_name(output_path.name + ".tmp")
+    with ExitStack() as stack, tarfile.open(temporary_path, "w") as output:
+        for shard, archive in enumerate(shard_archives):
+            tarFile = stack.enter_context(tarfile.open(archive, "r"))
+            for info in tarFile:
+                if info.isfile():
+                    member_sources.setdefault(get_member_name(info), []).append((shard, tarFile, info))
+        for name, sources in sorted(member_sources.items(), key=lambda x: x[0].endswith(".jsonl")):
+            if name.endswith(".jsonl"):
+                shards = set(shard for shard, _, _ in sources)
+                if any(set(shard for shard, _, _ in member_sources.get(name.removesuffix(".jsonl") + suffix, [])) != shards for suffix in (".out", ".err")):
+                    print(f"Leaving out {name}, not every shard has records")
+                    continue
+            with tempfile.TemporaryFile() as merged:
+                if name.endswith(".jsonl"):
+                    merge_records(name, sources, block_moves, merged)
+                elif name.endswith(".out") or name.endswith(".err"):
+                    block_moves[name] = merge_blocks(sources, merged)
+                else:
+                    _, tarFile, info = sources[0]
+                    shutil.copyfileobj(open_member(tarFile, info), merged)
+                merged.seek(0)
+                add_stream(output, tarfile.TarInfo(name), merged, any(info.name.endswith(COMPRESSED_SUFFIX) for _, _, info in sources))
+    temporary_path.replace(output_path)
+    write_index(output_path)
+    print(f"Merged {len(shard_archives)} shard archives of {engine} into {output_path}")
+
+def merge_shards(shards_path: Path, packed_path: Path, engines: list[str]):
+    packed_path.mkdir(parents=True, exist_ok=True)
+    for engine in engines:
+        output_path = packed_path / f"{engine}.tar"
+        if output_path.exists():
+            print(f"Skipping {engine}, {output_path} already exists")
+            continue
+        shard_archives = sorted(shards_path.glob(f"*/packed-results/{engine}.tar"), key=lambda x: int(x.parent.parent.name))
+        if len(shard_archives) == 0:
+            continue
+        merge_engine(engine, shard_archives, output_path)
+
+# Runs every shard as its own benchmark_scheduler.py process on this machine,
+# splitting the jobs evenly between them.
+def run_local(shards_path: Path, shard_count: int, engines: list[str], jobs: int, scheduler_args: list[str]):
+    scheduler = Path(__file__).with_name("benchmark_scheduler.py")
+    processes = []
+    for shard in range(1, shard_count + 1):
+        if get_shard_path(shards_path, shard).read_text() == "":
+            continue
+        processes.append(subprocess.Popen([
+            sys.executable, str(scheduler), *engines,
+            "--units", str(get_shard_path(shards_path, shard)),
+            "--output-dir", str(get_shard_output_path(shards_path, shard)),
+            "--jobs", str(max(jobs // shard_count, 1)),
+            *scheduler_args,
+        ]))
+    failed = [process.args for process in processes if process.wait() != 0]
+    if len(failed) > 0:
+        raise RuntimeError(f"{len(failed)} shards failed")
+
+def main():
+    parser = ArgumentParser(prog="Splits the benchmark into shards of balanced predicted runtime and merges their results")
+    parser.add_argument("command", choices=["plan", "merge", "run-local"], help="plan writes artifacts/shards/shard-<i>.txt, merge combines the shard archives into artifacts/packed-results and run-local does both with the shards run as local processes")
+    parser.add_argument("engines", nargs='*', default=list(ENGINE_OPTIONS.keys()), help=f"engines to shard, any of {', '.join(ENGINE_OPTIONS.keys())}")
+    parser.add_argument("--shards", type=int, default=2, help="number of shards")
+    parser.add_argument("--granularity", choices=GRANULARITIES, default="model", help="keeps all queries of a model in one shard, or balances single queries")
+    parser.add_argument("--models", type=Path, default=Path("target-models.txt"), help="file with one model name per line")
+    parser.add_argument("--results", type=Path, default=Path("artifacts/results.db"), help="the results database the runtimes are predicted from")
+    parser.add_argument("--timeout", type=int, default=PER_QUERY_TIMEOUT, help="timeout of each query in seconds")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="total number of verifypn processes of all shards with run-local")
+    args = parser.parse_args()
+    for engine in args.engines:
+        if engine not in ENGINE_OPTIONS:
+            parser.error(f"unknown engine {engine}")
+
+    artifacts_path = Path("artifacts")
+    shards_path = artifacts_path / "shards"
+    if args.command in ("plan", "run-local"):
+        planner = UnitPlanner(args.results, args.timeout, "longest-first", "run")
+        store = ModelStore(artifacts_path / "all-models", artifacts_path / "model-archives")
+        plan_shards(shards_path, args.shards, args.engines, read_lines(args.models), planner, store, args.granularity)
+    if args.command == "run-local":
+        run_local(shards_path, args.shards, args.engines, args.jobs, ["--timeout", str(args.timeout), "--results", str(args.results)])
+    if args.command in ("merge", "run-local"):
+        merge_shards(shards_path, artifacts_path / "packed-results", args.engines)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+#!/usr/bin/python3
+from argparse import ArgumentParser
+from pathlib import Path
+import sqlite3
+import sys
+
+from query_lookup import Experiment, getExperimentId, getQueryLog, getQueryResultId
+
+
+def main():
+    parser = ArgumentParser(prog="Prints the raw verifypn output of a single query")
+    parser.add_argument("experiment", help="The experiment in <name>-<strategy> format")
+    parser.add_argument("model_name")
+    parser.add_argument("query_name", help="The query category, e.g. ReachabilityCardinality")
+    parser.add_argument("query_index", type=int)
+    parser.add_argument("--results", type=Path, default=Path("artifacts/results.db"), help="The results database the output is read from")
+    args = parser.parse_args()
+    db = sqlite3.connect(str(args.results))
+
+    queryResultId = getQueryResultId(db, getExperimentId(db, Experiment.fromFormat(args.experiment)), args.model_name, args.query_name, args.query_index)
+    if queryResultId is None:
+        sys.exit("No result for this query")
+    log = getQueryLog(db, queryResultId)
+    if log is None:
+        sys.exit("No output stored for this query")
+    print("###### STDOUT ######")
+    print(log[0])
+    print("###### STDERR ######")
+    print(log[1])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+#!/usr/bin/python3
+from argparse import ArgumentParser
+import csv
+import io
+import json
+from pathlib import Path
+import random
+import sqlite3
+import tarfile
+
+from get_all_answers import ConsensusAnswerStore
+from packed_archive import add_stream, write_index
+from result_parser import Result
+
+VERBOSE_LINES = [
+    "Size of net before structural reductions: {0} places, {1} transitions",
+    "Size of net after structural reductions: {1} places, {0} transitions",
+    "Structural reduction finished after {2} seconds",
+    "Net unfolded in {2} seconds from {0} to {1} places",
+    "Potential bindings: {0}",
+    "Explored {0} markings in {2} seconds",
+]
+BENCHMARK_CATEGORIES = ["ReachabilityCardinality", "ReachabilityFireability"]
+QUERY_FILE_CATEGORIES = ["ReachabilityCardinality", "ReachabilityFireability", "LTLCardinality", "LTLFireability", "CTLCardinality", "CTLFireability"]
+SINGLE_QUERY_CATEGORIES = ["ReachabilityDeadlock", "OneSafe", "Liveness", "StableMarking", "QuasiLiveness"]
+FORMULA_PATHS = [
+    ("<exists-path><finally>", "</finally></exists-path>"),
+    ("<all-paths><globally>", "</globally></all-paths>"),
+    ("<negation><all-paths><globally>", "</globally></all-paths></negation>"),
+    ("<negation><exists-path><finally>", "</finally></exists-path></negation>"),
+]
+
+def synthetic_header(model: str, category: str, query_index: int, is_large_job: bool) -> str:
+    if is_large_job:
+        return f"\n###### RUNNING {model} X even-RDFS X {category} X {query_index} ######\n"
+    return f"\n###### RUNNING {model}_{category}.xml_RDFS X {query_index} ######\n"
+
+def synthetic_block_body(rng: random.Random, verbose_lines: int) -> tuple[str, str]:
+    out = []
+    for _ in range(verbose_lines):
+        out.append(rng.choice(VERBOSE_LINES).format(rng.randint(1, 10**6), rng.randint(1, 10**6), rng.random()) + "\n")
+    out.append(f"Colored structural reductions computed in {rng.random():.6f} seconds\n")
+    roll = rng.random()
+    if roll < 0.7:
+        out.append(f"passed states: {rng.randint(1, 10**8)}\n")
+        out.append(f"Spent {rng.random() * 300:.3f} on verification\n")
+        out.append("Query is satisfied\n" if roll < 0.35 else "Query is NOT satisfied\n")
+    elif roll < 0.9:
+        out.append("TIMEOUT\n")
+    err = "std::bad_alloc\n" if roll >= 0.95 else ""
+    err += f"MAX_MEMORY: {rng.randint(1000, 15 * 1024 * 1024)}kB\n\nreal\t{rng.randint(0, 4)}m{rng.random() * 60:.3f}s\nuser\t0m0.100s\nsys\t0m0.010s\n"
+    return "".join(out), err
+
+def synthetic_log(blocks: int, verbose_lines: int, is_large_job: bool, seed: int) -> tuple[str, str]:
+    rng = random.Random(seed)
+    out = []
+    err = []
+    for i in range(blocks):
+        model = f"Model{i // 32}-COL-{i // 32:04d}"
+        category = "ReachabilityCardinality" if i % 32 < 16 else "ReachabilityFireability"
+        header = synthetic_header(model, category, i % 16 + 1, is_large_job)
+        outBody, errBody = synthetic_block_body(rng, verbose_lines)
+        out.append(header + outBody)
+        err.append(header + errBody)
+    return "".join(out), "".join(err)
+
+def get_model_name(model: int) -> str:
+    return f"Synthetic{model}-COL-{model:04d}"
+
+# A query file in the MCC format with the property ids and formula shapes
+# create_query_instances reads the query index and type from.
+def synthetic_query_file(rng: random.Random, model: str, category: str, queries: int, atoms: int) -> str:
+    lines = ['<?xml version="1.0"?>', '<property-set xmlns="http://mcc.lip6.fr/">']
+    for i in range(queries):
+        start, end = rng.choice(FORMULA_PATHS)
+        comparisons = "".join(
+            f"<integer-le><tokens-count><place>p{rng.randint(0, 999)}</place></tokens-count><integer-constant>{rng.randint(0, 9)}</integer-constant></integer-le>"
+            for _ in range(atoms))
+        lines.append(f"  <property><id>{model}-{category}-2024-{i:02d}</id><description>Automatically generated</description>"
+            f"<formula>{start}<conjunction>{comparisons}</conjunction>{end}</formula></property>")
+    lines.append("</property-set>")
+    return "\n".join(lines) + "\n"
+
+def write_models(models_path: Path, rng: random.Random, models: int, queries: int, atoms: int):
+    for model in map(get_model_name, range(models)):
+        model_path = models_path / model
+        model_path.mkdir(parents=True, exist_ok=True)
+        (model_path / "model.pnml").write_text(f'<?xml version="1.0"?>\n<pnml><net id="{model}"/></pnml>\n')
+        for category in QUERY_FILE_CATEGORIES:
+            (model_path / f"{category}.xml").write_text(synthetic_query_file(rng, model, category, queries, atoms))
+
+# The consensus answers as get_all_answers.py writes them, with 0 based query
+# indices and T, F or ? as answer.
+def write_consensus_answers(csv_path: Path, db_path: Path, rng: random.Random, models: int, queries: int):
+    with csv_path.open("w", newline='') as f:
+        writer = csv.writer(f)
+        for model in map(get_model_name, range(models)):
+            for category in QUERY_FILE_CATEGORIES:
+                for i in range(queries):
+                    writer.writerow([model, category, i, rng.choice("TTFF?")])
+            for category in SINGLE_QUERY_CATEGORIES:
+                writer.writerow([model, category, 0, rng.choice("TF")])
+    db_path.unlink(missing_ok=True)
+    db = sqlite3.connect(str(db_path))
+    ConsensusAnswerStore(db).importCsv(csv_path)
+    db.commit()
+    db.close()
+
+def add_text(tarFile: tarfile.TarFile, name: str, text: str, compress: bool = False):
+    add_stream(tarFile, tarfile.TarInfo(name), io.BytesIO(text.encode()), compress)
+
+# One archive per engine in the layout of packed-results, with a .out and .err
+# file per model. Large job archives also get the large marker. Every query is
+# run trials times, and the later trials get a TRIAL trailer. With records
+# the .jsonl file of the benchmark scheduler is written as well. With compress
+# the files of each model are compressed, and either way the archive gets an
+# index, like the benchmark scheduler writes them.
+def write_packed_results(packed_path: Path, rng: random.Random, engines: list[str], models: int, queries: int, verbose_lines: int, is_large_job: bool, trials: int = 1, records: bool = False, compress: bool = False):
+    packed_path.mkdir(parents=True, exist_ok=True)
+    for engine in engines:
+        archive_path = packed_path / f"{engine}.tar"
+        with tarfile.open(str(archive_path), "w") as tarFile:
+            for model in map(get_model_name, range(models)):
+                out = []
+                err = []
+                lines = []
+                out_size = 0
+                err_size = 0
+                for category in BENCHMARK_CATEGORIES:
+                    for query_index in range(1, queries + 1):
+                        header = synthetic_header(model, category, query_index, is_large_job)
+                        header_size = len(header.rstrip("\n"))
+                        for trial in range(1, trials + 1):
+                            outBody, errBody = synthetic_block_body(rng, verbose_lines)
+                            errBody = (f"TRIAL: {trial}\n" if trial > 1 else "") + errBody
+                            out.append(header + outBody)
+                            err.append(header + errBody)
+                            if records:
+                                strategy = "even-RDFS" if is_large_job else "RDFS"
+                                outSpan = [out_size + header_size, len(out[-1]) - header_size]
+                                errSpan = [err_size + header_size, len(err[-1]) - header_size]
+                                record = Result.fromBlock(model, category, strategy, query_index, out[-1][header_size:], err[-1][header_size:]).toRecord()
+                                lines.append(json.dumps({**record, "out": outSpan, "err": errSpan}) + "\n")
+                            out_size += len(out[-1])
+                            err_size += len(err[-1])
+                add_text(tarFile, f"./{model}_{engine}-1.out", "".join(out), compress)
+                add_text(tarFile, f"./{model}_{engine}-1.err", "".join(err), compress)
+                if records:
+                    add_text(tarFile, f"./{model}_{engine}-1.jsonl", "".join(lines), compress)
+            if is_large_job:
+                add_text(tarFile, "./large", "\n")
+        write_index(archive_path)
+
+def write_synthetic_data(directory: Path, engines: list[str], models: int, queries: int, verbose_lines: int, atoms: int, is_large_job: bool, seed: int, trials: int = 1, records: bool = False, compress: bool = False):
+    rng = random.Random(seed)
+    artifacts_path = directory / "artifacts"
+    artifacts_path.mkdir(parents=True, exist_ok=True)
+    write_models(artifacts_path / "all-models", rng, models, queries, atoms)
+    write_consensus_answers(artifacts_path / "consensus-answers.csv", artifacts_path / "consensus-answers.db", rng, models, queries)
+    write_packed_results(artifacts_path / "packed-results", rng, engines, models, queries, verbose_lines, is_large_job, trials, records, compress)
+
+def main():
+    parser = ArgumentParser(prog="Writes synthetic models, consensus answers and packed results to run the result processing on")
+    parser.add_argument("directory", type=Path, help="directory the artifacts folder is created in")
+    parser.add_argument("--engines", nargs='+', default=["Baseline", "ExplicitCPN"])
+    parser.add_argument("--models", type=int, default=100, help="number of models")
+    parser.add_argument("--queries", type=int, default=16, help="number of queries per model and category")
+    parser.add_argument("--verbose-lines", type=int, default=20, help="number of additional verifypn output lines per query")
+    parser.add_argument("--atoms", type=int, default=8, help="number of comparisons in each query formula")
+    parser.add_argument("--format", choices=["large", "small"], default="large", help="the header format of the packed results")
+    parser.add_argument("--trials", type=int, default=1, help="number of times each query is run")
+    parser.add_argument("--records", default=False, action="store_true", help="also writes the JSON records of the benchmark scheduler")
+    parser.add_argument("--compress", default=False, action="store_true", help="compresses the files in the packed results and writes their index, like the benchmark scheduler does")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    write_synthetic_data(args.directory, args.engines, args.models, args.queries, args.verbose_lines, args.atoms, args.format == "large", args.seed, args.trials, args.records, args.compress)
+    print(f"Wrote {args.models} synthetic models with results of {len(args.engines)} engines to {args.directory / 'artifacts'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+from math import comb
+import statistics
+
+CONFIDENCE = 0.95
+# The fewest values whose full range is a confidence interval at CONFIDENCE
+# for their median. With fewer values the full range is still returned, but
+# it covers the median less often than that. The interval only gets narrower
+# than the full range from nine values on.
+MIN_CONFIDENT_VALUES = 6
+
+# The median of the values and a distribution free confidence interval for it.
+# The bounds are the order statistics the median lies between with at least
+# the given confidence, following the binomial distribution of the number of
+# values below it. With fewer than six values no such pair exists at 95%, so
+# the interval is the full range of the values.
+def median_confidence_interval(values: list[float], confidence: float = CONFIDENCE) -> tuple[float, float, float]:
+    ordered = sorted(values)
+    n = len(ordered)
+    median = statistics.median(ordered)
+    lower = 0
+    tail = 0.0
+    for j in range(n // 2):
+        tail += comb(n, j) / 2 ** n
+        if tail > (1 - confidence) / 2:
+            break
+        lower = j + 1
+    if lower == 0:
+        return median, ordered[0], ordered[-1]
+    return median, ordered[lower - 1], ordered[n - lower]